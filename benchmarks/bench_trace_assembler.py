@@ -0,0 +1,145 @@
+"""
+Microbenchmark of the trace assembler against the previous combine_traces implementation
+
+Builds synthetic multi-agent Bedrock traces (orchestration steps of a supervisor and its
+collaborators, each step made of model input, model output, rationale, invocation input
+and observation events) and times both implementations on them.
+
+Usage:
+    python3 -m benchmarks.bench_trace_assembler [--steps 10 100 1000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.trace_assembler import assemble_trace
+
+
+def build_synthetic_trace(num_steps: int, num_collaborators: int = 4) -> List[Dict[str, Any]]:
+    """Trace events of a multi-agent invocation with num_steps orchestration steps"""
+    events = []
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    collaborators = [f"collaborator_{i}" for i in range(num_collaborators)]
+
+    for step in range(num_steps):
+        trace_id = f"trace-{step:06d}-0"
+        collaborator = collaborators[step % num_collaborators]
+        event_base = {
+            'agentId': 'SUPERVISOR',
+            'agentAliasId': 'ALIAS',
+            'agentVersion': '1',
+            'sessionId': 'session',
+            'callerChain': [{'agentAliasArn': 'arn:aws:bedrock:us-east-1:000000000000:agent-alias/SUPERVISOR/ALIAS'}],
+            'collaboratorName': collaborator
+        }
+        parts = [
+            {'modelInvocationInput': {'traceId': trace_id, 'text': '{"messages": []}' * 20, 'type': 'ORCHESTRATION'}},
+            {'modelInvocationOutput': {'traceId': trace_id, 'rawResponse': {'content': '{}' * 50},
+                                       'metadata': {'usage': {'inputTokens': 1200, 'outputTokens': 150}}}},
+            {'rationale': {'traceId': trace_id, 'text': f"Step {step} reasoning about which collaborator to call"}},
+            {'invocationInput': {'traceId': trace_id, 'invocationType': 'AGENT_COLLABORATOR',
+                                 'agentCollaboratorInvocationInput': {'agentCollaboratorName': collaborator,
+                                                                      'input': {'text': 'sub question'}}}},
+            {'observation': {'traceId': trace_id, 'type': 'AGENT_COLLABORATOR',
+                             'agentCollaboratorInvocationOutput': {'agentCollaboratorName': collaborator,
+                                                                   'output': {'text': 'sub answer'}}}}
+        ]
+        for index, part in enumerate(parts):
+            events.append({
+                **event_base,
+                'eventTime': start + timedelta(seconds=step, milliseconds=index * 100),
+                'trace': {'orchestrationTrace': part}
+            })
+    return events
+
+
+def legacy_combine_traces(full_trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The previous implementation: recursive traceId search, list membership and extra passes"""
+    trace_ids = []
+    trace_steps = []
+    cur_dict = {}
+
+    def find_trace_id(data):
+        if isinstance(data, dict):
+            if 'traceId' in data:
+                return data['traceId']
+            for value in data.values():
+                result = find_trace_id(value)
+                if result:
+                    return result
+        elif isinstance(data, list):
+            for item in data:
+                result = find_trace_id(item)
+                if result:
+                    return result
+        return None
+
+    for cur_trace in full_trace:
+        cur_trace_id = find_trace_id(cur_trace)
+        if cur_trace_id not in trace_ids:
+            if cur_dict:
+                trace_steps.append(cur_dict)
+                cur_dict = {}
+            cur_dict = {key: value for key, value in cur_trace.items() if key != 'trace'}
+            trace_ids.append(cur_trace_id)
+
+        if 'orchestrationTrace' in cur_trace['trace']:
+            first_key = next(iter(cur_trace['trace']['orchestrationTrace']))
+            cur_dict[first_key] = cur_trace['trace']['orchestrationTrace'][first_key]
+
+    if cur_dict:
+        trace_steps.append(cur_dict)
+
+    orc_trace_full = [item['trace']['orchestrationTrace'] for item in full_trace if 'orchestrationTrace' in item['trace']]
+    rationales = [item['rationale']['text'] for item in orc_trace_full if 'rationale' in item]
+
+    collaborators = set()
+    for item in orc_trace_full:
+        if 'invocationInput' in item and 'agentCollaboratorInvocationInput' in item['invocationInput']:
+            collaborators.add(item['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName'])
+        if 'observation' in item and 'agentCollaboratorInvocationOutput' in item['observation']:
+            collaborators.add(item['observation']['agentCollaboratorInvocationOutput']['agentCollaboratorName'])
+
+    return {'steps': trace_steps, 'rationales': rationales, 'collaborators': collaborators}
+
+
+def time_call(function: Callable, full_trace: List[Dict[str, Any]], repeat: int) -> float:
+    """Best wall time of repeat runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(full_trace)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the trace assembler against combine_traces")
+    parser.add_argument('--steps', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                        help="Orchestration steps of the synthetic traces")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the best one is reported")
+    args = parser.parse_args()
+
+    print(f"{'steps':>8} {'events':>8} {'legacy ms':>12} {'assembler ms':>14} {'speedup':>9}")
+    for num_steps in args.steps:
+        full_trace = build_synthetic_trace(num_steps)
+
+        # Both implementations must agree on the synthetic traces before their timings mean anything
+        legacy = legacy_combine_traces(full_trace)
+        assembled = assemble_trace(full_trace)
+        assert len(legacy['steps']) == len(assembled['steps'])
+        assert legacy['rationales'] == assembled['rationales']
+        assert legacy['collaborators'] == assembled['collaborators']
+
+        legacy_ms = time_call(legacy_combine_traces, full_trace, args.repeat)
+        assembler_ms = time_call(assemble_trace, full_trace, args.repeat)
+        print(f"{num_steps:>8} {len(full_trace):>8} {legacy_ms:>12.2f} {assembler_ms:>14.2f} {legacy_ms / assembler_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,3 +20,101 @@ DATA_FILE_PATH="data_files/DATA_FILE_NAME"
 LANGFUSE_PUBLIC_KEY=""
 LANGFUSE_SECRET_KEY=""
 LANGFUSE_HOST=""
+
+# Number of trajectories evaluated in parallel (questions inside a trajectory always run in order)
+MAX_CONCURRENT_TRAJECTORIES = 1
+
+# Shared Bedrock quotas per minute (0 disables the limit)
+AGENT_RPM = 0
+AGENT_TPM = 0
+JUDGE_RPM = 0
+JUDGE_TPM = 0
+EMBEDDING_RPM = 0
+EMBEDDING_TPM = 0
+
+# Adaptive in-flight limits for agent and judge calls (grow on success, halve on throttling)
+AGENT_INITIAL_CONCURRENCY = 2
+AGENT_MAX_CONCURRENCY = 8
+JUDGE_INITIAL_CONCURRENCY = 2
+JUDGE_MAX_CONCURRENCY = 8
+
+# Retries with jittered exponential backoff, and per-endpoint circuit breakers
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+RETRY_DEADLINE = 600
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 60
+
+# Directory of the run journals used by `python3 driver.py --resume`
+RUN_JOURNAL_DIR="run_journals"
+
+# Directory of recorded agent responses used by `python3 driver.py --replay`
+RESPONSE_STORE_DIR="agent_responses"
+
+# Judging mode: live (on demand) or batch (CoT and Text2SQL judge calls are written under BATCH_JUDGE_DIR and run as batch jobs,
+# then attached to the traces with `python3 driver.py --ingest-batch`). Backend: bedrock (batch inference through S3) or local (on-demand stand-in)
+JUDGE_MODE="live"
+BATCH_JUDGE_DIR="batch_judge"
+BATCH_JUDGE_BACKEND="bedrock"
+BATCH_JUDGE_S3_URI=""
+BATCH_JUDGE_ROLE_ARN=""
+
+# Directory of the per-question agent latency metrics (time to first trace / chunk, stream time, step durations)
+AGENT_METRICS_DIR="agent_metrics"
+
+# Keep every raw agent trace event in memory and in the run journal (false keeps only the assembled trace steps)
+KEEP_TRACE_EVENTS = true
+
+# Judge stage: worker threads judging answered questions, and how many answered questions may wait for them
+JUDGE_WORKERS = 4
+JUDGE_QUEUE_SIZE = 8
+
+# RAGAS: RAG questions judged at the same time are evaluated together in batches of up to RAGAS_BATCH_SIZE (1 disables batching, capped at JUDGE_WORKERS),
+# a partial batch waits RAGAS_BATCH_MAX_WAIT seconds for more questions. RAGAS_MAX_WORKERS / RAGAS_TIMEOUT / RAGAS_MAX_RETRIES tune the ragas RunConfig
+RAGAS_BATCH_SIZE = 1
+RAGAS_BATCH_MAX_WAIT = 5
+RAGAS_MAX_WORKERS = 16
+RAGAS_TIMEOUT = 180
+RAGAS_MAX_RETRIES = 10
+
+# Text2SQL packed judge: Text2SQL questions judged at the same time are scored with one judge call of up to TEXT2SQL_JUDGE_PACK_SIZE questions (1 disables packing, capped at JUDGE_WORKERS),
+# a partial pack waits TEXT2SQL_JUDGE_PACK_MAX_WAIT seconds for more questions
+TEXT2SQL_JUDGE_PACK_SIZE = 1
+TEXT2SQL_JUDGE_PACK_MAX_WAIT = 5
+
+# Embedding cache: vectors computed for RAGAS are stored by model id and text hash and reused across runs (empty path disables it)
+EMBEDDING_CACHE_PATH="cache/embeddings.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# Judge cache: temperature 0 judge responses are stored by model id, parameters and normalized prompt and reused across runs (empty path disables it)
+JUDGE_CACHE_PATH="cache/judge.sqlite"
+JUDGE_CACHE_MAX_MB = 512
+
+# Judge prompt caching: the rubric, agent instructions and schema lead the CoT and Text2SQL judge prompts and are cached by Bedrock
+# (only for judge models that support prompt caching, and prefixes above the model's minimum cacheable length)
+JUDGE_PROMPT_CACHE = false
+
+# Structured judge output: the CoT and Text2SQL judges answer through a tool whose input schema is their output format; either way, invalid output is recovered from the response text when possible
+JUDGE_STRUCTURED_OUTPUT = true
+
+# CoT compaction: token budget of the chain of thought sent to the CoT judge (rationales and tool observations, near-duplicate rationales removed, repeated observations collapsed; 0 sends every rationale as is), and the word overlap from which two rationales count as duplicates
+COT_TOKEN_BUDGET = 0
+COT_DUPLICATE_THRESHOLD = 0.9
+
+# Incremental CoT judging: each question's CoT judge gets a rolling summary of the earlier turns of its trajectory (the last COT_HISTORY_TURNS in full, older ones as a count, no CoT scores), and every trajectory gets an end-of-trajectory judgement
+COT_INCREMENTAL = false
+COT_HISTORY_TURNS = 3
+
+# Text2SQL fast path: queries identical after normalization are scored equivalent, queries reading different tables different, without calling the judge
+SQL_FAST_PATH = true
+
+# Text2SQL execution check: folder of the local database snapshot (one folder per database holding a SQLite file or one parquet file per table), seconds per query and row limit (empty path leaves SQL equivalence to the LLM judge)
+SQL_SNAPSHOT_DIR=""
+SQL_EXECUTION_TIMEOUT = 5
+SQL_EXECUTION_MAX_ROWS = 10000
+
+# Langfuse export: events that may wait in the export queue, events sent per batch, and seconds the exporter waits for new events
+TRACE_EXPORT_QUEUE_SIZE = 10000
+TRACE_EXPORT_BATCH_SIZE = 100
+TRACE_EXPORT_FLUSH_INTERVAL = 1
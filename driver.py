@@ -3,12 +3,34 @@ import uuid
 import boto3
 import sys
 import json
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List
-from evaluators.rag_evaluator import RAGEvaluator
-from evaluators.text2sql_evaluator import Text2SQLEvaluator
+from evaluators.rag_evaluator import RAGEvaluator, evaluate_ragas_batch
+from evaluators.text2sql_evaluator import Text2SQLEvaluator, PackedText2SQLJudge
 from evaluators.custom_evaluator import CustomEvaluator
 from botocore.client import Config
 from helpers.agent_info_extractor import AgentInfoExtractor
+from helpers.rate_limiter import create_rate_limiters
+from helpers.concurrency_controller import create_concurrency_controllers
+from helpers.retry_helper import RetryPolicy, CircuitBreakerRegistry
+from helpers.run_journal import RunJournal
+from helpers.response_store import AgentResponseStore
+from helpers.metrics_log import MetricsLog
+from helpers.trace_analysis import ToolLatencyReport
+from helpers.micro_batcher import MicroBatcher
+from helpers.embedding_cache import create_embedding_cache
+from helpers.judge_cache import create_judge_cache
+from helpers.prompt_cache import PromptCacheStats
+from helpers.judge_output import JudgeOutputStats
+from helpers.cot_compactor import create_cot_compactor
+from helpers.cot_history import TrajectoryCotHistory
+from helpers.sql_equivalence import create_sql_executor
+from helpers.sql_canonical import create_sql_fast_path
+from helpers.trace_exporter import get_trace_exporter, shutdown_trace_exporter
+from helpers.batch_judge import BatchJudgeQueue, BedrockBatchBackend, LocalBatchBackend, submit_batch_jobs, ingest_batch_results
 import time
 
 from dotenv import load_dotenv
@@ -43,6 +65,98 @@ MODEL_ID_EVAL_COT = os.getenv('MODEL_ID_EVAL_COT')
 #DATA
 DATA_FILE_PATH = os.getenv('DATA_FILE_PATH')
 
+#RUN JOURNAL (completed stages, used by --resume)
+RUN_JOURNAL_DIR = os.getenv('RUN_JOURNAL_DIR', 'run_journals')
+
+#AGENT METRICS (per-question agent stream latencies, one JSON lines file per data file)
+AGENT_METRICS_DIR = os.getenv('AGENT_METRICS_DIR', 'agent_metrics')
+
+#TRACE EVENTS (false keeps only the trace steps assembled while streaming, not every raw event)
+KEEP_TRACE_EVENTS = os.getenv('KEEP_TRACE_EVENTS', 'true').lower() == 'true'
+
+#AGENT RESPONSE STORE (every live invocation is recorded, --replay re-judges recordings)
+RESPONSE_STORE_DIR = os.getenv('RESPONSE_STORE_DIR', 'agent_responses')
+
+#BATCH JUDGING ('live' judges on demand, 'batch' queues CoT and Text2SQL judge calls for Bedrock batch inference)
+JUDGE_MODE = os.getenv('JUDGE_MODE', 'live').lower()
+BATCH_JUDGE_DIR = os.getenv('BATCH_JUDGE_DIR', 'batch_judge')
+BATCH_JUDGE_BACKEND = os.getenv('BATCH_JUDGE_BACKEND', 'bedrock').lower()
+BATCH_JUDGE_S3_URI = os.getenv('BATCH_JUDGE_S3_URI', '')
+BATCH_JUDGE_ROLE_ARN = os.getenv('BATCH_JUDGE_ROLE_ARN', '')
+
+#TRACE EXPORT (one shared Langfuse client, traces are sent in batches by a background worker)
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv('TRACE_EXPORT_QUEUE_SIZE', 10000))
+TRACE_EXPORT_BATCH_SIZE = int(os.getenv('TRACE_EXPORT_BATCH_SIZE', 100))
+TRACE_EXPORT_FLUSH_INTERVAL = float(os.getenv('TRACE_EXPORT_FLUSH_INTERVAL', 1))
+
+#EXECUTION
+MAX_CONCURRENT_TRAJECTORIES = int(os.getenv('MAX_CONCURRENT_TRAJECTORIES', 1))
+JUDGE_WORKERS = int(os.getenv('JUDGE_WORKERS', 4))
+JUDGE_QUEUE_SIZE = int(os.getenv('JUDGE_QUEUE_SIZE', 8))
+
+#RAGAS BATCHING (RAG questions judged at the same time share one evaluate() call, 1 disables batching)
+RAGAS_BATCH_SIZE = int(os.getenv('RAGAS_BATCH_SIZE', 1))
+RAGAS_BATCH_MAX_WAIT = float(os.getenv('RAGAS_BATCH_MAX_WAIT', 5))
+RAGAS_MAX_WORKERS = int(os.getenv('RAGAS_MAX_WORKERS', 16))
+RAGAS_TIMEOUT = int(os.getenv('RAGAS_TIMEOUT', 180))
+RAGAS_MAX_RETRIES = int(os.getenv('RAGAS_MAX_RETRIES', 10))
+
+#TEXT2SQL PACKED JUDGE (questions judged per model call, 1 disables packing, and seconds a partial pack waits)
+TEXT2SQL_JUDGE_PACK_SIZE = int(os.getenv('TEXT2SQL_JUDGE_PACK_SIZE', 1))
+TEXT2SQL_JUDGE_PACK_MAX_WAIT = float(os.getenv('TEXT2SQL_JUDGE_PACK_MAX_WAIT', 5))
+
+#EMBEDDING CACHE (SQLite store of embedding vectors shared across runs, empty path disables it)
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'cache/embeddings.sqlite')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+
+#JUDGE CACHE (SQLite store of temperature 0 judge responses shared across runs, empty path disables it)
+JUDGE_CACHE_PATH = os.getenv('JUDGE_CACHE_PATH', 'cache/judge.sqlite')
+JUDGE_CACHE_MAX_MB = float(os.getenv('JUDGE_CACHE_MAX_MB', 512))
+
+#JUDGE PROMPT CACHE (Bedrock prompt caching of the invariant prefix of CoT and Text2SQL judge prompts)
+JUDGE_PROMPT_CACHE = os.getenv('JUDGE_PROMPT_CACHE', 'false').lower() == 'true'
+
+#STRUCTURED JUDGE OUTPUT (CoT and Text2SQL judges answer through a tool whose input schema is their output format)
+JUDGE_STRUCTURED_OUTPUT = os.getenv('JUDGE_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+
+#COT COMPACTION (token budget of the chain of thought sent to the CoT judge, 0 sends every rationale as is)
+COT_TOKEN_BUDGET = int(os.getenv('COT_TOKEN_BUDGET', 0))
+COT_DUPLICATE_THRESHOLD = float(os.getenv('COT_DUPLICATE_THRESHOLD', 0.9))
+
+#INCREMENTAL COT JUDGING (questions judged with a rolling summary of their trajectory's earlier turns, plus a trajectory judgement)
+COT_INCREMENTAL = os.getenv('COT_INCREMENTAL', 'false').lower() == 'true'
+COT_HISTORY_TURNS = int(os.getenv('COT_HISTORY_TURNS', 3))
+
+#SQL FAST PATH (decide Text2SQL equivalence from the normalized query text when the answer is certain)
+SQL_FAST_PATH = os.getenv('SQL_FAST_PATH', 'true').lower() == 'true'
+
+#SQL EXECUTION (local snapshot of the Text2SQL databases, empty path leaves SQL equivalence to the LLM judge)
+SQL_SNAPSHOT_DIR = os.getenv('SQL_SNAPSHOT_DIR', '')
+SQL_EXECUTION_TIMEOUT = float(os.getenv('SQL_EXECUTION_TIMEOUT', 5))
+SQL_EXECUTION_MAX_ROWS = int(os.getenv('SQL_EXECUTION_MAX_ROWS', 10000))
+
+#RATE LIMITS (requests / tokens per minute, 0 disables the limit)
+AGENT_RPM = float(os.getenv('AGENT_RPM', 0))
+AGENT_TPM = float(os.getenv('AGENT_TPM', 0))
+JUDGE_RPM = float(os.getenv('JUDGE_RPM', 0))
+JUDGE_TPM = float(os.getenv('JUDGE_TPM', 0))
+EMBEDDING_RPM = float(os.getenv('EMBEDDING_RPM', 0))
+EMBEDDING_TPM = float(os.getenv('EMBEDDING_TPM', 0))
+
+#ADAPTIVE CONCURRENCY (in-flight calls grow while calls succeed and are halved on throttling)
+AGENT_INITIAL_CONCURRENCY = int(os.getenv('AGENT_INITIAL_CONCURRENCY', 2))
+AGENT_MAX_CONCURRENCY = int(os.getenv('AGENT_MAX_CONCURRENCY', 8))
+JUDGE_INITIAL_CONCURRENCY = int(os.getenv('JUDGE_INITIAL_CONCURRENCY', 2))
+JUDGE_MAX_CONCURRENCY = int(os.getenv('JUDGE_MAX_CONCURRENCY', 8))
+
+#RETRIES AND CIRCUIT BREAKERS
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 4))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 2))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 60))
+RETRY_DEADLINE = float(os.getenv('RETRY_DEADLINE', 600))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 60))
+
 def setup_environment() -> None:
     """Setup environment variables for Langfuse"""
     langfuse_vars = {
@@ -56,13 +170,20 @@ def setup_environment() -> None:
 def get_config() -> Dict[str, Any]:
     """Get configuration settings"""
 
+    # Every trajectory worker shares these clients, so size the connection pools
+    # for the worker count (botocore defaults to 10 connections per client)
+    pool_size = max(10, MAX_CONCURRENT_TRAJECTORIES * 2)
+
     # Create shared clients
     bedrock_config = Config(
         connect_timeout=120, 
         read_timeout=120, 
-        retries={'max_attempts': 0}
+        retries={'max_attempts': 0},
+        max_pool_connections=pool_size
     )
 
+    # boto3 clients are thread-safe once created, but client creation through the
+    # default session is not, so they are built once here before any worker starts
     shared_clients = {
         'bedrock_agent_client': boto3.client("bedrock-agent", region_name=AWS_BEDROCK_REGION),
         'bedrock_agent_runtime': boto3.client(
@@ -70,9 +191,37 @@ def get_config() -> Dict[str, Any]:
             region_name=AWS_BEDROCK_REGION,
             config=bedrock_config
         ),
-        'bedrock_runtime': boto3.client('bedrock-runtime', region_name=AWS_BEDROCK_REGION)
+        'bedrock_runtime': boto3.client(
+            'bedrock-runtime',
+            region_name=AWS_BEDROCK_REGION,
+            config=Config(max_pool_connections=pool_size)
+        )
     }
-    
+
+    # Budgets shared by every evaluator and worker thread, one per Bedrock API
+    rate_limiters = create_rate_limiters({
+        'invoke_agent': {'rpm': AGENT_RPM, 'tpm': AGENT_TPM},
+        'invoke_model': {'rpm': JUDGE_RPM, 'tpm': JUDGE_TPM},
+        'embeddings': {'rpm': EMBEDDING_RPM, 'tpm': EMBEDDING_TPM}
+    })
+
+    # In-flight limits for agent and judge calls, adapted from throttling feedback
+    concurrency_controllers = create_concurrency_controllers({
+        'invoke_agent': {'initial': AGENT_INITIAL_CONCURRENCY, 'max': AGENT_MAX_CONCURRENCY},
+        'invoke_model': {'initial': JUDGE_INITIAL_CONCURRENCY, 'max': JUDGE_MAX_CONCURRENCY}
+    })
+
+    # One retry policy for every outbound call, breakers are tracked per endpoint
+    retry_policy = RetryPolicy(
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+        deadline=RETRY_DEADLINE
+    )
+    circuit_breakers = CircuitBreakerRegistry(
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT
+    )
 
     return {
         'AGENT_ID': AGENT_ID,
@@ -84,13 +233,32 @@ def get_config() -> Dict[str, Any]:
         'MODEL_ID_EVAL_COT': MODEL_ID_EVAL_COT,
         'TOP_P': TOP_P,
         'ENABLE_TRACE': True,
-        'clients': shared_clients
+        'KEEP_TRACE_EVENTS': KEEP_TRACE_EVENTS,
+        'JUDGE_PROMPT_CACHE': JUDGE_PROMPT_CACHE,
+        'JUDGE_STRUCTURED_OUTPUT': JUDGE_STRUCTURED_OUTPUT,
+        'COT_INCREMENTAL': COT_INCREMENTAL,
+        'COT_HISTORY_TURNS': COT_HISTORY_TURNS,
+        'RAGAS_MAX_WORKERS': RAGAS_MAX_WORKERS,
+        'RAGAS_TIMEOUT': RAGAS_TIMEOUT,
+        'RAGAS_MAX_RETRIES': RAGAS_MAX_RETRIES,
+        'clients': shared_clients,
+        'rate_limiters': rate_limiters,
+        'concurrency_controllers': concurrency_controllers,
+        'retry_policy': retry_policy,
+        'circuit_breakers': circuit_breakers,
+        'embedding_cache': create_embedding_cache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES),
+        'judge_cache': create_judge_cache(JUDGE_CACHE_PATH, JUDGE_CACHE_MAX_MB),
+        'prompt_cache_stats': PromptCacheStats(),
+        'judge_output_stats': JudgeOutputStats(),
+        'cot_compactor': create_cot_compactor(COT_TOKEN_BUDGET, COT_DUPLICATE_THRESHOLD),
+        'sql_fast_path': create_sql_fast_path(SQL_FAST_PATH),
+        'sql_executor': create_sql_executor(SQL_SNAPSHOT_DIR, SQL_EXECUTION_TIMEOUT, SQL_EXECUTION_MAX_ROWS)
     }
 
 
 def create_evaluator(eval_type: str, config: Dict[str, Any], 
                     agent_info: Dict[str, Any], data: Dict[str, Any], trace_id: str, 
-                    session_id: str, trajectory_id: str) -> Any:
+                    session_id: str, trajectory_id: str, position: int = 0) -> Any:
     """Create appropriate evaluator based on evaluation type"""
     evaluator_map = {
         'RAG': RAGEvaluator,
@@ -112,19 +280,322 @@ def create_evaluator(eval_type: str, config: Dict[str, Any],
         trace_id=trace_id,
         session_id=session_id,
         trajectory_id = trajectory_id,
-        question_id=data['question_id']
+        question_id=data['question_id'],
+        position=position
     )
 
-def run_evaluation(data_file: str) -> None:
-    """Main evaluation function"""
-    # Setup
+def record_outcome(summary: Dict[str, Any], outcome: str, question_id: Any, summary_lock: threading.Lock) -> None:
+    """Add a question outcome ('succeeded', 'skipped' or 'failed') to its trajectory summary"""
+    with summary_lock:
+        summary[outcome].append(question_id)
+        summary['duration'] = max(summary['duration'], time.time() - summary['start_time'])
+
+def run_trajectory(trajectory_id: str, questions: List[Dict[str, Any]], config: Dict[str, Any],
+                   agent_info: Dict[str, Any], judge_queue: queue.Queue, summary_lock: threading.Lock,
+                   stop_event: threading.Event) -> Dict[str, Any]:
+    """
+    Run the agent stage of every question of one trajectory in order on a single agent session
+
+    Answered questions are handed to the judge stage through judge_queue, so the next question
+    is sent to the agent while the previous one is still being judged. The queue is bounded,
+    which holds the trajectory back when judging falls behind.
+
+    With COT_INCREMENTAL, each question's CoT judge waits for the earlier turns of the trajectory
+    to be answered and gets a rolling summary of them, and the trajectory is judged as a whole
+    once every question is answered, possibly while the judge workers are still on its questions.
+
+    Args:
+        trajectory_id (str): Identifier of the trajectory in the data file
+        questions (List[Dict[str, Any]]): Questions of the trajectory, in evaluation order
+        config (Dict[str, Any]): Shared configuration and clients from get_config()
+        agent_info (Dict[str, Any]): Information about the agent being evaluated
+        judge_queue (queue.Queue): Bounded queue feeding the judge workers
+        summary_lock (threading.Lock): Guards the summaries shared with the judge workers
+        stop_event (threading.Event): Set when the run is interrupted, checked between questions
+
+    Returns:
+        Dict containing the per-trajectory summary, completed by the judge workers
+    """
+    journal = config.get('run_journal')
+
+    # Resumed trajectories continue on their recorded session
+    session_id = journal.get_session(trajectory_id) if journal else None
+    if session_id:
+        print(f"Resuming session ID for {trajectory_id}: {session_id}")
+    else:
+        # Create unqiue session ID for trajectory
+        session_id = str(uuid.uuid4())
+        print(f"Session ID for {trajectory_id}: {session_id}")
+        if journal:
+            journal.record_session(trajectory_id, session_id)
+
+    summary = {
+        'trajectory_id': trajectory_id,
+        'session_id': session_id,
+        'total': len(questions),
+        'succeeded': [],
+        'skipped': [],
+        'failed': [],
+        'start_time': time.time(),
+        'duration': 0.0
+    }
+
+    # Turns of the trajectory for incremental CoT judging, every question completes its turn exactly once
+    cot_history = TrajectoryCotHistory(len(questions), config['COT_HISTORY_TURNS'], stop_event) if config.get('COT_INCREMENTAL') else None
+    evaluator = None
+
+    #go through each question in each trajectory
+    for index, question in enumerate(questions):
+        if stop_event.is_set():
+            break
+
+        cot_turn = cot_history.turn(index) if cot_history else None
+
+        #get the evaluation type for the question
+        eval_type = question.get('question_type')
+        question_id = question['question_id']
+
+        print(f"Running {trajectory_id} - {eval_type} - Q{question_id} evaluation")
+
+        trace_id = str(uuid.uuid1())
 
+        try:
+            evaluator = create_evaluator(
+                eval_type=eval_type,
+                config=config,
+                agent_info=agent_info,
+                data=question,
+                trace_id=trace_id,
+                session_id=session_id,
+                trajectory_id=trajectory_id,
+                position=index
+            )
 
+            if evaluator.is_evaluated():
+                print(f"{trajectory_id} question {question_id} already evaluated, skipping")
+                record_outcome(summary, 'succeeded', question_id, summary_lock)
+                if cot_turn:
+                    cot_turn.complete(evaluator.journaled_turn_summary(cot_turn.number))
+                continue
+
+            agent_output = evaluator.run_agent_stage()
+            if agent_output is None:
+                print(f"Skipping {trajectory_id} question {question_id} due to evaluation failure")
+                record_outcome(summary, 'skipped', question_id, summary_lock)
+                if cot_turn:
+                    cot_turn.complete(None)
+                continue
+
+            if cot_turn:
+                cot_turn.complete(evaluator.turn_summary(cot_turn.number, agent_output))
+
+            # Blocks while the judge stage is backed up
+            judge_queue.put({'evaluator': evaluator, 'agent_output': agent_output, 'summary': summary, 'cot_turn': cot_turn})
+
+        except Exception as e:
+            print(f"Failed to evalute for {trajectory_id} question {question_id}: {str(e)}")
+            record_outcome(summary, 'failed', question_id, summary_lock)
+            if cot_turn:
+                cot_turn.complete(None)
+            #if not a bedrock error, continue to next question
+            continue
+
+    if cot_history:
+        if stop_event.is_set():
+            cot_history.cancel()
+        elif config.get('batch_judge'):
+            print(f"Trajectory CoT judgement of {trajectory_id} skipped in batch judge mode")
+        elif evaluator is not None:
+            # Every turn is completed once answered, so this does not wait for the judge workers
+            evaluator.run_trajectory_judge(cot_history)
+
+    return summary
+
+def run_judge_worker(judge_queue: queue.Queue, summary_lock: threading.Lock, stop_event: threading.Event) -> None:
+    """Judge answered questions from judge_queue until a None sentinel arrives, or the run is interrupted and the queue is empty"""
+    while True:
+        try:
+            item = judge_queue.get(timeout=1)
+        except queue.Empty:
+            if stop_event.is_set():
+                return
+            continue
+
+        if item is None:
+            return
+
+        evaluator = item['evaluator']
+        trajectory_id, question_id = evaluator.trajectory_id, evaluator.question_id
+
+        try:
+            results = evaluator.run_judge_stage(item['agent_output'], item.get('cot_turn'))
+            if results is None:
+                print(f"Skipping {trajectory_id} question {question_id} due to evaluation failure")
+                record_outcome(item['summary'], 'skipped', question_id, summary_lock)
+            else:
+                print(f"Successfully evaluated {trajectory_id} question {question_id}")
+                record_outcome(item['summary'], 'succeeded', question_id, summary_lock)
+
+        except Exception as e:
+            print(f"Failed to evalute for {trajectory_id} question {question_id}: {str(e)}")
+            record_outcome(item['summary'], 'failed', question_id, summary_lock)
+
+def print_summary(summaries: List[Dict[str, Any]], config: Dict[str, Any], export_metrics: Dict[str, int] = None) -> None:
+    """Print the per-trajectory results, shared rate limiter, concurrency, circuit breaker and trace export metrics, and tool latencies of an evaluation run"""
+    print("--------------------------------------")
+    print("Evaluation summary")
+    for summary in summaries:
+        print(f"{summary['trajectory_id']} (session {summary['session_id']}): "
+              f"{len(summary['succeeded'])}/{summary['total']} succeeded, "
+              f"{len(summary['skipped'])} skipped, {len(summary['failed'])} failed "
+              f"in {summary['duration']:.1f}s")
+        if summary['skipped']:
+            print(f"    skipped questions: {summary['skipped']}")
+        if summary['failed']:
+            print(f"    failed questions: {summary['failed']}")
+    for api, rate_limiter in config['rate_limiters'].items():
+        print(f"Rate limiter {api}: {rate_limiter.metrics()}")
+    for api, controller in config['concurrency_controllers'].items():
+        print(f"Concurrency {api}: {controller.metrics()}")
+    for endpoint, breaker_metrics in config['circuit_breakers'].metrics().items():
+        print(f"Circuit breaker {endpoint}: {breaker_metrics}")
+    if export_metrics:
+        print(f"Trace export: {export_metrics}")
+    if config.get('embedding_cache'):
+        print(f"Embedding cache: {config['embedding_cache'].metrics()}")
+    if config.get('judge_cache'):
+        print(f"Judge cache: {config['judge_cache'].metrics()}")
+    for judge, judge_metrics in config['prompt_cache_stats'].metrics().items():
+        print(f"Judge prompt tokens {judge}: {judge_metrics}")
+    for judge, judge_metrics in config['judge_output_stats'].metrics().items():
+        print(f"Judge output {judge}: {judge_metrics}")
+    if config.get('cot_compactor'):
+        print(f"CoT compaction: {config['cot_compactor'].metrics()}")
+    if config.get('sql_fast_path'):
+        print(f"SQL fast path: {config['sql_fast_path'].metrics()}")
+    if config.get('sql_executor'):
+        print(f"SQL execution: {config['sql_executor'].metrics()}")
+    if config.get('ragas_batcher'):
+        print(f"RAGAS batches: {config['ragas_batcher'].metrics()}")
+    if config.get('text2sql_packed_judge'):
+        print(f"Text2SQL packed judge: {config['text2sql_packed_judge'].metrics()}")
+    if config.get('batch_judge'):
+        print(f"Batch judge records queued: {config['batch_judge'].metrics()}")
+
+    # Tools holding the most agent wall time first
+    tool_summary = config['tool_latency'].summary()
+    if tool_summary:
+        print("Tool latency (seconds):")
+        for entry in tool_summary:
+            print(f"    {entry['tool']}: {entry['count']} call(s), total {entry['total']}, "
+                  f"p50 {entry['p50']}, p95 {entry['p95']}, p99 {entry['p99']}, max {entry['max']}")
+        config['metrics_log'].record('tool_latency', {'tools': tool_summary})
+    print("--------------------------------------")
+
+def get_journal_path(data_file: str) -> str:
+    """Run journal path of a data file"""
+    data_name = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(RUN_JOURNAL_DIR, f"{data_name}.journal.jsonl")
+
+def get_metrics_path(data_file: str) -> str:
+    """Agent metrics path of a data file"""
+    data_name = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(AGENT_METRICS_DIR, f"{data_name}.metrics.jsonl")
+
+def get_batch_dir(data_file: str) -> str:
+    """Batch judging directory of a data file"""
+    data_name = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(BATCH_JUDGE_DIR, data_name)
+
+def get_batch_backend() -> Any:
+    """Backend running the batch judging jobs, Bedrock batch inference or the local stand-in"""
+    if BATCH_JUDGE_BACKEND == 'local':
+        runtime = boto3.client('bedrock-runtime', region_name=AWS_BEDROCK_REGION)
+        return LocalBatchBackend(
+            lambda model_id, body: json.loads(runtime.invoke_model(modelId=model_id, body=json.dumps(body))['body'].read())
+        )
+    return BedrockBatchBackend(
+        boto3.client('bedrock', region_name=AWS_BEDROCK_REGION),
+        boto3.client('s3', region_name=AWS_BEDROCK_REGION),
+        BATCH_JUDGE_S3_URI,
+        BATCH_JUDGE_ROLE_ARN
+    )
+
+def submit_batch(data_file: str) -> None:
+    """Submit the queued judge calls of a data file's batch run"""
+    try:
+        jobs = submit_batch_jobs(get_batch_dir(data_file), get_batch_backend())
+        print(f"{len(jobs)} batch judge job(s) recorded in {get_batch_dir(data_file)}, "
+              f"run `python3 driver.py --ingest-batch` once they complete")
+    except Exception as e:
+        print(f"Failed to submit batch judge jobs, retry with `python3 driver.py --submit-batch`: {str(e)}")
+
+def ingest_batch(data_file: str) -> Dict[str, int]:
+    """Attach the scores of a data file's completed batch judge jobs to their Langfuse traces"""
+    setup_environment()
+    exporter = get_trace_exporter(max_queue_size=TRACE_EXPORT_QUEUE_SIZE, batch_size=TRACE_EXPORT_BATCH_SIZE,
+                                  flush_interval=TRACE_EXPORT_FLUSH_INTERVAL)
+    judge_cache = create_judge_cache(JUDGE_CACHE_PATH, JUDGE_CACHE_MAX_MB)
+
+    counts = ingest_batch_results(get_batch_dir(data_file), get_batch_backend(), exporter, judge_cache)
+
+    if judge_cache:
+        judge_cache.close()
+    export_metrics = shutdown_trace_exporter()
+    print(f"Batch judging: {counts}")
+    print(f"Trace export: {export_metrics}")
+    return counts
+
+def run_evaluation(data_file: str, max_concurrency: int = MAX_CONCURRENT_TRAJECTORIES,
+                   resume: bool = False, replay: bool = False) -> List[Dict[str, Any]]:
+    """
+    Main evaluation function
+
+    Trajectories are independent of each other and run in parallel on a worker pool,
+    while the questions inside one trajectory stay ordered on their shared session.
+    Judging and trace upload run on a separate pool of judge workers, overlapping
+    with the agent calls of the following questions. Completed stages are recorded in a run journal so an interrupted run can be resumed.
+
+    Args:
+        data_file (str): Path to the trajectories data file
+        max_concurrency (int): Number of trajectories evaluated at the same time
+        resume (bool): Skip the stages completed by the previous run of this data file
+        replay (bool): Re-judge the recorded agent responses instead of invoking the agent
+
+    Returns:
+        List of per-trajectory summaries
+    """
+    # Setup
     print("data_file", data_file)
     setup_environment()
+    get_trace_exporter(max_queue_size=TRACE_EXPORT_QUEUE_SIZE, batch_size=TRACE_EXPORT_BATCH_SIZE,
+                       flush_interval=TRACE_EXPORT_FLUSH_INTERVAL)
 
-    print(111)
     config = get_config()
+    config['run_journal'] = RunJournal(get_journal_path(data_file), resume=resume)
+    config['response_store'] = AgentResponseStore(RESPONSE_STORE_DIR)
+    config['metrics_log'] = MetricsLog(get_metrics_path(data_file))
+    config['tool_latency'] = ToolLatencyReport()
+    if RAGAS_BATCH_SIZE > 1:
+        # Each RAG question holds its judge worker until its batch is scored, so a batch never gets more rows than workers
+        ragas_batch_size = min(RAGAS_BATCH_SIZE, JUDGE_WORKERS)
+        if ragas_batch_size < RAGAS_BATCH_SIZE:
+            print(f"RAGAS_BATCH_SIZE {RAGAS_BATCH_SIZE} is above JUDGE_WORKERS, batching {ragas_batch_size} rows at most")
+        config['ragas_batcher'] = MicroBatcher(evaluate_ragas_batch, batch_size=ragas_batch_size,
+                                               max_wait=RAGAS_BATCH_MAX_WAIT, name="ragas")
+    if TEXT2SQL_JUDGE_PACK_SIZE > 1:
+        # Each Text2SQL question holds its judge worker until its pack is scored, so a pack never gets more questions than workers
+        text2sql_pack_size = min(TEXT2SQL_JUDGE_PACK_SIZE, JUDGE_WORKERS)
+        if text2sql_pack_size < TEXT2SQL_JUDGE_PACK_SIZE:
+            print(f"TEXT2SQL_JUDGE_PACK_SIZE {TEXT2SQL_JUDGE_PACK_SIZE} is above JUDGE_WORKERS, packing {text2sql_pack_size} questions at most")
+        config['text2sql_packed_judge'] = PackedText2SQLJudge()
+        config['text2sql_judge_batcher'] = MicroBatcher(config['text2sql_packed_judge'], batch_size=text2sql_pack_size,
+                                                        max_wait=TEXT2SQL_JUDGE_PACK_MAX_WAIT, name="text2sql-judge")
+    if JUDGE_MODE == 'batch':
+        config['batch_judge'] = BatchJudgeQueue(get_batch_dir(data_file))
+    config['AGENT_RESPONSE_MODE'] = 'replay' if replay else 'record'
+    if replay:
+        print(f"Replaying recorded agent responses from {RESPONSE_STORE_DIR}")
     
     # Initialize clients and extractors
     extractor = AgentInfoExtractor(config['clients']['bedrock_agent_client'])
@@ -133,57 +604,90 @@ def run_evaluation(data_file: str) -> None:
     # Load and process data
     with open(data_file, 'r') as f:
         data_dict = json.load(f)
-        
+
+    max_concurrency = max(1, min(max_concurrency, len(data_dict) or 1))
+    print(f"Evaluating {len(data_dict)} trajectories with {max_concurrency} worker(s)")
+
+    stop_event = threading.Event()
+    summary_lock = threading.Lock()
+    summaries = {}
+
+    # Judge stage: bounded queue consumed by its own worker pool
+    judge_queue = queue.Queue(maxsize=JUDGE_QUEUE_SIZE)
+    judge_executor = ThreadPoolExecutor(max_workers=JUDGE_WORKERS, thread_name_prefix="judge")
+    judge_futures = [judge_executor.submit(run_judge_worker, judge_queue, summary_lock, stop_event) for _ in range(JUDGE_WORKERS)]
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="trajectory")
+
+    try:
         #For each data file, go into each trajectory
-        for trajectoryID, questions in data_dict.items():
-            #Iterate through all the questions in each trajectory
-            
-            # Create unqiue session ID for trajectory
-            session_id = str(uuid.uuid4())
-            print(f"Session ID for {trajectoryID}: {session_id}")
-
-            #go through each question in each trajectory
-            for question in questions:
-                #get the evaluation type for the question
-                eval_type = question.get('question_type')
-                question_id = question['question_id']
-
-                print(f"Running {trajectoryID} - {eval_type} - Q{question_id} evaluation")
-
-                trace_id = str(uuid.uuid1())
-                              
-                try:
-                    evaluator = create_evaluator(
-                        eval_type=eval_type,
-                        config=config,
-                        agent_info=agent_info,
-                        data=question,
-                        trace_id=trace_id,
-                        session_id=session_id,
-                        trajectory_id= trajectoryID
-                    )
-
-
-                    results = evaluator.run_evaluation()
-                    if results is None:
-                        print(f"Skipping {trajectoryID} question {question_id} due to evaluation failure")
-                        time.sleep(90)
-                        continue
-                        
-                    print(f"Successfully evaluated {trajectoryID} question {question_id}")
-                    # print(results)
-                    time.sleep(90)
-                    
-                except Exception as e:
-                    print(f"Failed to evalute for {trajectoryID} question {question_id}: {str(e)}")
-                    #if not a bedrock error, continue to next question
-                    time.sleep(90)
-                    continue
-                
-                except KeyboardInterrupt:
-                    sys.exit(0)
+        futures = {
+            executor.submit(run_trajectory, trajectoryID, questions, config, agent_info,
+                            judge_queue, summary_lock, stop_event): trajectoryID
+            for trajectoryID, questions in data_dict.items()
+        }
+
+        for future in as_completed(futures):
+            trajectoryID = futures[future]
+            try:
+                summaries[trajectoryID] = future.result()
+            except Exception as e:
+                print(f"Failed to evaluate {trajectoryID}: {str(e)}")
+
+        # Every answered question is queued, let the judge workers drain the queue
+        for _ in judge_futures:
+            judge_queue.put(None)
+        for future in judge_futures:
+            future.result()
+
+    except KeyboardInterrupt:
+        # Let in-flight questions finish, but do not start any new ones
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        judge_executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(0)
+
+    executor.shutdown()
+    judge_executor.shutdown()
+    if config.get('ragas_batcher'):
+        config['ragas_batcher'].close()
+    if config.get('text2sql_judge_batcher'):
+        config['text2sql_judge_batcher'].close()
+    if config.get('embedding_cache'):
+        config['embedding_cache'].close()
+    if config.get('judge_cache'):
+        config['judge_cache'].close()
+
+    # Send the remaining traces before closing the journal, their upload is recorded in it
+    export_metrics = shutdown_trace_exporter()
+    config['run_journal'].close()
+
+    # Report in data file order regardless of completion order
+    ordered_summaries = [summaries[trajectoryID] for trajectoryID in data_dict if trajectoryID in summaries]
+    print_summary(ordered_summaries, config, export_metrics)
+
+    # Judge calls queued during the run go out as batch jobs once every question is answered
+    if config.get('batch_judge') and config['batch_judge'].metrics():
+        submit_batch(data_file)
+    return ordered_summaries
             
 # Driver
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a Bedrock agent against a trajectories data file")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume the last run of the data file, skipping the stages it completed")
+    parser.add_argument('--replay', action='store_true',
+                        help="Re-run parsing and judging on recorded agent responses without invoking the agent")
+    parser.add_argument('--submit-batch', action='store_true',
+                        help="Submit the judge calls queued by a JUDGE_MODE=batch run that were not submitted yet")
+    parser.add_argument('--ingest-batch', action='store_true',
+                        help="Attach the scores of completed batch judge jobs to their Langfuse traces")
+    args = parser.parse_args()
+
     #Name of the data file
-    run_evaluation(DATA_FILE_PATH)
\ No newline at end of file
+    if args.submit_batch:
+        submit_batch(DATA_FILE_PATH)
+    elif args.ingest_batch:
+        ingest_batch(DATA_FILE_PATH)
+    else:
+        run_evaluation(DATA_FILE_PATH, resume=args.resume, replay=args.replay)
\ No newline at end of file
@@ -1,11 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
-from langfuse import Langfuse
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import helpers.cot_helper as cot_helper
-import time
+from helpers.trace_exporter import get_trace_exporter
+from helpers.retry_helper import call_with_retry
+from helpers.run_journal import content_hash
+from helpers.trace_assembler import assemble_trace
+from helpers.cot_history import CotTurn, TrajectoryCotHistory, summarize_turn, render_turn
+from helpers.stream_parser import StreamParser, StreamExtractor, AnswerExtractor, TokenUsageExtractor, TraceStepExtractor, StreamTimingExtractor, ToolCallExtractor
+from helpers.response_store import AgentResponseStore
 import json
 import re
+import time
 
 class ToolEvaluator(ABC):
     def __init__(self, 
@@ -17,7 +25,8 @@ class ToolEvaluator(ABC):
                  trace_id: str,
                  session_id: str,
                  question_id: int,
-                 trajectory_id: str):
+                 trajectory_id: str,
+                 position: int = 0):
         """
         Base class for tool evaluation
         
@@ -30,6 +39,8 @@ class ToolEvaluator(ABC):
             trace_id (str): Unique identifier for the evaluation trace
             session_id (str): Identifier for the evaluation session
             question_id (int): Identifier for the specific question
+            trajectory_id (str): Trajectory the question belongs to
+            position (int): Index of the question in its trajectory
         """
         self.config = config
         self.agent_info = agent_info
@@ -40,8 +51,27 @@ class ToolEvaluator(ABC):
         self.session_id = session_id
         self.question_id = question_id
         self.trajectory_id = trajectory_id
+        self.position = position
         self.clients = config.get('clients', {})
-        self.langfuse = Langfuse()
+        self.rate_limiters = config.get('rate_limiters', {})
+        self.concurrency_controllers = config.get('concurrency_controllers', {})
+        self.retry_policy = config.get('retry_policy')
+        self.circuit_breakers = config.get('circuit_breakers')
+        self.journal = config.get('run_journal')
+        self.response_store = config.get('response_store')
+        self.replay = config.get('AGENT_RESPONSE_MODE') == 'replay'
+        self.recording = None
+        self.assembled_trace = None
+        self.invoke_started = None
+        self.stream_metrics = None
+        self.tool_calls = None
+        self.metrics_log = config.get('metrics_log')
+        self.tool_latency = config.get('tool_latency')
+        self.judge_cache = config.get('judge_cache')
+        self.batch_judge = config.get('batch_judge')
+        self.question_hash = content_hash(question, ground_truth)
+        self.completed = self.journal.completed_stages(trajectory_id, question_id, self.question_hash) if self.journal else {}
+        self.exporter = get_trace_exporter()
         
         self._initialize_clients()
 
@@ -51,15 +81,12 @@ class ToolEvaluator(ABC):
         pass
 
     @abstractmethod
-    def invoke_agent(self, tries: int = 1) -> Tuple[Dict[str, Any], datetime]:
+    def _invoke_and_process(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Invoke the specific tool and process its response
+        Invoke the specific tool once and process its streamed response
         
-        Args:
-            tries (int): Number of retry attempts
-            
         Returns:
-            Tuple containing processed response and start time
+            Tuple containing full trace and processed response
         """
         pass
 
@@ -76,30 +103,185 @@ class ToolEvaluator(ABC):
         """
         pass
 
-    def _add_agent_collaborators(self, agents_used, trimmed_orc_trace):
+    @contextmanager
+    def _concurrency_slot(self, api: str) -> Iterator[None]:
+        """Hold an in-flight slot of the shared adaptive concurrency limit for an API"""
+        controller = self.concurrency_controllers.get(api)
+        if controller is None:
+            yield
+        else:
+            with controller.slot():
+                yield
+
+    def _retrying_call(self, endpoint: str, call: Callable[[], Any]) -> Any:
+        """
+        Run a call under the shared retry policy and the circuit breaker of its endpoint
+        
+        Args:
+            endpoint (str): Endpoint name, each endpoint has its own breaker state
+            call (Callable[[], Any]): Function making the call, run once per attempt
+            
+        Returns:
+            Result of the call
+        """
+        breaker = self.circuit_breakers.get(endpoint) if self.circuit_breakers else None
+        return call_with_retry(call, endpoint, policy=self.retry_policy, breaker=breaker)
 
-        for item in trimmed_orc_trace:
-            # Check for invocationInput
-            if 'invocationInput' in item:
-                if 'agentCollaboratorInvocationInput' in item['invocationInput']:
-                    name = item['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName']
-                    agents_used.add(name)
+    def _guarded_call(self, api: str, call: Callable[[], Any], tokens: Optional[int] = None,
+                      usage_fn: Optional[Callable[[Any], int]] = None, endpoint: Optional[str] = None) -> Any:
+        """
+        Run an outbound Bedrock call within the shared concurrency limit, budget and retry policy of its API
+        
+        Args:
+            api (str): API of the call ('invoke_agent', 'invoke_model' or 'embeddings')
+            call (Callable[[], Any]): Function making the call
+            tokens (Optional[int]): Estimated tokens of the call, None uses the observed average
+            usage_fn (Optional[Callable[[Any], int]]): Returns the tokens actually used from the call result
+            endpoint (Optional[str]): Circuit breaker endpoint, defaults to the API name
             
-            # Check for observation with agentCollaboratorInvocationOutput
-            if 'observation' in item:
-                if 'agentCollaboratorInvocationOutput' in item['observation']:
-                    name = item['observation']['agentCollaboratorInvocationOutput']['agentCollaboratorName']
-                    agents_used.add(name)
+        Returns:
+            Result of the call
+        """
+        def attempt():
+            # Slots and budget are taken per attempt, backoff sleeps hold neither
+            with self._concurrency_slot(api):
+                rate_limiter = self.rate_limiters.get(api)
+                if rate_limiter is None:
+                    return call()
+
+                estimated_tokens = int(rate_limiter.average_tokens) if tokens is None else tokens
+                rate_limiter.acquire(tokens=estimated_tokens)
 
-        return agents_used
+                result = call()
+                if usage_fn:
+                    rate_limiter.record_usage(estimated_tokens, usage_fn(result))
+                return result
 
-        # print("Collaborators Used for Question: {}".format(collaborator_names))
+        return self._retrying_call(endpoint or api, attempt)
+
+    def _response_store_key(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        Key of this question's invocation in the agent response store, and the fields it is built from
+
+        The trajectory and position are part of the key, since the same question asked at another
+        point of a session gets an answer shaped by the earlier turns.
+        """
+        key_fields = {
+            'agent_id': self.config['AGENT_ID'],
+            'agent_alias_id': self.config['AGENT_ALIAS_ID'],
+            'agent_version': self.agent_info.get('agentVersion'),
+            'trajectory_id': self.trajectory_id,
+            'position': self.position,
+            'question': self.question
+        }
+        return AgentResponseStore.make_key(**key_fields), key_fields
+
+    def _invoke_agent_raw(self) -> Dict[str, Any]:
+        """
+        Invoke the agent, or load its recorded response in replay mode
 
-    def _create_trace(self) -> Any:
+        Live completion streams are teed into a response store recording as they are consumed,
+        so the events are written to disk instead of held in memory, and the recording is
+        completed once the invocation has been processed.
+
+        Returns:
+            Raw invoke_agent response whose 'completion' yields the stream events
+        """
+        if self.replay:
+            key, key_fields = self._response_store_key()
+            recording = self.response_store.load(key) if self.response_store else None
+            if recording is None:
+                raise Exception(f"No recorded agent response for question {self.question_id} "
+                                f"(agent version {key_fields['agent_version']})")
+            return {'completion': iter(recording['events']), 'ResponseMetadata': recording['response_metadata']}
+
+        # Stream latencies are measured from here, per attempt
+        self.invoke_started = time.monotonic()
+        raw_response = self.bedrock_agent_runtime_client.invoke_agent(
+            inputText=self.question,
+            agentId=self.config['AGENT_ID'],
+            agentAliasId=self.config['AGENT_ALIAS_ID'],
+            sessionId=self.session_id,
+            enableTrace=self.config['ENABLE_TRACE']
+        )
+
+        if self.response_store:
+            # A retried attempt starts a new recording
+            if self.recording:
+                self.recording.abort()
+            recording = self.recording = self.response_store.record(*self._response_store_key())
+
+            def tee(completion):
+                for event in completion:
+                    recording.append(event)
+                    yield event
+
+            raw_response['completion'] = tee(raw_response['completion'])
+
+        return raw_response
+
+    def _parse_stream(self, raw_response: Dict[str, Any], extractors: List[StreamExtractor] = None) -> Dict[str, Any]:
+        """
+        Parse a completion stream in one pass
+
+        The answer, token usage, assembled trace steps and tool call latencies are always extracted, and the
+        evaluator adds the extractors of its own metadata. Live streams are also timed
+        (replayed ones have no meaningful latency).
+
+        Args:
+            raw_response (Dict[str, Any]): Response of _invoke_agent_raw
+            extractors (List[StreamExtractor]): Evaluator-specific extractors
+
+        Returns:
+            StreamParser.parse result, whose 'events' are the full trace
+        """
+        extractors = [AnswerExtractor(), TokenUsageExtractor(), TraceStepExtractor(), ToolCallExtractor()] + (extractors or [])
+        if not self.replay and self.invoke_started is not None:
+            extractors.append(StreamTimingExtractor(self.invoke_started))
+
+        parser = StreamParser(extractors, keep_events=self.config.get('KEEP_TRACE_EVENTS', True))
+        parsed = parser.parse(raw_response['completion'])
+        self.assembled_trace = parsed['assembled_trace']
+        self.stream_metrics = parsed.get('stream_metrics')
+        self.tool_calls = parsed['tool_calls']
+        return parsed
+
+    def invoke_agent(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any], datetime]:
+        """
+        Invoke the specific tool and process its response with retry logic
+        
+        Returns:
+            Tuple of (full_trace, processed_response, start_time)
+        """
+        agent_start_time = datetime.now()
+
+        # Replayed streams make no agent call, so they bypass limits and retries
+        if self.replay:
+            full_trace, processed_response = self._invoke_and_process()
+            return full_trace, processed_response, agent_start_time
+
+        try:
+            full_trace, processed_response = self._guarded_call(
+                'invoke_agent',
+                self._invoke_and_process,
+                usage_fn=lambda result: result[1]['input_tokens'] + result[1]['output_tokens']
+            )
+        except Exception:
+            if self.recording:
+                self.recording.abort()
+            raise
+
+        if self.recording:
+            self.recording.finish(processed_response['agent_generation_metadata'].get('ResponseMetadata', {}),
+                                  processed_response)
+
+        return full_trace, processed_response, agent_start_time
+
+    def _create_trace(self) -> None:
         """Create and initialize a Langfuse trace"""
         traj_num = re.findall(r'\d+$', self.trajectory_id)[0]
 
-        return self.langfuse.trace(
+        self.exporter.trace(
             id=self.trace_id,
             session_id=self.session_id,
             input=self.question,
@@ -109,12 +291,13 @@ class ToolEvaluator(ABC):
         )
 
 
-    def _handle_error(self, trace: Any, error: Exception, stage: str) -> None:
+    def _handle_error(self, error: Exception, stage: str) -> None:
         """Handle and log errors during evaluation without raising"""
         traj_num = re.findall(r'\d+$', self.trajectory_id)[0]
 
         error_message = f"{stage} error: {str(error)}"
-        trace.update(
+        self.exporter.trace(
+            id=self.trace_id,
             name=f"[ERROR] T{traj_num}-Q{self.question_id}-{self.eval_type}",
             metadata={"errorMessage": error_message},
             output={"Agent Error": error_message},
@@ -146,77 +329,155 @@ class ToolEvaluator(ABC):
             # print("Data: {}".format(orchestration_trace))
             return orchestration_trace
 
-    def combine_traces(self,full_trace):
-        
-        trace_ids = []
-        trace_steps = []
-        cur_dict = {}
-
-        def find_trace_id(data):
-            if isinstance(data, dict):
-                # If traceId is directly in this dictionary, return it
-                if 'traceId' in data:
-                    return data['traceId']
-                # Otherwise search through all values in the dictionary
-                for value in data.values():
-                    result = find_trace_id(value)
-                    if result:
-                        return result
-            # If the value is a list, search through its elements
-            elif isinstance(data, list):
-                for item in data:
-                    result = find_trace_id(item)
-                    if result:
-                        return result
-            return None
-            
-        #iterate through all the traces
-        for cur_trace in full_trace:
-            
-            cur_trace_id = find_trace_id(cur_trace)
-            #LOGIC FOR INITIALIZING NEW DICTIONARY
-            #only for the first instsance of a single trace ID
-            if cur_trace_id not in trace_ids: 
-                # print("Unique trace ID: {}".format(cur_trace_id))
-                #initialize new dict with the agent information
-                if cur_dict:
-                    trace_steps.append(cur_dict)
-                    cur_dict = {}
-                    
-                cur_dict = {key: value for key, value in cur_trace.items() if key != 'trace'}
-                
-                # print("Unique dict: {}".format(cur_dict))
-                trace_ids.append(cur_trace_id)
-                
-            #LOGIC FOR ADDING TO EXISTING DICTIOANRY
-            #append to cur_dict what's in trace.anytracetype (orchestrationTrace) and put the whole thing in there
-            
-            if 'orchestrationTrace' in cur_trace['trace']:
-                first_key = next(iter(cur_trace['trace']['orchestrationTrace']))
-                cur_dict[first_key] = cur_trace['trace']['orchestrationTrace'][first_key]
-        
-        if cur_dict:
-            trace_steps.append(cur_dict)
+    @staticmethod
+    def _parse_event_time(value: Any) -> Optional[datetime]:
+        """eventTime of a Bedrock trace event, which is an ISO string once restored from the run journal"""
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                return None
+        return None
 
-        return trace_steps
+    def _step_span_events(self, trace_step_spans: List[Dict[str, Any]], parent_id: str,
+                          fallback_end_time: datetime) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Span events of the agent trace steps, timed from the Bedrock trace events
 
+        A step starts at the eventTime of its first event and ends where the next step starts
+        (its own last event for the final step), so Langfuse orders the spans by their
+        timestamps rather than by arrival. step_index in the metadata breaks any remaining ties.
 
-    def run_evaluation(self) -> Dict[str, Any]:
-        """Run the complete evaluation pipeline"""
-        trace = self._create_trace()
+        Args:
+            trace_step_spans (List[Dict[str, Any]]): Steps from assemble_trace
+            parent_id (str): Observation the spans are attached to
+            fallback_end_time (datetime): End of steps whose trace events carry no eventTime
+
+        Returns:
+            List of ('span', kwargs) events for TraceExporter.batch
+        """
+        start_times = [self._parse_event_time(step.get('eventTime')) for step in trace_step_spans]
+        events = []
+        for index, step in enumerate(trace_step_spans):
+            start_time = start_times[index]
+            end_time = start_times[index + 1] if index + 1 < len(start_times) else None
+            end_time = end_time or self._parse_event_time(step.get('lastEventTime')) or start_time or fallback_end_time
+
+            events.append(('span', {
+                'id': f"{self.trace_id}-step-{index+1}",
+                'trace_id': self.trace_id,
+                'parent_observation_id': parent_id,
+                'name': "Agent Trace Step {}".format(index+1),
+                'start_time': start_time,
+                'end_time': end_time,
+                'input': step.get('modelInvocationInput'),
+                'output': {'Model Raw Response': step.get('modelInvocationOutput', {}).get('rawResponse'),
+                           "Model Rationale": step.get('rationale')},
+                'metadata': {"Model Output metadata": step.get('modelInvocationOutput', {}).get('metadata'),
+                             "Observation": step.get('observation'),
+                             "step_index": index + 1}
+            }))
+        return events
+
+    def _log_stream_metrics(self) -> None:
+        """Append the agent stream latencies of a live invocation to the local metrics log"""
+        if not self.metrics_log or not self.stream_metrics:
+            return
+        self.metrics_log.record('agent_stream', {
+            'trajectory_id': self.trajectory_id,
+            'question_id': self.question_id,
+            'trace_id': self.trace_id,
+            'session_id': self.session_id,
+            'eval_type': self.eval_type,
+            'agent_id': self.config['AGENT_ID'],
+            'agent_version': self.agent_info.get('agentVersion'),
+            **self.stream_metrics,
+            'tool_calls': [{'tool': call['tool'], 'duration': call['duration']} for call in self.tool_calls or []]
+        })
+
+    def _record_stage(self, stage: str, payload: Any = None) -> None:
+        """Record a completed stage in the run journal, if one is in use"""
+        if self.journal:
+            self.journal.record_stage(self.trajectory_id, self.question_id, self.question_hash, stage, payload)
+
+    def _build_results(self, processed_response: Dict[str, Any], evaluation_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Final results of an evaluated question"""
+        return {
+            'question_id': self.question_id,
+            'question': self.question,
+            'ground_truth': self.ground_truth,
+            'agent_response': processed_response,
+            'evaluation_results': evaluation_results,
+            'trace_id': self.trace_id
+        }
+
+    def is_evaluated(self) -> bool:
+        """Whether the run journal already holds every stage of this question"""
+        return 'trace_upload' in self.completed
+
+    def previous_results(self) -> Dict[str, Any]:
+        """Results of a question the run journal shows as evaluated"""
+        return self._build_results(self.completed['agent_response']['processed_response'], self.completed.get('domain_judge'))
+
+    def run_agent_stage(self) -> Optional[Dict[str, Any]]:
+        """
+        Invoke the agent (or restore its journaled response) and open the Langfuse trace
+
+        Returns:
+            Agent output passed to run_judge_stage, or None if the agent stage failed
+        """
+        agent_stage = self.completed.get('agent_response')
+
+        # Reuse the trace of the interrupted run, so the trace upload overwrites it instead of duplicating it
+        if agent_stage:
+            self.trace_id = agent_stage['trace_id']
+
+        self._create_trace()
 
         # Invoke try block
         try:
             
-            # Invoke tool and get processed response
-            full_trace, processed_response, agent_start_time = self.invoke_agent()
+            if agent_stage:
+                full_trace = agent_stage['full_trace']
+                processed_response = agent_stage['processed_response']
+                agent_start_time = datetime.fromisoformat(agent_stage['agent_start_time'])
+                agent_end_time = datetime.fromisoformat(agent_stage.get('agent_end_time', agent_stage['agent_start_time']))
+                # Only journaled when the raw events were not kept, else rebuilt from them
+                self.assembled_trace = agent_stage.get('assembled_trace')
+                self.stream_metrics = agent_stage.get('stream_metrics')
+                self.tool_calls = agent_stage.get('tool_calls')
+            else:
+                # Invoke tool and get processed response
+                full_trace, processed_response, agent_start_time = self.invoke_agent()
+                agent_end_time = datetime.now()
 
             #if there is no response, then raise an error
             if not processed_response or not processed_response.get('agent_answer'):
-                self._handle_error(trace, Exception("Failed to get or process agent response"), "Agent Processing")
+                self._handle_error(Exception("Failed to get or process agent response"), "Agent Processing")
                 return None
 
-            trace.update(
+            if not agent_stage:
+                payload = {
+                    'trace_id': self.trace_id,
+                    'full_trace': full_trace,
+                    'processed_response': processed_response,
+                    'agent_start_time': agent_start_time,
+                    'agent_end_time': agent_end_time,
+                    'stream_metrics': self.stream_metrics,
+                    'tool_calls': self.tool_calls
+                }
+                if not self.config.get('KEEP_TRACE_EVENTS', True):
+                    payload['assembled_trace'] = self.assembled_trace
+                self._record_stage('agent_response', payload)
+                self._log_stream_metrics()
+
+            if self.tool_latency and self.tool_calls:
+                self.tool_latency.add(self.tool_calls)
+
+            self.exporter.trace(
+                id=self.trace_id,
                 metadata={
                     "Ground Truth": self.ground_truth,
                     str(self.eval_type + " Evaluation Model"): self.config['MODEL_ID_EVAL'],
@@ -224,132 +485,367 @@ class ToolEvaluator(ABC):
                 },
                 output=processed_response['agent_answer'] 
             )
-            
-            # Evaluation try block
-            try:
-                
-                # Eliminate unneeded information for COT evaluation
-                orc_trace_full = [item['trace']['orchestrationTrace'] for item in full_trace if 'orchestrationTrace' in item['trace']]
+
+            return {
+                'full_trace': full_trace,
+                'processed_response': processed_response,
+                'agent_start_time': agent_start_time,
+                'agent_end_time': agent_end_time,
+                'assembled_trace': self.assembled_trace,
+                'stream_metrics': self.stream_metrics,
+                'tool_calls': self.tool_calls
+            }
                 
-                #Combine all the traces with the same trace ID
-                trace_step_spans = self.combine_traces(full_trace)
+        except Exception as e:
+            self._handle_error(e, "Agent Invocation")
+            return None
+        
+        except KeyboardInterrupt as e:
+            self._handle_error(e, "Manually Stopped Evaluation Job")
+            raise KeyboardInterrupt
+
+    def _run_cot_judge(self, trace_steps: str, processed_response: Dict[str, Any],
+                       cot_turn: Optional[CotTurn] = None) -> Tuple[Dict[str, Any], str]:
+        """Chain of thought judge, or its journaled result; with a CoT turn, given the earlier turns of the trajectory"""
+        if 'cot_judge' in self.completed:
+            return self.completed['cot_judge']['results'], self.completed['cot_judge']['system_prompt']
+
+        # Waits until the earlier turns of the trajectory are answered
+        prior_turns = cot_turn.prior_turns() if cot_turn else None
+
+        # Chain of thought processes whole agent trace + agent info
+        cot_eval_results, cot_system_prompt = cot_helper.evaluate_cot(
+            trace_steps, processed_response['agent_answer'], self.agent_info,
+            self.clients['bedrock_runtime'], self.config['MODEL_ID_EVAL_COT'],
+            call_guard=lambda call, **kwargs: self._guarded_call(
+                'invoke_model', call, endpoint=f"converse:{self.config['MODEL_ID_EVAL_COT']}", **kwargs
+            ),
+            judge_cache=self.judge_cache,
+            defer=self._defer_judge('cot', 'COT_', 'cot', observation_id=f"{self.trace_id}-cot",
+                                    metrics=cot_helper.COT_METRICS) if self.batch_judge else None,
+            cache_prompt=self.config.get('JUDGE_PROMPT_CACHE', False),
+            cache_stats=self.config.get('prompt_cache_stats'),
+            prior_turns=prior_turns,
+            structured_output=self.config.get('JUDGE_STRUCTURED_OUTPUT', True),
+            output_stats=self.config.get('judge_output_stats')
+        )
+        self._record_stage('cot_judge', {'results': cot_eval_results, 'system_prompt': cot_system_prompt})
+        return cot_eval_results, cot_system_prompt
 
-                trimmed_orc_trace = [item['rationale']['text'] for item in orc_trace_full if 'rationale' in item]
+    def _defer_judge(self, name: str, score_prefix: str, result_format: str,
+                     observation_id: Optional[str] = None, metrics: Optional[List[str]] = None) -> Callable[..., None]:
+        """
+        Callback queueing a judge call of this question for batch inference
 
-                trace_steps = ""
-                for i, item in enumerate(trimmed_orc_trace, 1):
-                    trace_steps += f"Step {i}: {item}\n"
+        Args:
+            name (str): Judge name, unique within the question
+            score_prefix (str): Prefix of the score names, as used by on-demand judging
+            result_format (str): 'cot' for flat {metric: score} results, 'metrics_scores' for domain judges
+            observation_id (Optional[str]): Observation the scores are attached to
+            metrics (Optional[List[str]]): Metrics the judge output must hold
 
-                agents_used = {self.agent_info['agentName']}
+        Returns:
+            Function of (model id, invoke_model body, judge cache key or None)
+        """
+        def defer(model_id: str, model_input: Dict[str, Any], cache_key: Optional[str]) -> None:
+            self.batch_judge.add(f"{self.trace_id}-{name}", model_id, model_input, {
+                'trace_id': self.trace_id,
+                'observation_id': observation_id,
+                'score_prefix': score_prefix,
+                'format': result_format,
+                'metrics': metrics,
+                'cache_key': cache_key
+            })
+        return defer
+
+    def _run_domain_judge(self, processed_response: Dict[str, Any]) -> Dict[str, Any]:
+        """Tool-specific judge (evaluate_response), or its journaled result"""
+        if 'domain_judge' in self.completed:
+            return self.completed['domain_judge']
+
+        # Prepare metadata and evaluate
+        evaluation_metadata = {
+            'question': self.question,
+            'ground_truth': self.ground_truth,
+            'agent_response': processed_response.get('agent_answer'),
+            'evaluation_metadata': processed_response.get('agent_generation_metadata'),
+            **self.config
+        }
+
+        evaluation_results = self.evaluate_response(evaluation_metadata)
+        self._record_stage('domain_judge', evaluation_results)
+        return evaluation_results
+
+    def turn_summary(self, number: int, agent_output: Dict[str, Any]) -> Dict[str, Any]:
+        """Summary of this question as a turn of its trajectory, for incremental CoT judging"""
+        assembled_trace = agent_output.get('assembled_trace') or assemble_trace(agent_output['full_trace'])
+        return summarize_turn(number, self.question, agent_output['processed_response'].get('agent_answer'),
+                              assembled_trace['rationales'])
+
+    def journaled_turn_summary(self, number: int) -> Optional[Dict[str, Any]]:
+        """Turn summary of a question the run journal shows as evaluated"""
+        if 'agent_response' not in self.completed:
+            return None
+        return self.turn_summary(number, self.completed['agent_response'])
 
-                # Add collaborator agents if multi-agent in use
-                if self.agent_info['agentType'] == "MULTI-AGENT":
-                    agents_used = self._add_agent_collaborators(agents_used, orc_trace_full)
+    def run_judge_stage(self, agent_output: Dict[str, Any], cot_turn: Optional[CotTurn] = None) -> Optional[Dict[str, Any]]:
+        """
+        Judge the agent output (CoT and domain judges) and upload the Langfuse trace
 
-                # Chain of thought processes whole agent trace + agent info
-                cot_eval_results, cot_system_prompt = cot_helper.evaluate_cot(trace_steps, processed_response['agent_answer'],self.agent_info, self.clients['bedrock_runtime'], self.config['MODEL_ID_EVAL_COT'])
-                
-                # Create an evaluation generation
-                agent_generation = trace.generation(
-                    name= "Agent Generation Information",
-                    input=[
-                        {"role": "system", "content": self.agent_info['agentInstruction']},
-                        {"role": "user", "content": self.question}
-                    ],
-                    model=self.agent_info['agentModel'],
-                    model_parameters={"temperature": self.config['TEMPERATURE']},
-                    start_time=agent_start_time,
-                    metadata=processed_response.get('agent_generation_metadata')
-                )
+        Does not touch the agent session, so it can run while the next question of the
+        trajectory is already being answered. The two judges run concurrently and are isolated
+        from each other: the scores of one are uploaded even if the other fails.
 
-                agent_generation.end(
-                    output=processed_response.get('agent_answer'),
-                    usage_details={
-                        "input": processed_response.get('input_tokens'),
-                        "output": processed_response.get('output_tokens')
-                    }
-                )
+        Args:
+            agent_output (Dict[str, Any]): Output of run_agent_stage
+            cot_turn (Optional[CotTurn]): Position of the question in its trajectory's CoT history,
+                for incremental CoT judging
 
-                #CHAIN OF THOUGHT EVALUATION SECTION START 
+        Returns:
+            Evaluation results, or None if judging failed
+        """
+        full_trace = agent_output['full_trace']
+        processed_response = agent_output['processed_response']
+        agent_start_time = agent_output['agent_start_time']
+        agent_end_time = agent_output['agent_end_time']
+        stream_metrics = agent_output.get('stream_metrics')
+        tool_calls = agent_output.get('tool_calls')
 
-                # Create generation based on CoT output
-                cot_generation = trace.generation(
-                    name="CoT Evaluation LLM-As-Judge Generation",
-                    input=[
-                        {"role": "system", "content": cot_system_prompt},
-                        {"role": "user", "content": self.question}
-                    ],
-                    output=cot_eval_results,
-                    metadata={"agents_used": agents_used, 'model_used': self.config['MODEL_ID_EVAL_COT']}
-                )
+        try:
+            
+            # Trace steps, rationales and collaborators, assembled while the stream was parsed
+            assembled_trace = agent_output.get('assembled_trace') or assemble_trace(full_trace)
+            trace_step_spans = assembled_trace['steps']
 
+            compaction_report = None
+            cot_compactor = self.config.get('cot_compactor')
+            if cot_compactor:
+                # Rationales and tool observations, deduplicated and fit into the CoT token budget
+                compacted = cot_compactor.compact(trace_step_spans)
+                trace_steps, compaction_report = compacted['text'], compacted['report']
+            else:
+                trace_steps = "".join(f"Step {i}: {item}\n" for i, item in enumerate(assembled_trace['rationales'], 1))
 
-                for index, step in enumerate(trace_step_spans):                     
-                        
-                    # Create trace step spans
-                    subtrace_span = cot_generation.span(
-                        name="Agent Trace Step {}".format(index+1),
-                        input = step.get('modelInvocationInput'),
-                        output={'Model Raw Response': step.get('modelInvocationOutput', {}).get('rawResponse'), 
-                                "Model Rationale": step.get('rationale')},
-                        metadata = {"Model Output metadata": step.get('modelInvocationOutput', {}).get('metadata'),
-                                    "Observation": step.get('observation')}
-                    )           
+            agents_used = {self.agent_info['agentName']}
 
-                    subtrace_span.end()
+            # Add collaborator agents if multi-agent in use
+            if self.agent_info['agentType'] == "MULTI-AGENT":
+                agents_used |= set(assembled_trace['collaborators'])
 
-                    # Prevents trace spans from getting sent out of order
-                    time.sleep(1)
+        except Exception as e:
+            self._handle_error(e, "Evaluation")
+            return None
+
+        # Fan out the two independent judge calls, the domain judge on a helper thread
+        cot_error = None
+        domain_error = None
+        judge_start_time = datetime.now()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="domain-judge") as pool:
+            domain_future = pool.submit(self._run_domain_judge, processed_response)
+            try:
+                cot_eval_results, cot_system_prompt = self._run_cot_judge(trace_steps, processed_response, cot_turn)
+            except Exception as e:
+                cot_error = e
+            cot_end_time = datetime.now()
+            try:
+                evaluation_results = domain_future.result()
+            except Exception as e:
+                domain_error = e
+
+        # Results are attached in a fixed order once both judges are done
+        try:
+            # Observations and scores use ids derived from the trace id, so a resumed
+            # upload overwrites anything a crashed run already sent
+            # Create an evaluation generation
+            # Stream latencies of a live invocation, time to first chunk doubles as Langfuse's completion start
+            agent_metadata = processed_response.get('agent_generation_metadata')
+            if tool_calls:
+                agent_metadata = {**(agent_metadata or {}),
+                                  'tool_latency': [{'tool': call['tool'], 'duration': call['duration']} for call in tool_calls]}
+            completion_start_time = None
+            if stream_metrics:
+                agent_metadata = {**(agent_metadata or {}), 'stream_metrics': stream_metrics}
+                if stream_metrics.get('time_to_first_chunk') is not None:
+                    completion_start_time = agent_start_time + timedelta(seconds=stream_metrics['time_to_first_chunk'])
+
+            self.exporter.generation(
+                id=f"{self.trace_id}-agent",
+                trace_id=self.trace_id,
+                name= "Agent Generation Information",
+                input=[
+                    {"role": "system", "content": self.agent_info['agentInstruction']},
+                    {"role": "user", "content": self.question}
+                ],
+                model=self.agent_info['agentModel'],
+                model_parameters={"temperature": self.config['TEMPERATURE']},
+                start_time=agent_start_time,
+                end_time=agent_end_time,
+                completion_start_time=completion_start_time,
+                metadata=agent_metadata,
+                output=processed_response.get('agent_answer'),
+                usage_details={
+                    "input": processed_response.get('input_tokens'),
+                    "output": processed_response.get('output_tokens')
+                }
+            )
+
+            #CHAIN OF THOUGHT EVALUATION SECTION START 
+
+            if cot_error is None:
+                cot_generation_id = f"{self.trace_id}-cot"
+                cot_metadata = {"agents_used": agents_used, 'model_used': self.config['MODEL_ID_EVAL_COT']}
+                if compaction_report:
+                    cot_metadata['cot_compaction'] = compaction_report
+                if cot_turn:
+                    cot_metadata['trajectory_turn'] = cot_turn.number
+                if cot_eval_results is None:
+                    # Results of batch judging are attached when the job output is ingested
+                    cot_metadata['pending_batch_judging'] = True
+
+                # Create generation based on CoT output, with its step spans in the same batch
+                cot_events = [('generation', {
+                    'id': cot_generation_id,
+                    'trace_id': self.trace_id,
+                    'name': "CoT Evaluation LLM-As-Judge Generation",
+                    'input': [
+                        {"role": "system", "content": cot_system_prompt},
+                        {"role": "user", "content": self.question}
+                    ],
+                    'output': cot_eval_results,
+                    'start_time': judge_start_time,
+                    'end_time': cot_end_time,
+                    'metadata': cot_metadata
+                })]
+                cot_events.extend(self._step_span_events(trace_step_spans, cot_generation_id, agent_end_time))
+                self.exporter.batch(cot_events)
 
-                cot_generation.end()
-                
                 #Send the scores of chain of thought evaluation
-                for metric_name, value in cot_eval_results.items():
-                    cot_generation.score(
+                for metric_name, value in (cot_eval_results or {}).items():
+                    self.exporter.score(
+                        id=f"{self.trace_id}-COT_{metric_name}",
+                        trace_id=self.trace_id,
+                        observation_id=cot_generation_id,
                         name=str("COT_" + metric_name),
                         value=value['score'],
                         comment = value['explanation'],
                     )
 
-                #CHAIN OF THOUGHT EVALUATION END
-                
-                
-                #AGENT EVALAUATION RESULTS START
-
-                # Prepare metadata and evaluate
-                evaluation_metadata = {
-                    'question': self.question,
-                    'ground_truth': self.ground_truth,
-                    'agent_response': processed_response.get('agent_answer'),
-                    'evaluation_metadata': processed_response.get('agent_generation_metadata'),
-                    **self.config
-                }
+            #CHAIN OF THOUGHT EVALUATION END
+            
+            
+            #AGENT EVALAUATION RESULTS START
+
+            # TODO: Make the logic better, stopgap solution to work with custom
+            if domain_error is None and self.eval_type != "CUSTOM":
+                for metric_name, metric_info in evaluation_results['metrics_scores'].items():
+                    self.exporter.score(
+                        id=f"{self.trace_id}-{self.eval_type}_{metric_name}",
+                        trace_id=self.trace_id,
+                        name=str(self.eval_type + "_" + metric_name),
+                        value=metric_info.get('score'),
+                        comment=metric_info.get('explanation')
+                    )
 
-                evaluation_results = self.evaluate_response(evaluation_metadata)
-
-                # TODO: Make the logic better, stopgap solution to work with custom
-                if self.eval_type != "CUSTOM":
-                    for metric_name, metric_info in evaluation_results['metrics_scores'].items():
-                        trace.score(name=str(self.eval_type + "_" + metric_name), value=metric_info.get('score'), comment=metric_info.get('explanation'))
-
-                # Update trace with final results
-                return {
-                    'question_id': self.question_id,
-                    'question': self.question,
-                    'ground_truth': self.ground_truth,
-                    'agent_response': processed_response,
-                    'evaluation_results': evaluation_results,
-                    'trace_id': self.trace_id
-                }
-              
-            except Exception as e:
-                self._handle_error(trace, e, "Evaluation")
+            if cot_error is not None or domain_error is not None:
+                # Scores of the judge that succeeded are kept, the journal lets --resume rerun the other
+                failures = [(stage, error) for stage, error in (("CoT Evaluation", cot_error), ("Evaluation", domain_error))
+                            if error is not None]
+                if len(failures) == 1:
+                    self._handle_error(failures[0][1], failures[0][0])
+                else:
+                    self._handle_error(Exception(f"CoT: {cot_error}; Domain: {domain_error}"), "Evaluation")
                 return None
-                
+
+            # The trace only counts as uploaded once the exporter has sent it
+            self.exporter.checkpoint(self.trace_id, lambda: self._record_stage('trace_upload', {'trace_id': self.trace_id}))
+
+            # Update trace with final results
+            return self._build_results(processed_response, evaluation_results)
+          
         except Exception as e:
-            self._handle_error(trace, e, "Agent Invocation")
+            self._handle_error(e, "Evaluation")
             return None
-        
-        except KeyboardInterrupt as e:
-            self._handle_error(trace,e, "Manually Stopped Evaluation Job")
-            raise KeyboardInterrupt
\ No newline at end of file
+
+    def run_trajectory_judge(self, cot_history: TrajectoryCotHistory) -> Optional[Dict[str, Any]]:
+        """
+        End-of-trajectory CoT judgement over the summaries of every answered turn, on its own Langfuse trace
+
+        Called with the last question's evaluator once the agent has answered every question of the
+        trajectory; the per-question judges may still be queued or running.
+
+        Args:
+            cot_history (TrajectoryCotHistory): CoT history of the trajectory
+
+        Returns:
+            Trajectory judge results, or None if no turn was answered or judging failed
+        """
+        turns = cot_history.transcript()
+        if not turns:
+            return None
+
+        traj_num = re.findall(r'\d+$', self.trajectory_id)[0]
+        trace_id = f"{self.session_id}-trajectory"
+        try:
+            judge_start_time = datetime.now()
+            results, system_prompt = cot_helper.evaluate_trajectory_cot(
+                "\n".join(render_turn(turn) for turn in turns), self.agent_info,
+                self.clients['bedrock_runtime'], self.config['MODEL_ID_EVAL_COT'],
+                call_guard=lambda call, **kwargs: self._guarded_call(
+                    'invoke_model', call, endpoint=f"converse:{self.config['MODEL_ID_EVAL_COT']}", **kwargs
+                ),
+                judge_cache=self.judge_cache,
+                cache_prompt=self.config.get('JUDGE_PROMPT_CACHE', False),
+                cache_stats=self.config.get('prompt_cache_stats'),
+                structured_output=self.config.get('JUDGE_STRUCTURED_OUTPUT', True),
+                output_stats=self.config.get('judge_output_stats')
+            )
+
+            self.exporter.trace(
+                id=trace_id,
+                session_id=self.session_id,
+                input=[turn['question'] for turn in turns],
+                name=f"T{traj_num}-trajectory",
+                user_id=self.config['AGENT_ID'],
+                tags=["TRAJECTORY", self.agent_info['agentModel'], self.agent_info['agentType']]
+            )
+            self.exporter.generation(
+                id=f"{trace_id}-cot",
+                trace_id=trace_id,
+                name="Trajectory CoT Evaluation LLM-As-Judge Generation",
+                input=[{"role": "system", "content": system_prompt}],
+                output=results,
+                start_time=judge_start_time,
+                end_time=datetime.now(),
+                metadata={'turns': len(turns), 'model_used': self.config['MODEL_ID_EVAL_COT']}
+            )
+            for metric_name, value in results.items():
+                self.exporter.score(
+                    id=f"{trace_id}-TRAJECTORY_{metric_name}",
+                    trace_id=trace_id,
+                    observation_id=f"{trace_id}-cot",
+                    name=str("TRAJECTORY_" + metric_name),
+                    value=value['score'],
+                    comment=value['explanation'],
+                )
+            return results
+
+        except Exception as e:
+            print(f"Error in Trajectory CoT Evaluation of {self.trajectory_id}: {str(e)}")
+            return None
+
+    def run_evaluation(self) -> Dict[str, Any]:
+        """
+        Run the complete evaluation pipeline
+
+        Each stage (agent response, CoT judge, domain judge, trace upload) is recorded in the
+        run journal when one is configured, and stages already recorded there are not run again.
+        """
+        if self.is_evaluated():
+            print(f"{self.trajectory_id} question {self.question_id} already evaluated, skipping")
+            return self.previous_results()
+
+        agent_output = self.run_agent_stage()
+        if agent_output is None:
+            return None
+
+        return self.run_judge_stage(agent_output)
@@ -1,6 +1,4 @@
 from typing import Dict, Any, List, Tuple
-import time
-from datetime import datetime
 from ragas import evaluate
 from evaluators.cot_evaluator import ToolEvaluator
 
@@ -34,78 +32,24 @@ class CustomEvaluator(ToolEvaluator):
 
         return {"metric_scores": {}}
 
-    def invoke_agent(self, tries: int = 1) -> Tuple[Dict[str, Any], datetime]:
+    def _invoke_and_process(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Invoke the Custom tool and process its response with retry logic
+        Invoke the Custom agent once and process its streamed response
         
-        Args:
-            trace_id (str): Unique identifier for the trace
-            tries (int): Number of retry attempts
-            
         Returns:
-            Tuple of (processed_response, start_time)
+            Tuple of (full_trace, processed_response)
         """
-        agent_start_time = datetime.now()
-        max_retries = 3
-        
-        try:
-            # Invoke agent
-            raw_response = self.bedrock_agent_runtime_client.invoke_agent(
-                inputText=self.question,
-                agentId=self.config['AGENT_ID'],
-                agentAliasId=self.config['AGENT_ALIAS_ID'],
-                sessionId=self.session_id,
-                enableTrace=self.config['ENABLE_TRACE']
-            )
-
-            # Process response
-            agent_answer = None
-            input_tokens = 0
-            output_tokens = 0
-            orc_trace_full = []
-            full_trace = []
-            
-            for event in raw_response['completion']:
-                if 'chunk' in event:
-                    agent_answer = event['chunk']['bytes'].decode('utf-8')
-                    
-                elif "trace" in event:
-
-                    full_trace.append(event['trace'])
-                    
-                    trace_obj = event['trace']['trace']
-                    
-
-                    if "orchestrationTrace" in trace_obj:
-                        orc_trace = trace_obj['orchestrationTrace']
-                        # Add trace to full_trace object
-                        orc_trace_full.append(orc_trace)
+        # Invoke agent (or replay its recorded stream)
+        raw_response = self._invoke_agent_raw()
 
-                    # Extract token usage
-                    if 'modelInvocationOutput' in orc_trace:
-                        usage = orc_trace['modelInvocationOutput']['metadata']['usage']
-                        input_tokens += usage.get('inputTokens',0)
-                        output_tokens += usage.get('outputTokens',0)
+        # Process response
+        parsed = self._parse_stream(raw_response)
 
-            processed_response = {
-                'agent_generation_metadata': {'ResponseMetadata': raw_response.get('ResponseMetadata', {})},
-                'agent_answer': agent_answer,
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens
-            }
+        processed_response = {
+            'agent_generation_metadata': {'ResponseMetadata': raw_response.get('ResponseMetadata', {})},
+            'agent_answer': parsed['agent_answer'],
+            'input_tokens': parsed['input_tokens'],
+            'output_tokens': parsed['output_tokens']
+        }
 
-            return full_trace, processed_response, agent_start_time
-                
-        except Exception as e:
-            if (hasattr(e, 'response') and 
-                'Error' in e.response and
-                e.response['Error'].get('Code') == 'throttlingException' and 
-                tries <= max_retries):
-                
-                wait_time = 30 * tries
-                print(f"Throttling occurred. Attempt {tries} of {max_retries}. "
-                    f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                return self.invoke_agent(tries + 1)
-            else:
-                raise e
\ No newline at end of file
+        return parsed['events'], processed_response
@@ -1,14 +1,17 @@
 from typing import Dict, Any, List, Tuple
 import boto3
-import time
 import math
 from botocore.client import Config
-from datetime import datetime
 from langchain_aws.chat_models.bedrock import ChatBedrock
 from langchain_aws.embeddings.bedrock import BedrockEmbeddings
 from datasets import Dataset
 from ragas import evaluate
+from ragas.run_config import RunConfig
 from evaluators.cot_evaluator import ToolEvaluator
+from helpers.rate_limiter import LangchainRateLimiter, RateLimitedEmbeddings
+from helpers.stream_parser import RagContextExtractor
+from helpers.embedding_cache import CachedEmbeddings
+from helpers.judge_cache import JudgeLangchainCache
 from ragas.metrics import (
     faithfulness,
     answer_relevancy,
@@ -33,11 +36,16 @@ class RAGEvaluator(ToolEvaluator):
         self.bedrock_agent_runtime_client = self.clients['bedrock_agent_runtime']
         self.bedrock_client = self.clients['bedrock_runtime']
         
-        # Initialize evaluation models
+        # Initialize evaluation models, RAGAS calls them internally so the shared
+        # judge and embeddings budgets are attached to the models themselves
+        judge_limiter = self.rate_limiters.get('invoke_model')
         self.llm_for_evaluation = ChatBedrock(
             model_id=self.config['MODEL_ID_EVAL'],
             max_tokens=100000,
-            client=self.bedrock_client  # Use shared client
+            client=self.bedrock_client,  # Use shared client
+            rate_limiter=LangchainRateLimiter(judge_limiter) if judge_limiter else None,
+            # Cached judge responses (temperature 0 calls only) skip the model and its budget
+            cache=JudgeLangchainCache(self.judge_cache) if self.judge_cache else None
         )
         
         self.bedrock_embeddings = BedrockEmbeddings(
@@ -45,26 +53,39 @@ class RAGEvaluator(ToolEvaluator):
             client=self.bedrock_client  # Use shared client
         )
 
-    def prepare_evaluation_dataset(self, metadata: Dict[str, Any]) -> Dataset:
+        embeddings_limiter = self.rate_limiters.get('embeddings')
+        if embeddings_limiter:
+            self.bedrock_embeddings = RateLimitedEmbeddings(self.bedrock_embeddings, embeddings_limiter)
+
+        # Cached vectors skip the model and its budget altogether
+        embedding_cache = self.config.get('embedding_cache')
+        if embedding_cache:
+            self.bedrock_embeddings = CachedEmbeddings(self.bedrock_embeddings, embedding_cache, self.config['EMBEDDING_MODEL_ID'])
+
+    @staticmethod
+    def prepare_evaluation_dataset(rows: List[Dict[str, Any]]) -> Dataset:
         """
         Prepare dataset for RAG evaluation
         
         Args:
-            metadata (Dict[str, Any]): Evaluation metadata
+            rows (List[Dict[str, Any]]): Evaluation metadata of each question
             
         Returns:
-            Dataset object ready for evaluation
+            Dataset object ready for evaluation, one row per question
         """
         return Dataset.from_dict({
-            "question": [metadata['question']],
-            "answer": [metadata['agent_response']],
-            "contexts": [metadata['evaluation_metadata']['rag_contexts']],
-            "ground_truth": [metadata['ground_truth']]
+            "question": [metadata['question'] for metadata in rows],
+            "answer": [metadata['agent_response'] for metadata in rows],
+            "contexts": [metadata['evaluation_metadata']['rag_contexts'] for metadata in rows],
+            "ground_truth": [metadata['ground_truth'] for metadata in rows]
         })
 
     def evaluate_response(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
         Evaluate the RAG response using specified metrics
+
+        With a shared RAGAS batcher in the config, the question is queued and evaluated
+        together with the questions other workers are judging at the same time.
         
         Args:
             metadata (Dict[str, Any]): Evaluation metadata
@@ -72,115 +93,96 @@ class RAGEvaluator(ToolEvaluator):
         Returns:
             Dict containing evaluation results
         """
+        item = {'evaluator': self, 'metadata': metadata}
+        batcher = self.config.get('ragas_batcher')
         try:
-            dataset = self.prepare_evaluation_dataset(metadata)
-            evaluation_results = evaluate(
-                dataset=dataset,
-                metrics=[
-                    faithfulness,
-                    answer_relevancy,
-                    context_recall,
-                    answer_similarity
-                ],
-                llm=self.llm_for_evaluation,
-                embeddings=self.bedrock_embeddings
-            )
-        
+            scores = batcher.run(item) if batcher else evaluate_ragas_batch([item])[0]
         except Exception as e:
             raise Exception("Error: {}".format(e))
 
-        # Check for NaN values in scores and throw error if found
-        for metric, score in evaluation_results.scores[0].items():
-            if math.isnan(score):
-                raise Exception("Empty score detected, RAGAS had issue evaluating")
+        if isinstance(scores, Exception):
+            raise scores
 
         return {
             'metrics_scores': {
-                metric: {'score': score} for metric, score in evaluation_results.scores[0].items()
+                metric: {'score': score} for metric, score in scores.items()
             }
         }
 
 
-    def invoke_agent(self, tries: int = 1) -> Tuple[Dict[str, Any], datetime]:
+    def _invoke_and_process(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Invoke the RAG tool and process its response with retry logic
+        Invoke the RAG agent once and process its streamed response
         
-        Args:
-            tries (int): Number of retry attempts
-            
         Returns:
-            Tuple of (processed_response, start_time)
+            Tuple of (full_trace, processed_response)
         """
-        agent_start_time = datetime.now()
-        max_retries = 3
-        
-        try:
-            # Invoke agent
-            raw_response = self.bedrock_agent_runtime_client.invoke_agent(
-                inputText=self.question,
-                agentId=self.config['AGENT_ID'],
-                agentAliasId=self.config['AGENT_ALIAS_ID'],
-                # Test that this works
-                sessionId=self.session_id,
-                # sessionId=self.trace_id,
-                enableTrace=self.config['ENABLE_TRACE']
-            )
+        # Invoke agent (or replay its recorded stream)
+        raw_response = self._invoke_agent_raw()
 
 
-            # Process response
-            rag_contexts = []
-            agent_answer = None
-            input_tokens = 0
-            output_tokens = 0
-            full_trace = []
-            
-            for event in raw_response['completion']:
-                if 'chunk' in event:
-                    agent_answer = event['chunk']['bytes'].decode('utf-8')
-                    
-                elif "trace" in event:
-                    full_trace.append(event['trace'])
-                    trace_obj = event['trace']['trace']
-                    # print(trace_obj)
-                    if "orchestrationTrace" in trace_obj:
-                        orc_trace = trace_obj['orchestrationTrace']
-
-                        # Extract context from knowledge base lookup
-                        if 'observation' in orc_trace:
-                            obs_trace = orc_trace['observation']
-                            if 'knowledgeBaseLookupOutput' in obs_trace:
-                                output_trace = obs_trace['knowledgeBaseLookupOutput']
-                                if 'retrievedReferences' in output_trace:
-                                    for ref in output_trace['retrievedReferences']:
-                                        rag_contexts.append(ref['content']['text'])
-                        
-                        # Extract token usage
-                        if 'modelInvocationOutput' in orc_trace:
-                            usage = orc_trace['modelInvocationOutput']['metadata']['usage']
-                            input_tokens += usage.get('inputTokens',0)
-                            output_tokens += usage.get('outputTokens',0)
+        # Process response
+        parsed = self._parse_stream(raw_response, [RagContextExtractor()])
 
-            
+        processed_response = {
+            'agent_generation_metadata': {'ResponseMetadata': raw_response.get('ResponseMetadata', {}), "rag_contexts": parsed['rag_contexts']},
+            'agent_answer': parsed['agent_answer'],
+            'input_tokens': parsed['input_tokens'],
+            'output_tokens': parsed['output_tokens']
+        }
 
-            processed_response = {
-                'agent_generation_metadata': {'ResponseMetadata': raw_response.get('ResponseMetadata', {}), "rag_contexts": rag_contexts},
-                'agent_answer': agent_answer,
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens
-            }
+        return parsed['events'], processed_response
 
-            return full_trace, processed_response, agent_start_time
-                
-        except Exception as e:
-            if (hasattr(e, 'response') and 
-                'Error' in e.response and
-                e.response['Error'].get('Code') == 'throttlingException' and 
-                tries <= max_retries):
-                
-                wait_time = 30 * tries
-                print(f"Throttling occurred. Attempt {tries} of {max_retries}. "
-                    f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                return self.invoke_agent(tries + 1)
-            else:
-                raise e
\ No newline at end of file
+
+def evaluate_ragas_batch(items: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Evaluate the RAG questions of several evaluators with one RAGAS evaluate() call
+
+    The models, guards and run settings of the first evaluator are used for the whole batch,
+    they are built from the same shared config. A batch of one question surfaces Bedrock
+    errors so they are retried, larger batches isolate failures per row instead.
+
+    Args:
+        items (List[Dict[str, Any]]): {'evaluator': RAGEvaluator, 'metadata': evaluation metadata} per question
+
+    Returns:
+        Scores dict per question, in order, or an Exception for a question whose scores came back empty
+    """
+    evaluator = items[0]['evaluator']
+    config = evaluator.config
+    dataset = RAGEvaluator.prepare_evaluation_dataset([item['metadata'] for item in items])
+    run_config = RunConfig(
+        timeout=config.get('RAGAS_TIMEOUT', 180),
+        max_retries=config.get('RAGAS_MAX_RETRIES', 10),
+        max_workers=config.get('RAGAS_MAX_WORKERS', 16)
+    )
+
+    # RAGAS fans out its own judge calls, the whole run holds one judge slot
+    def run_ragas():
+        with evaluator._concurrency_slot('invoke_model'):
+            return evaluate(
+                dataset=dataset,
+                metrics=[
+                    faithfulness,
+                    answer_relevancy,
+                    context_recall,
+                    answer_similarity
+                ],
+                llm=evaluator.llm_for_evaluation,
+                embeddings=evaluator.bedrock_embeddings,
+                run_config=run_config,
+                # Surface Bedrock errors of a single question so they can be classified and retried
+                raise_exceptions=len(items) == 1,
+                show_progress=False
+            )
+
+    evaluation_results = evaluator._retrying_call('ragas_evaluate', run_ragas)
+
+    # Check for NaN values in scores, failing only the question they belong to
+    results = []
+    for row_scores in evaluation_results.scores:
+        if any(math.isnan(score) for score in row_scores.values()):
+            results.append(Exception("Empty score detected, RAGAS had issue evaluating"))
+        else:
+            results.append(dict(row_scores))
+    return results
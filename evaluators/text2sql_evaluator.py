@@ -1,10 +1,49 @@
-from typing import Dict, Any, List, Tuple
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_aws.chat_models import ChatBedrock
 from ragas.llms import LangchainLLMWrapper
-import json
-import time
+import threading
 from evaluators.cot_evaluator import ToolEvaluator
+from helpers.rate_limiter import estimate_tokens
+from helpers.prompt_cache import converse, converse_request, converse_content, converse_tokens
+from helpers.judge_output import metrics_scores_schema, converse_tool_config, anthropic_tools, read_judge_output
+from helpers.stream_parser import SqlQueryExtractor
+from helpers.sql_equivalence import EQUIVALENT, UNKNOWN
+
+# Judge model of the Text2SQL metrics, Claude 3 Sonnet
+JUDGE_MODEL_ID = 'anthropic.claude-3-sonnet-20240229-v1:0'
+JUDGE_PARAMS = {"anthropic_version": "bedrock-2023-05-31", "max_tokens": 1024, "temperature": 0}
+
+# Output tokens allowed per question of a packed judge call, and the model's output limit
+PACKED_TOKENS_PER_ITEM = 512
+JUDGE_MAX_OUTPUT_TOKENS = 4096
+
+# Output schema of a packed judge call, items are validated one by one
+PACKED_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'items': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'id': {'type': 'integer'}, 'metrics_scores': {'type': 'object'}},
+                'required': ['id', 'metrics_scores']
+            }
+        }
+    },
+    'required': ['items']
+}
+
+SQL_EQUIVALENCE = 'sql_semantic_equivalence'
+ANSWER_CORRECTNESS = 'answer_correctness'
+
+METRIC_LABELS = {
+    SQL_EQUIVALENCE: "SQL Semantic Equivalence",
+    ANSWER_CORRECTNESS: "Answer Correctness"
+}
+METRIC_INSTRUCTIONS = {
+    SQL_EQUIVALENCE: "Evaluate if the generated SQL would produce the same results as the ground truth SQL.",
+    ANSWER_CORRECTNESS: "Check if the generated answer correctly represents the query results and matches ground truth."
+}
 
 class Text2SQLEvaluator(ToolEvaluator):
     def __init__(self, **kwargs):
@@ -23,153 +62,430 @@ class Text2SQLEvaluator(ToolEvaluator):
         )
         self.evaluator_llm = LangchainLLMWrapper(self.bedrock_model)
 
-    def evaluate_response(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
-        """Evaluate Text2SQL response using LLM as judge with two key metrics"""
-        try:
-
-            evaluation_prompt = f"""You are an expert evaluator for Text2SQL systems. Evaluate the following response based on two key metrics.
-
-                Question: {metadata['question']}
-                Database Schema: {metadata['ground_truth']['ground_truth_sql_context']}
+    def _build_judge_prompt(self, metadata: Dict[str, Any], metrics: List[str]) -> Tuple[str, str]:
+        """
+        Judge prompt asking for the given metrics only
 
-                Ground Truth SQL: {metadata['ground_truth']['ground_truth_sql_query']}
-                Generated SQL: {metadata['evaluation_metadata']['agent_query']}
+        Returns:
+            Tuple of (system prompt, evaluation prompt); the system prompt (instructions, schema and
+            output format) is shared by the questions on the same schema, so it can be cached
+        """
+        metric_instructions = "\n".join(f"{METRIC_LABELS[metric]}: {METRIC_INSTRUCTIONS[metric]}" for metric in metrics)
+        metric_format = ",\n".join(f"""                        "{metric}": {{
+                            "score": numeric_value,
+                            "explanation": "Brief explanation of why this score was given"
+                        }}""" for metric in metrics)
 
-                Ground Truth Answer: {metadata['ground_truth']['ground_truth_answer']}
-                Generated Answer: {metadata['agent_response']}
+        system_prompt = f"""You are an expert evaluator for Text2SQL systems. Evaluate the following response based on {len(metrics)} key metric(s).
 
-                Query Result: {metadata['ground_truth']['ground_truth_query_result']}
+                Database Schema: {metadata['ground_truth']['ground_truth_sql_context']}
 
                 Evaluate and provide scores (0-1) and explanations for these metrics:
 
-                SQL Semantic Equivalence: Evaluate if the generated SQL would produce the same results as the ground truth SQL.
-                Answer Correctness: Check if the generated answer correctly represents the query results and matches ground truth.
+                {metric_instructions}
                 
                 Provide your evaluation in this exact JSON format:
                 {{
                     "metrics_scores": {{
-                        "sql_semantic_equivalence": {{
-                            "score": numeric_value,
-                            "explanation": "Brief explanation of why this score was given"
-                        }},
-                        "answer_correctness": {{
-                            "score": numeric_value,
-                            "explanation": "Brief explanation of why this score was given"
-                        }}
+{metric_format}
                     }}
                 }}
             """
 
-            # Call LLM for evaluation, use Claude 3 Sonnet
-            response = self.bedrock_client.invoke_model(
-                modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1024,
-                    "temperature": 0,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [{"type": "text", "text": evaluation_prompt}],
-                        }
-                    ],
-                })
-            )
-            
-            # Parse and return the evaluation
-            evaluation = json.loads(json.loads(response['body'].read())['content'][0]['text'])
+        evaluation_prompt = f"""Question: {metadata['question']}
+
+                Ground Truth SQL: {metadata['ground_truth']['ground_truth_sql_query']}
+                Generated SQL: {metadata['evaluation_metadata']['agent_query']}
+
+                Ground Truth Answer: {metadata['ground_truth']['ground_truth_answer']}
+                Generated Answer: {metadata['agent_response']}
+
+                Query Result: {metadata['ground_truth']['ground_truth_query_result']}
+            """
+        return system_prompt, evaluation_prompt
+
+    def _judge_tool(self, schema: Dict[str, Any], packed: bool = False) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """(name, description, input schema) of the tool the judge answers through, None when structured output is off"""
+        if not self.config.get('JUDGE_STRUCTURED_OUTPUT', True):
+            return None
+        if packed:
+            return 'record_text2sql_evaluations', "Record the Text2SQL evaluation of every item", schema
+        return 'record_text2sql_evaluation', "Record the Text2SQL evaluation, one score and explanation per metric", schema
+
+    def _judge_model_input(self, system_prompt: str, evaluation_prompt: str, metrics: List[str], max_tokens: int = 1024) -> Dict[str, Any]:
+        """invoke_model body of a judge prompt, for batch inference"""
+        tool = self._judge_tool(metrics_scores_schema(metrics))
+        return {
+            **(anthropic_tools(*tool) if tool else {}),
+            **JUDGE_PARAMS,
+            "max_tokens": max_tokens,
+            "system": system_prompt,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": evaluation_prompt}],
+                }
+            ],
+        }
+
+    def _call_judge(self, system_prompt: str, evaluation_prompt: str, schema: Dict[str, Any],
+                    max_tokens: int = 1024, packed: bool = False) -> Tuple[Any, int]:
+        """
+        Send a prompt to the judge model through the Converse API and read its output
+
+        The system prompt is followed by a prompt cache checkpoint when JUDGE_PROMPT_CACHE is on.
+        With JUDGE_STRUCTURED_OUTPUT the judge answers through a tool whose input schema is the
+        output schema; otherwise, or if the tool input is invalid, the output is recovered from the text.
+
+        Returns:
+            Tuple of (judge output matching the schema, tokens used)
+
+        Raises:
+            JudgeOutputError: No valid output in the response
+        """
+        tool = self._judge_tool(schema, packed)
+        request = converse_request(JUDGE_MODEL_ID, system_prompt, evaluation_prompt, max_tokens,
+                                   temperature=JUDGE_PARAMS['temperature'],
+                                   cache_prompt=self.config.get('JUDGE_PROMPT_CACHE', False),
+                                   tool_config=converse_tool_config(*tool) if tool else None)
+
+        response = self._guarded_call(
+            'invoke_model',
+            lambda: converse(self.bedrock_client, request),
+            tokens=estimate_tokens(system_prompt + evaluation_prompt),
+            usage_fn=converse_tokens,
+            endpoint=f"converse:{JUDGE_MODEL_ID}"
+        )
+        cache_stats = self.config.get('prompt_cache_stats')
+        if cache_stats:
+            cache_stats.record('text2sql', response)
+        output = read_judge_output('text2sql_packed' if packed else 'text2sql', converse_content(response), schema,
+                                   self.config.get('judge_output_stats'))
+        return output, converse_tokens(response)
+
+    def _judge_key(self, system_prompt: str, evaluation_prompt: str) -> str:
+        """Judge cache key of a single-question prompt"""
+        return self.judge_cache.make_key(JUDGE_MODEL_ID, JUDGE_PARAMS, [system_prompt, evaluation_prompt])
+
+    def _invoke_judge(self, system_prompt: str, evaluation_prompt: str, metrics: List[str]) -> Dict[str, Any]:
+        """Call the LLM judge (or the judge cache) with a prompt and read its evaluation of the metrics"""
+        def judge():
+            # Read and validated before caching, so invalid responses are not kept
+            evaluation, tokens = self._call_judge(system_prompt, evaluation_prompt, metrics_scores_schema(metrics))
+            return validate_evaluation(evaluation, metrics), tokens
+
+        if self.judge_cache:
+            return self.judge_cache.get_or_call(self._judge_key(system_prompt, evaluation_prompt), JUDGE_MODEL_ID, judge)
+
+        evaluation, _ = judge()
+        return evaluation
+
+    def _judge_metrics(self, metadata: Dict[str, Any], metrics: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Judge the given metrics, packed with other questions when a packed judge is configured
+
+        Returns:
+            The evaluation, or None when the call was queued for batch judging
+        """
+        if self.batch_judge:
+            system_prompt, evaluation_prompt = self._build_judge_prompt(metadata, metrics)
+            cache_key = self._judge_key(system_prompt, evaluation_prompt) if self.judge_cache else None
+            evaluation = self.judge_cache.get(cache_key) if cache_key else None
+            if evaluation is None:
+                defer = self._defer_judge(self.eval_type, f"{self.eval_type}_", 'metrics_scores', metrics=metrics)
+                defer(JUDGE_MODEL_ID, self._judge_model_input(system_prompt, evaluation_prompt, metrics), cache_key)
             return evaluation
 
+        batcher = self.config.get('text2sql_judge_batcher')
+        if batcher:
+            return batcher.run({'evaluator': self, 'metadata': metadata, 'metrics': metrics})
+        return self._invoke_judge(*self._build_judge_prompt(metadata, metrics), metrics)
+
+    def evaluate_response(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evaluate Text2SQL response with two key metrics
+
+        SQL equivalence is decided from the normalized query text, then by running both queries
+        on the local snapshot when one is configured; the LLM judge is only asked for what could
+        not be decided locally.
+        """
+        try:
+            metrics_scores = {}
+            judged_metrics = list(METRIC_LABELS)
+
+            # Cheapest check first
+            checks = [('canonical', self.config.get('sql_fast_path')), ('execution', self.config.get('sql_executor'))]
+            for method, checker in checks:
+                if not checker:
+                    continue
+                verdict, explanation = checker.compare(
+                    metadata['evaluation_metadata']['agent_query'],
+                    metadata['ground_truth']['ground_truth_sql_query']
+                )
+                if verdict != UNKNOWN:
+                    metrics_scores[SQL_EQUIVALENCE] = {
+                        'score': 1.0 if verdict == EQUIVALENT else 0.0,
+                        'explanation': explanation,
+                        'method': method
+                    }
+                    judged_metrics.remove(SQL_EQUIVALENCE)
+                    break
+
+            deferred_metrics = []
+            if judged_metrics:
+                evaluation = self._judge_metrics(metadata, judged_metrics)
+                if evaluation is None:
+                    # Scored when the batch judging output is ingested
+                    deferred_metrics = judged_metrics
+                else:
+                    for metric in judged_metrics:
+                        metrics_scores[metric] = evaluation['metrics_scores'][metric]
+
+            # Report the metrics in their usual order
+            results = {'metrics_scores': {metric: metrics_scores[metric] for metric in METRIC_LABELS if metric in metrics_scores}}
+            if deferred_metrics:
+                results['deferred_metrics'] = deferred_metrics
+            return results
+
         except Exception as e:
             raise Exception(f"error: {str(e)}")     
             
-    def invoke_agent(self, tries: int = 1) -> Tuple[Dict[str, Any], datetime]:
+    def _invoke_and_process(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Invoke the Text2SQL agent and process its response
+        Invoke the Text2SQL agent once and process its streamed response
         
-        Args:
-            question (str): Question to process
-            trace_id (str): Unique identifier for the trace
-            tries (int): Number of retry attempts
-            
         Returns:
-            Tuple of (processed_response, start_time)
+            Tuple of (full_trace, processed_response)
         """
-        agent_start_time = datetime.now()
-        max_retries = 3
+        # Invoke agent (or replay its recorded stream)
+        raw_response = self._invoke_agent_raw()
+
+        # Process response
+        parsed = self._parse_stream(raw_response, [SqlQueryExtractor()])
+
+        if not parsed['chunk_received']:
+            raise Exception("End event not received")
+
+        processed_response = {
+            'agent_generation_metadata': {
+                "agent_query": parsed['agent_query'],
+                'ResponseMetadata': raw_response.get('ResponseMetadata', {})
+            },
+            'agent_answer': parsed['agent_answer'], 
+            'input_tokens': parsed['input_tokens'],
+            'output_tokens': parsed['output_tokens']
+        }
         
+        return parsed['events'], processed_response
+
+
+def validate_evaluation(evaluation: Any, metrics: List[str]) -> Dict[str, Any]:
+    """
+    Check that a judge evaluation holds a 0-1 score and an explanation for every metric
+
+    Args:
+        evaluation (Any): Parsed judge output
+        metrics (List[str]): Metrics the judge was asked for
+
+    Returns:
+        The evaluation, as {'metrics_scores': {metric: {'score', 'explanation'}}}
+
+    Raises:
+        ValueError: A metric is missing or malformed
+    """
+    scores = evaluation.get('metrics_scores') if isinstance(evaluation, dict) else None
+    if not isinstance(scores, dict):
+        raise ValueError("metrics_scores missing")
+    validated = {}
+    for metric in metrics:
+        value = scores.get(metric)
+        if not isinstance(value, dict) or not isinstance(value.get('score'), (int, float)) \
+                or isinstance(value.get('score'), bool) or not 0 <= value['score'] <= 1:
+            raise ValueError(f"{metric} score missing or out of range")
+        validated[metric] = {'score': value['score'], 'explanation': str(value.get('explanation', ''))}
+    return {'metrics_scores': validated}
+
+
+def build_packed_prompt(items: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    One judge prompt for several Text2SQL questions
+
+    The instructions, metric definitions and output format are the same for every pack and
+    form the system prompt, so it can be cached. Every distinct database schema is listed
+    once and referenced by label from the questions using it.
+
+    Args:
+        items (List[Dict[str, Any]]): {'metadata': evaluation metadata, 'metrics': metrics to judge} per question
+
+    Returns:
+        Tuple of (system prompt, evaluation prompt) asking for one JSON entry per question,
+        identified by its position (1-based)
+    """
+    metric_instructions = "\n".join(f"{METRIC_LABELS[metric]} ({metric}): {METRIC_INSTRUCTIONS[metric]}" for metric in METRIC_LABELS)
+
+    schemas = {}
+    for item in items:
+        schemas.setdefault(item['metadata']['ground_truth']['ground_truth_sql_context'], f"S{len(schemas) + 1}")
+    schema_blocks = "\n\n".join(f'<schema id="{label}">\n{schema}\n</schema>' for schema, label in schemas.items())
+
+    item_blocks = []
+    for position, item in enumerate(items, start=1):
+        metadata = item['metadata']
+        item_blocks.append(f"""<item id="{position}">
+Metrics: {', '.join(item['metrics'])}
+Question: {metadata['question']}
+Database Schema: {schemas[metadata['ground_truth']['ground_truth_sql_context']]}
+Ground Truth SQL: {metadata['ground_truth']['ground_truth_sql_query']}
+Generated SQL: {metadata['evaluation_metadata']['agent_query']}
+Ground Truth Answer: {metadata['ground_truth']['ground_truth_answer']}
+Generated Answer: {metadata['agent_response']}
+Query Result: {metadata['ground_truth']['ground_truth_query_result']}
+</item>""")
+    item_blocks = "\n\n".join(item_blocks)
+
+    system_prompt = f"""You are an expert evaluator for Text2SQL systems. Evaluate each of the responses you are given independently of the others.
+
+For every item, provide scores (0-1) and explanations for the metrics listed in the item:
+
+{metric_instructions}
+
+Provide your evaluation in this exact JSON format, with one entry per item in item order:
+{{
+    "items": [
+        {{
+            "id": item_id,
+            "metrics_scores": {{
+                "metric_name": {{
+                    "score": numeric_value,
+                    "explanation": "Brief explanation of why this score was given"
+                }}
+            }}
+        }}
+    ]
+}}
+"""
+
+    evaluation_prompt = f"""Database schemas, referenced by id from the items:
+
+{schema_blocks}
+
+Items ({len(items)}):
+
+{item_blocks}
+"""
+    return system_prompt, evaluation_prompt
+
+
+def parse_packed_response(output: Dict[str, Any], items: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Evaluations of a packed judge output (matching PACKED_SCHEMA)
+
+    Returns:
+        One validated evaluation per item, in order, or None for an item missing or malformed in the output
+    """
+    by_id = {}
+    for entry in output['items']:
+        if isinstance(entry, dict):
+            by_id.setdefault(str(entry.get('id')), entry)
+
+    results = []
+    for position, item in enumerate(items, start=1):
         try:
-            # Invoke agent
-            raw_response = self.bedrock_agent_runtime_client.invoke_agent(
-                inputText=self.question,
-                agentId=self.config['AGENT_ID'],
-                agentAliasId=self.config['AGENT_ALIAS_ID'],
-                # Confirm that this works
-                sessionId=self.session_id,
-                enableTrace=self.config['ENABLE_TRACE']
-            )
-
-            # Process response
-            agent_query = ""
-            agent_answer = None
-            end_event_received = False
-            input_tokens = 0
-            output_tokens = 0
-            full_trace = []
-            
+            results.append(validate_evaluation(by_id.get(str(position)), item['metrics']))
+        except ValueError:
+            results.append(None)
+    return results
 
-            for event in raw_response['completion']:
-                if 'chunk' in event:
-                    data = event['chunk']['bytes']
-                    agent_answer = data.decode('utf-8')
-                    end_event_received = True
-                    
-                elif "trace" in event:
-                    full_trace.append(event['trace'])
-                    trace_obj = event['trace']['trace']
-                    if "orchestrationTrace" in trace_obj:
-                        orc_trace = trace_obj['orchestrationTrace']
-                        
-                        # Extract SQL query
-                        if 'observation' in orc_trace:
-                            invoc_trace = orc_trace['observation']
-                            if 'actionGroupInvocationOutput' in invoc_trace:
-                                action_trace = invoc_trace['actionGroupInvocationOutput']
-                                if 'text' in action_trace:
-                                    if "the query i used" in action_trace['text']:
-                                        agent_query = action_trace['text'].split("the query i used: ")[1]
-                        
-                        # Extract token usage if available
-                        if 'modelInvocationOutput' in orc_trace:
-                            usage = orc_trace['modelInvocationOutput']['metadata']['usage']
-                            input_tokens += usage.get('inputTokens',0)
-                            output_tokens += usage.get('outputTokens',0)
-
-            if not end_event_received:
-                raise Exception("End event not received")
-
-            processed_response = {
-                'agent_generation_metadata': {
-                    "agent_query": agent_query,
-                    'ResponseMetadata': raw_response.get('ResponseMetadata', {})
-                },
-                'agent_answer': agent_answer, 
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens
-            }
-            
-            return full_trace, processed_response, agent_start_time
-                
-        except Exception as e:
-            if (hasattr(e, 'response') and 
-                'Error' in e.response and
-                e.response['Error'].get('Code') == 'throttlingException' and 
-                tries <= max_retries):
-                
-                wait_time = 30 * tries
-                print(f"Throttling occurred. Attempt {tries} of {max_retries}. "
-                    f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                return self.invoke_agent(tries + 1)
+
+class PackedText2SQLJudge:
+    def __init__(self):
+        """
+        Judges the Text2SQL questions of a batch with one model call
+
+        Questions whose single-question prompt is in the judge cache are not sent. The others
+        are packed into one prompt; every question the packed response does not hold in a
+        valid form is split back out and judged alone. Packed results are cached under the
+        single-question key, so they are shared with unpacked runs.
+        """
+        self.lock = threading.Lock()
+        self.packed_calls = 0
+        self.packed_items = 0
+        self.cached_items = 0
+        self.retried_alone = 0
+        self.packed_tokens = 0
+
+    def __call__(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Process a batch of MicroBatcher items
+
+        Args:
+            items (List[Dict[str, Any]]): {'evaluator': Text2SQLEvaluator, 'metadata': evaluation metadata,
+                'metrics': metrics to judge} per question
+
+        Returns:
+            Evaluation per question, in order, or an Exception for a question that could not be judged
+        """
+        evaluator = items[0]['evaluator']
+        judge_cache = evaluator.judge_cache
+        prompts = [item['evaluator']._build_judge_prompt(item['metadata'], item['metrics']) for item in items]
+        results = [None] * len(items)
+
+        pending = []
+        for index, prompt in enumerate(prompts):
+            cached = judge_cache.get(evaluator._judge_key(*prompt)) if judge_cache else None
+            if cached is not None:
+                results[index] = cached
             else:
-                raise e
\ No newline at end of file
+                pending.append(index)
+
+        if len(pending) > 1:
+            packed_items = [items[index] for index in pending]
+            max_tokens = min(JUDGE_MAX_OUTPUT_TOKENS, PACKED_TOKENS_PER_ITEM * len(packed_items))
+            try:
+                output, tokens = evaluator._call_judge(*build_packed_prompt(packed_items), PACKED_SCHEMA,
+                                                       max_tokens=max_tokens, packed=True)
+                evaluations = parse_packed_response(output, packed_items)
+            except Exception as e:
+                print(f"Packed Text2SQL judge call failed, judging {len(pending)} questions alone: {str(e)}")
+                tokens, evaluations = 0, [None] * len(pending)
+
+            for index, evaluation in zip(pending, evaluations):
+                if evaluation is not None:
+                    results[index] = evaluation
+                    if judge_cache:
+                        judge_cache.put(evaluator._judge_key(*prompts[index]), JUDGE_MODEL_ID, evaluation,
+                                        tokens // len(pending))
+
+            with self.lock:
+                self.packed_calls += 1
+                self.packed_items += len(pending)
+                self.packed_tokens += tokens
+
+        # Questions the packed call did not return in a valid form are judged alone
+        retried = 0
+        for index in pending:
+            if results[index] is not None:
+                continue
+            if len(pending) > 1:
+                retried += 1
+            try:
+                results[index] = items[index]['evaluator']._invoke_judge(*prompts[index], items[index]['metrics'])
+            except Exception as e:
+                results[index] = e
+
+        with self.lock:
+            self.cached_items += len(items) - len(pending)
+            self.retried_alone += retried
+        return results
+
+    def metrics(self) -> Dict[str, Any]:
+        """Packing counters for reporting"""
+        with self.lock:
+            return {
+                'packed_calls': self.packed_calls,
+                'packed_items': self.packed_items,
+                'average_pack_size': round(self.packed_items / self.packed_calls, 2) if self.packed_calls else 0,
+                'cached_items': self.cached_items,
+                'retried_alone': self.retried_alone,
+                'packed_tokens': self.packed_tokens
+            }
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+from helpers.judge_output import RECOVERED, extract_judge_output, metrics_scores_schema, scores_schema
+
+# Files of a batch judging run directory
+REQUESTS_FILE = 'requests.jsonl'
+JOBS_FILE = 'jobs.json'
+
+
+def make_record_id(key: str) -> str:
+    """11-character alphanumeric record id of a judge call, stable for a given key"""
+    return 'R' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:10].upper()
+
+
+def model_file_name(model_id: str) -> str:
+    """Input file name of the records of one judge model"""
+    return re.sub(r'[^A-Za-z0-9.-]', '_', model_id) + '.jsonl'
+
+
+def output_schema(target: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Schema of the judge output a record target expects, None for targets queued without their metrics"""
+    if not target.get('metrics'):
+        return None
+    if target['format'] == 'cot':
+        return scores_schema(target['metrics'])
+    return metrics_scores_schema(target['metrics'])
+
+
+class BatchJudgeQueue:
+    def __init__(self, run_dir: str):
+        """
+        Collects the judge calls of a run as Bedrock batch-inference records instead of making them
+
+        A batch job runs a single model, so records are appended to one <model id>.jsonl file
+        per judge model. What each record scores (trace, observation, score names) is appended
+        to requests.jsonl and used when the job output is ingested. Records already written by
+        an earlier or interrupted run of the same directory are not written twice.
+
+        Args:
+            run_dir (str): Directory of the run's batch files
+        """
+        self.run_dir = run_dir
+        self.lock = threading.Lock()
+        self.record_ids = set()
+        self.counts = {}
+        os.makedirs(run_dir, exist_ok=True)
+
+        for request in read_requests(run_dir).values():
+            self.record_ids.add(request['recordId'])
+            self.counts[request['model_id']] = self.counts.get(request['model_id'], 0) + 1
+
+    def add(self, key: str, model_id: str, model_input: Dict[str, Any], target: Dict[str, Any]) -> None:
+        """
+        Queue a judge call
+
+        Args:
+            key (str): Unique key of the call, e.g. "<trace id>-cot"
+            model_id (str): Judge model id
+            model_input (Dict[str, Any]): invoke_model body of the call
+            target (Dict[str, Any]): Where the scores go: trace_id, score_prefix, format ('cot' or
+                'metrics_scores'), and optionally observation_id, metrics and cache_key
+        """
+        record_id = make_record_id(key)
+        with self.lock:
+            if record_id in self.record_ids:
+                return
+            with open(os.path.join(self.run_dir, model_file_name(model_id)), 'a') as f:
+                f.write(json.dumps({'recordId': record_id, 'modelInput': model_input}) + '\n')
+            with open(os.path.join(self.run_dir, REQUESTS_FILE), 'a') as f:
+                f.write(json.dumps({'recordId': record_id, 'key': key, 'model_id': model_id, 'target': target}) + '\n')
+            self.record_ids.add(record_id)
+            self.counts[model_id] = self.counts.get(model_id, 0) + 1
+
+    def metrics(self) -> Dict[str, int]:
+        """Queued records per judge model"""
+        with self.lock:
+            return dict(self.counts)
+
+
+def read_requests(run_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Queued judge calls of a run directory by record id"""
+    path = os.path.join(run_dir, REQUESTS_FILE)
+    requests = {}
+    if not os.path.exists(path):
+        return requests
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted write
+                continue
+            requests[request['recordId']] = request
+    return requests
+
+
+class BatchBackend:
+    """Runs batch-inference jobs over JSONL files of records"""
+
+    def submit(self, input_path: str, model_id: str, job_name: str) -> Dict[str, Any]:
+        """Start a job over an input file, returns the job description kept in the run's job manifest"""
+        raise NotImplementedError
+
+    def status(self, job: Dict[str, Any]) -> str:
+        """Status of a job, 'Completed' once its output can be fetched"""
+        raise NotImplementedError
+
+    def fetch_output(self, job: Dict[str, Any], output_path: str) -> None:
+        """Write the output records of a completed job to output_path"""
+        raise NotImplementedError
+
+
+class BedrockBatchBackend(BatchBackend):
+    def __init__(self, bedrock_client, s3_client, s3_uri: str, role_arn: str):
+        """
+        Bedrock batch inference (CreateModelInvocationJob) with input and output in S3
+
+        Args:
+            bedrock_client: Bedrock control plane client
+            s3_client: S3 client
+            s3_uri (str): S3 prefix the job inputs and outputs are written under
+            role_arn (str): Service role Bedrock assumes to read and write the S3 prefix
+        """
+        if not s3_uri or not role_arn:
+            raise ValueError("Bedrock batch judging needs BATCH_JUDGE_S3_URI and BATCH_JUDGE_ROLE_ARN")
+        self.bedrock_client = bedrock_client
+        self.s3_client = s3_client
+        self.s3_uri = s3_uri.rstrip('/')
+        self.role_arn = role_arn
+
+    @staticmethod
+    def _split_uri(uri: str):
+        bucket, _, prefix = uri[len('s3://'):].partition('/')
+        return bucket, prefix
+
+    def submit(self, input_path: str, model_id: str, job_name: str) -> Dict[str, Any]:
+        input_uri = f"{self.s3_uri}/{job_name}/input/{os.path.basename(input_path)}"
+        output_uri = f"{self.s3_uri}/{job_name}/output/"
+        bucket, key = self._split_uri(input_uri)
+        self.s3_client.upload_file(input_path, bucket, key)
+
+        response = self.bedrock_client.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': input_uri}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': output_uri}}
+        )
+        return {'backend': 'bedrock', 'job_arn': response['jobArn'], 'output_uri': output_uri}
+
+    def status(self, job: Dict[str, Any]) -> str:
+        return self.bedrock_client.get_model_invocation_job(jobIdentifier=job['job_arn'])['status']
+
+    def fetch_output(self, job: Dict[str, Any], output_path: str) -> None:
+        bucket, prefix = self._split_uri(job['output_uri'])
+        keys = []
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []) if item['Key'].endswith('.jsonl.out'))
+        if not keys:
+            raise Exception(f"No output records found under {job['output_uri']}")
+
+        with open(output_path, 'wb') as output:
+            for key in sorted(keys):
+                output.write(self.s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+
+class LocalBatchBackend(BatchBackend):
+    def __init__(self, invoke: Callable[[str, Dict[str, Any]], Dict[str, Any]]):
+        """
+        Stand-in backend running every record on submit, for tests and runs too small for a Bedrock job
+
+        Args:
+            invoke (Callable[[str, Dict[str, Any]], Dict[str, Any]]): Returns the response body of
+                (model id, model input), e.g. a synchronous invoke_model call
+        """
+        self.invoke = invoke
+
+    def submit(self, input_path: str, model_id: str, job_name: str) -> Dict[str, Any]:
+        output_path = f"{input_path}.local.out"
+        with open(input_path) as records, open(output_path, 'w') as output:
+            for line in records:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                try:
+                    record['modelOutput'] = self.invoke(model_id, record['modelInput'])
+                except Exception as e:
+                    record['error'] = {'errorMessage': str(e)}
+                output.write(json.dumps(record) + '\n')
+        return {'backend': 'local', 'output_path': output_path}
+
+    def status(self, job: Dict[str, Any]) -> str:
+        return 'Completed'
+
+    def fetch_output(self, job: Dict[str, Any], output_path: str) -> None:
+        if os.path.abspath(job['output_path']) != os.path.abspath(output_path):
+            with open(job['output_path'], 'rb') as source, open(output_path, 'wb') as output:
+                output.write(source.read())
+
+
+def _read_jobs(run_dir: str) -> List[Dict[str, Any]]:
+    path = os.path.join(run_dir, JOBS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_jobs(run_dir: str, jobs: List[Dict[str, Any]]) -> None:
+    path = os.path.join(run_dir, JOBS_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(jobs, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_job_input(run_dir: str, model_id: str, record_ids: set, part: int) -> str:
+    """Input file of one job, holding the given records of a judge model"""
+    input_path = os.path.join(run_dir, f"{model_file_name(model_id)[:-len('.jsonl')]}.part{part}.jsonl")
+    with open(os.path.join(run_dir, model_file_name(model_id))) as records, open(input_path, 'w') as output:
+        for line in records:
+            try:
+                record_id = json.loads(line)['recordId']
+            except (json.JSONDecodeError, KeyError):
+                # Last line of an interrupted write
+                continue
+            if record_id in record_ids:
+                output.write(line)
+    return input_path
+
+
+def submit_batch_jobs(run_dir: str, backend: BatchBackend) -> List[Dict[str, Any]]:
+    """
+    Submit a batch job per judge model for the records of a run directory not yet submitted
+
+    The job manifest keeps the record ids of every job, so a later run of the same data file
+    appending records to the directory gets a new job over its new records only.
+
+    Args:
+        run_dir (str): Directory written by BatchJudgeQueue
+        backend (BatchBackend): Backend running the jobs
+
+    Returns:
+        Job manifest of the run
+    """
+    jobs = _read_jobs(run_dir)
+    submitted = {record_id for job in jobs for record_id in job['record_ids']}
+    pending = {}
+    for request in read_requests(run_dir).values():
+        if request['recordId'] not in submitted:
+            pending.setdefault(request['model_id'], set()).add(request['recordId'])
+
+    for model_id in sorted(pending):
+        part = sum(1 for job in jobs if job['model_id'] == model_id) + 1
+        input_path = _write_job_input(run_dir, model_id, pending[model_id], part)
+        job_name = re.sub(r'[^A-Za-z0-9-]', '-', f"judge-{os.path.basename(os.path.normpath(run_dir))}-"
+                                                  f"{model_id.split('.')[-1].split(':')[0]}-{part}-{int(time.time())}")[:63]
+        job = backend.submit(input_path, model_id, job_name)
+        jobs.append({'model_id': model_id, 'input_path': input_path, 'job_name': job_name, 'job': job,
+                     'record_ids': sorted(pending[model_id])})
+        # Written after every submission, so a failure does not lose the jobs already started
+        _write_jobs(run_dir, jobs)
+        print(f"Submitted batch judge job {job_name} for {len(pending[model_id])} {model_id} record(s)")
+    return jobs
+
+
+def ingest_batch_results(run_dir: str, backend: BatchBackend, exporter, judge_cache=None) -> Dict[str, int]:
+    """
+    Attach the scores of completed batch jobs to the Langfuse traces of their run
+
+    Scores use the ids and names of on-demand judging, so ingesting twice overwrites
+    instead of duplicating. Parsed results are also stored in the judge cache.
+
+    Args:
+        run_dir (str): Directory written by BatchJudgeQueue and submit_batch_jobs
+        backend (BatchBackend): Backend the jobs were submitted to
+        exporter: TraceExporter the scores are sent with
+        judge_cache: Optional JudgeCache to store the results in
+
+    Returns:
+        Counts of ingested and failed records, of records whose output was recovered from
+        prose around it, and of jobs still pending
+    """
+    requests = read_requests(run_dir)
+    counts = {'ingested': 0, 'recovered': 0, 'failed': 0, 'pending_jobs': 0}
+
+    for entry in _read_jobs(run_dir):
+        status = backend.status(entry['job'])
+        if status != 'Completed':
+            print(f"Batch judge job {entry['job_name']} is {status}")
+            counts['pending_jobs'] += 1
+            continue
+
+        output_path = f"{entry['input_path']}.out"
+        backend.fetch_output(entry['job'], output_path)
+        with open(output_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                request = requests.get(record.get('recordId'))
+                if request is None:
+                    continue
+                try:
+                    if record.get('error'):
+                        raise Exception(record['error'])
+                    output = record['modelOutput']
+                    # Tool input of structured output, or the evaluation recovered from the text
+                    results, method = extract_judge_output(output['content'], output_schema(request['target']))
+                    counts['recovered'] += int(method == RECOVERED)
+                    _attach_scores(request['target'], results, exporter)
+                    if judge_cache and request['target'].get('cache_key'):
+                        usage = output.get('usage', {})
+                        judge_cache.put(request['target']['cache_key'], request['model_id'], results,
+                                        usage.get('input_tokens', 0) + usage.get('output_tokens', 0))
+                    counts['ingested'] += 1
+                except Exception as e:
+                    print(f"Failed to ingest batch judge record {request['key']}: {str(e)}")
+                    counts['failed'] += 1
+    return counts
+
+
+def _attach_scores(target: Dict[str, Any], results: Dict[str, Any], exporter) -> None:
+    """Send the scores of one judge result to its trace"""
+    if target['format'] == 'cot':
+        scores = results
+        # The CoT generation was uploaded without output, pending this result
+        exporter.generation(id=target['observation_id'], trace_id=target['trace_id'], output=results)
+    else:
+        scores = results['metrics_scores']
+        missing = [metric for metric in target.get('metrics') or [] if metric not in scores]
+        if missing:
+            raise Exception(f"Metrics missing from judge output: {', '.join(missing)}")
+
+    for metric_name, value in scores.items():
+        score = {
+            'id': f"{target['trace_id']}-{target['score_prefix']}{metric_name}",
+            'trace_id': target['trace_id'],
+            'name': f"{target['score_prefix']}{metric_name}",
+            'value': value['score'],
+            'comment': value.get('explanation')
+        }
+        if target.get('observation_id'):
+            score['observation_id'] = target['observation_id']
+        exporter.score(**score)
@@ -0,0 +1,121 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+from helpers.retry_helper import classify_error, THROTTLING
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Check whether an exception is a Bedrock throttling error"""
+    return classify_error(error) == THROTTLING
+
+
+class AIMDController:
+    def __init__(self, name: str, initial_limit: int = 2, min_limit: int = 1, max_limit: int = 8,
+                 increase: float = 1.0, decrease_factor: float = 0.5):
+        """
+        Additive-increase / multiplicative-decrease limit on in-flight calls to one Bedrock API
+
+        The limit grows by `increase` for every `limit` successful calls and is cut by
+        `decrease_factor` when a call is throttled, so it settles near the real service capacity.
+
+        Args:
+            name (str): Name of the API the limit applies to
+            initial_limit (int): Starting number of in-flight calls
+            min_limit (int): Lowest limit the controller backs off to
+            max_limit (int): Highest limit the controller grows to
+            increase (float): Limit added per window of successful calls
+            decrease_factor (float): Multiplier applied to the limit on throttling
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.condition = threading.Condition()
+
+        # Calls started before the last decrease belong to an older epoch, their
+        # throttles are the same congestion event and do not cut the limit again
+        self.epoch = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.decreases = 0
+
+    def acquire(self) -> int:
+        """
+        Block until an in-flight slot is free
+
+        Returns:
+            Epoch of the slot, passed back to release()
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return self.epoch
+
+    def release(self, epoch: int, throttled: bool = False, succeeded: bool = True) -> None:
+        """
+        Free a slot and adjust the limit from the outcome of the call
+
+        Args:
+            epoch (int): Epoch returned by acquire()
+            throttled (bool): The call was throttled by the service
+            succeeded (bool): The call completed, other failures leave the limit unchanged
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                if epoch == self.epoch:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.decreases += 1
+                    self.epoch += 1
+                    print(f"Throttling on {self.name}, concurrency limit lowered to {int(self.limit)}")
+            elif succeeded:
+                self.successes += 1
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold an in-flight slot for the duration of a call"""
+        epoch = self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(epoch, throttled=is_throttling_error(e), succeeded=False)
+            raise
+        else:
+            self.release(epoch)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current limit and counters for reporting"""
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'successes': self.successes,
+                'throttles': self.throttles,
+                'decreases': self.decreases
+            }
+
+
+def create_concurrency_controllers(limits: Dict[str, Dict[str, int]]) -> Dict[str, AIMDController]:
+    """
+    Create the shared concurrency controllers, one per Bedrock API
+
+    Args:
+        limits (Dict[str, Dict[str, int]]): API name -> {'initial': ..., 'max': ...}
+
+    Returns:
+        Dict of API name -> AIMDController
+    """
+    return {
+        api: AIMDController(api, initial_limit=limit.get('initial', 2), max_limit=limit.get('max', 8))
+        for api, limit in limits.items()
+    }
@@ -0,0 +1,303 @@
+import re
+import threading
+from typing import Dict, Any, List, Optional
+from helpers.rate_limiter import estimate_tokens
+from helpers.trace_analysis import tool_name
+
+# tiktoken encoding used to count CoT tokens, close enough to the judge models' tokenizers for budgeting
+ENCODING_NAME = 'cl100k_base'
+
+# Words per shingle when comparing rationales
+SHINGLE_SIZE = 3
+
+# Most tokens kept of one observation once the trace is over budget, as a share of the budget
+OBSERVATION_SHARE = 0.1
+MIN_OBSERVATION_TOKENS = 64
+
+
+class TokenCounter:
+    def __init__(self, encoding_name: str = ENCODING_NAME):
+        """
+        tiktoken token counts, or the ~4 characters per token estimate when the encoding cannot be loaded
+
+        tiktoken downloads its encodings on first use, so offline runs fall back to the estimate.
+        """
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            print(f"tiktoken encoding {encoding_name} unavailable ({str(e)}), estimating CoT tokens from characters")
+            self.encoding = None
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """First max_tokens tokens of a text"""
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text.lower())).strip()
+
+
+def _shingles(text: str) -> frozenset:
+    words = _normalize(text).split()
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([' '.join(words)])
+    return frozenset(' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def observation_text(observation: Dict[str, Any]) -> Optional[str]:
+    """Text a tool returned to the agent, None for final responses and reprompts"""
+    if 'actionGroupInvocationOutput' in observation:
+        return observation['actionGroupInvocationOutput'].get('text')
+    if 'knowledgeBaseLookupOutput' in observation:
+        references = observation['knowledgeBaseLookupOutput'].get('retrievedReferences', [])
+        return '\n'.join(reference.get('content', {}).get('text', '') for reference in references)
+    if 'agentCollaboratorInvocationOutput' in observation:
+        return observation['agentCollaboratorInvocationOutput'].get('output', {}).get('text')
+    if 'codeInterpreterInvocationOutput' in observation:
+        output = observation['codeInterpreterInvocationOutput']
+        return output.get('executionOutput') or output.get('executionError')
+    return None
+
+
+def cot_entries(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rationales and tool observations of an assembled trace, in trace order
+
+    Args:
+        steps (List[Dict[str, Any]]): Steps of assemble_trace()
+
+    Returns:
+        Entries with step (numbered from 1 over the steps holding a rationale or an observation),
+        kind ('rationale' or 'observation'), tool and text
+    """
+    entries = []
+    number = 0
+    for step in steps:
+        rationale = step.get('rationale', {}).get('text')
+        observation = observation_text(step.get('observation', {}))
+        if rationale is None and observation is None:
+            continue
+        number += 1
+        if rationale is not None:
+            entries.append({'step': number, 'kind': 'rationale', 'tool': None, 'text': rationale})
+        if observation is not None:
+            tool = tool_name(step.get('invocationInput', {}))[1]
+            entries.append({'step': number, 'kind': 'observation', 'tool': tool, 'text': observation})
+    return entries
+
+
+def _render(entry: Dict[str, Any]) -> str:
+    if entry['kind'] == 'rationale':
+        return f"Step {entry['step']}: {entry['text']}\n"
+    return f"Step {entry['step']} observation from {entry['tool']}: {entry['text']}\n"
+
+
+def _gap_marker(omitted: int) -> str:
+    return f"[{omitted} trace entries omitted to fit the token budget]\n"
+
+
+class CotCompactor:
+    def __init__(self, token_budget: int, duplicate_threshold: float = 0.9):
+        """
+        Fits the chain of thought sent to the CoT judge into a token budget
+
+        The trace is compacted in a fixed order, so the same trace always gives the same text:
+        1. Rationales whose word shingles overlap an earlier kept rationale by at least
+           duplicate_threshold (Jaccard) are removed.
+        2. An observation repeating an earlier one of the same tool is replaced by a reference to it.
+        3. Over budget, observations are cut to their first tokens (10% of the budget, at least 64).
+        4. Still over budget, whole entries are omitted from the middle of the trace outwards,
+           observations before rationales. The first and last rationales are kept, and each run
+           of omitted entries is replaced by a marker.
+        5. If the kept entries are still over budget, each is cut to an equal share of it.
+
+        The compacted text always fits the budget, as long as the budget leaves room for the
+        labels of the first and last rationales and the omission markers (a few dozen tokens).
+
+        Args:
+            token_budget (int): Most tokens of the compacted chain of thought
+            duplicate_threshold (float): Shingle overlap from which a rationale counts as a duplicate
+        """
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.counter = TokenCounter()
+        self.lock = threading.Lock()
+
+        self.traces = 0
+        self.over_budget = 0
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+        self.duplicate_rationales = 0
+        self.collapsed_observations = 0
+        self.omitted_entries = 0
+
+    def _deduplicate(self, entries: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Drop near-duplicate rationales and collapse repeated observations, in place"""
+        kept_rationales = []
+        seen_observations = {}
+        duplicates = 0
+        collapsed = 0
+        result = []
+        for entry in entries:
+            if entry['kind'] == 'rationale':
+                shingles = _shingles(entry['text'])
+                if any(len(shingles & other) / len(shingles | other) >= self.duplicate_threshold
+                       for other in kept_rationales):
+                    duplicates += 1
+                    continue
+                kept_rationales.append(shingles)
+            else:
+                key = (entry['tool'], _normalize(entry['text']))
+                if key in seen_observations:
+                    entry = {**entry, 'text': f"same result as step {seen_observations[key]}"}
+                    collapsed += 1
+                else:
+                    seen_observations[key] = entry['step']
+            result.append(entry)
+        entries[:] = result
+        return {'duplicate_rationales': duplicates, 'collapsed_observations': collapsed}
+
+    def _clip(self, entry: Dict[str, Any], max_tokens: int) -> bool:
+        """Cut the text of an entry so it renders to at most max_tokens (label and truncation note included), True if it was cut further"""
+        if entry['tokens'] <= max_tokens:
+            return False
+        full_text = entry.setdefault('full_text', entry['text'])
+        full_tokens = self.counter.count(full_text)
+        kept = entry.get('kept_tokens', full_tokens)
+        cut = False
+        while kept > 0 and entry['tokens'] > max_tokens:
+            kept = max(0, min(kept - 1, kept - (entry['tokens'] - max_tokens)))
+            entry['text'] = self.counter.truncate(full_text, kept) + f" [... {full_tokens - kept} tokens truncated]"
+            entry['tokens'] = self.counter.count(_render(entry))
+            entry['kept_tokens'] = kept
+            cut = True
+        return cut
+
+    def _join(self, entries: List[Dict[str, Any]], kept: List[bool]) -> str:
+        """Text of the kept entries, each run of omitted entries replaced by a marker"""
+        parts = []
+        omitted = 0
+        for entry, keep in zip(entries, kept):
+            if keep:
+                if omitted:
+                    parts.append(_gap_marker(omitted))
+                    omitted = 0
+                parts.append(_render(entry))
+            else:
+                omitted += 1
+        if omitted:
+            parts.append(_gap_marker(omitted))
+        return ''.join(parts)
+
+    def _total(self, entries: List[Dict[str, Any]], kept: List[bool]) -> int:
+        """Tokens of the kept entries and the markers of the omitted runs"""
+        total = 0
+        omitted = 0
+        for entry, keep in zip(entries, kept):
+            if keep:
+                if omitted:
+                    total += self.counter.count(_gap_marker(omitted))
+                    omitted = 0
+                total += entry['tokens']
+            else:
+                omitted += 1
+        if omitted:
+            total += self.counter.count(_gap_marker(omitted))
+        return total
+
+    def compact(self, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compacted chain of thought of an assembled trace
+
+        Args:
+            steps (List[Dict[str, Any]]): Steps of assemble_trace()
+
+        Returns:
+            Dict with text (the chain of thought for the judge) and report (tokens before and after,
+            and how many entries each rule removed, collapsed, cut or omitted)
+        """
+        entries = cot_entries(steps)
+        for entry in entries:
+            entry['tokens'] = self.counter.count(_render(entry))
+        original_tokens = sum(entry['tokens'] for entry in entries)
+
+        report = {'budget': self.token_budget, 'original_tokens': original_tokens, **self._deduplicate(entries)}
+        for entry in entries:
+            entry['tokens'] = self.counter.count(_render(entry))
+        kept = [True] * len(entries)
+
+        over_budget = self._total(entries, kept) > self.token_budget
+        if over_budget:
+            observation_tokens = max(MIN_OBSERVATION_TOKENS, int(self.token_budget * OBSERVATION_SHARE))
+            for entry in entries:
+                if entry['kind'] == 'observation':
+                    self._clip(entry, observation_tokens)
+
+        rationales = [i for i, entry in enumerate(entries) if entry['kind'] == 'rationale']
+        protected = {rationales[0], rationales[-1]} if rationales else set()
+        middle = (len(entries) - 1) / 2
+        candidates = sorted(
+            (i for i in range(len(entries)) if i not in protected),
+            key=lambda i: (entries[i]['kind'] == 'rationale', abs(i - middle), i)
+        )
+        for i in candidates:
+            if self._total(entries, kept) <= self.token_budget:
+                break
+            kept[i] = False
+
+        text = self._join(entries, kept)
+        target = self.token_budget
+        remaining = [entry for entry, keep in zip(entries, kept) if keep]
+        while remaining and target > 0 and self.counter.count(text) > self.token_budget:
+            markers = self._total(entries, kept) - sum(entry['tokens'] for entry in remaining)
+            share = max(1, (target - markers) // len(remaining))
+            if not any([self._clip(entry, share) for entry in remaining]):
+                # The entries fit the target, but the joined text counts a few more tokens than its parts
+                target -= self.counter.count(text) - self.token_budget
+            text = self._join(entries, kept)
+
+        report.update({
+            'clipped_entries': sum('full_text' in entry for entry in entries),
+            'omitted_entries': kept.count(False),
+            'compacted_tokens': self.counter.count(text)
+        })
+        report['dropped_tokens'] = max(0, original_tokens - report['compacted_tokens'])
+
+        with self.lock:
+            self.traces += 1
+            self.over_budget += int(over_budget)
+            self.original_tokens += original_tokens
+            self.compacted_tokens += report['compacted_tokens']
+            self.duplicate_rationales += report['duplicate_rationales']
+            self.collapsed_observations += report['collapsed_observations']
+            self.omitted_entries += report['omitted_entries']
+        return {'text': text, 'report': report}
+
+    def metrics(self) -> Dict[str, Any]:
+        """Compaction counters for reporting"""
+        with self.lock:
+            return {
+                'traces': self.traces,
+                'over_budget': self.over_budget,
+                'original_tokens': self.original_tokens,
+                'compacted_tokens': self.compacted_tokens,
+                'dropped_tokens': max(0, self.original_tokens - self.compacted_tokens),
+                'duplicate_rationales': self.duplicate_rationales,
+                'collapsed_observations': self.collapsed_observations,
+                'omitted_entries': self.omitted_entries
+            }
+
+
+def create_cot_compactor(token_budget: int, duplicate_threshold: float) -> Optional[CotCompactor]:
+    """Shared CoT compactor, or None when no token budget is configured"""
+    if token_budget <= 0:
+        return None
+    return CotCompactor(token_budget, duplicate_threshold)
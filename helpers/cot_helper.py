@@ -1,21 +1,49 @@
-from langchain_aws import ChatBedrock
 from langchain.prompts import PromptTemplate
-import json
+from helpers.rate_limiter import estimate_tokens
+from helpers.prompt_cache import converse, converse_request, converse_content, converse_tokens
+from helpers.judge_output import scores_schema, converse_tool_config, anthropic_tools, read_judge_output
+
+# Message asking the judge for its evaluation, after the system prompt
+COT_USER_MESSAGE = "Please generate the chain-of-thought evaluation as specified."
+TRAJECTORY_USER_MESSAGE = "Please generate the trajectory evaluation as specified."
+
+# Most output tokens of a CoT evaluation
+COT_MAX_TOKENS = 1024
+
+# Metrics of the CoT and trajectory judges, as in their output formats
+COT_METRICS = ["helpfulness", "faithfulness", "instruction_following", "overall"]
+TRAJECTORY_METRICS = ["context_retention", "consistency", "goal_completion", "overall"]
+
+# Earlier turns of the session, ahead of the current turn's trace in incremental judging
+PRIOR_TURNS_TEMPLATE = """Earlier Turns of This Session (context only):
+{prior_turns}
+Evaluate only the current turn below, taking the earlier turns into account where the user refers back to them.
+
+"""
 
-# Goal: Evaluate agent CoT using LLM-as-judge and output results
-def evaluate_cot(agent_cot:str, agent_response:str, agent_info:list, client, MODEL_ID_EVAL_COT):
+
+def clean_prompt_indentation(prompt_string):
+    # Split into lines and strip leading/trailing whitespace
+    lines = prompt_string.split('\n')
+    cleaned_lines = [line.strip() for line in lines]
+    # Rejoin with newlines
+    return '\n'.join(cleaned_lines)
+
+
+# Build the CoT judge prompt, returns (system prompt, user prompt)
+# The system prompt (rubric, agent and collaborator instructions) is the same for every question
+# of an agent, so it comes first and can be cached; the question's trace and answer follow
+# prior_turns optionally holds the rolling summary of the earlier turns of the trajectory
+def build_cot_prompt(agent_cot:str, agent_response:str, agent_info:list, prior_turns=None):
 
     # Clean inputs to template
     agent_instructions = agent_info['agentInstruction']
     collaborator_instructions = agent_info['collaborators']
     # clean_agent_cot = agent_cot
 
-    # Initialize Bedrock client
-    llm = ChatBedrock(model = MODEL_ID_EVAL_COT, client=client)
-    
     system_prompt_template = PromptTemplate(
 
-        input_variables=["agent_instructions", "collaborator_instructions", "agent_cot"],
+        input_variables=["agent_instructions", "collaborator_instructions"],
         template="""
         You are an expert evaluator analyzing AI Agent execution. Evaluate the agent's chain of thought performance on three key metrics:
 
@@ -25,12 +53,6 @@ def evaluate_cot(agent_cot:str, agent_response:str, agent_info:list, client, MOD
         Collaboration Context:
         {collaborator_instructions}
 
-        Agent Chain-of-Thought:
-        {agent_cot}
-
-        Final Agent Response:
-        {agent_response}
-
         Evaluate on these three critical aspects:
 
         Helpfulness: How well does the execution satisfy explicit and implicit expectations?
@@ -80,28 +102,185 @@ def evaluate_cot(agent_cot:str, agent_response:str, agent_info:list, client, MOD
         """
     )
 
-    # Format the system prompt with function parameters
-    system_prompt = system_prompt_template.format(agent_cot=agent_cot, agent_instructions=agent_instructions, collaborator_instructions=collaborator_instructions, agent_response=agent_response)
+    user_prompt_template = PromptTemplate(
+
+        input_variables=["prior_turns", "agent_cot", "agent_response", "user_message"],
+        template="""
+        {prior_turns}Agent Chain-of-Thought:
+        {agent_cot}
+
+        Final Agent Response:
+        {agent_response}
+
+        {user_message}
+        """
+    )
+
+    # Format the prompts with function parameters
+    system_prompt = system_prompt_template.format(agent_instructions=agent_instructions, collaborator_instructions=collaborator_instructions)
+    prior_section = ""
+    if prior_turns:
+        prior_section = PRIOR_TURNS_TEMPLATE.format(prior_turns=prior_turns)
+    user_prompt = user_prompt_template.format(prior_turns=prior_section, agent_cot=agent_cot, agent_response=agent_response,
+                                              user_message=COT_USER_MESSAGE)
+
+    return system_prompt, user_prompt
+
+
+# Tool the judge answers through when structured output is on, its input is the evaluation
+def judge_tool(judge_name, metrics):
+    return (f"record_{judge_name}_evaluation", f"Record the {judge_name} evaluation, one score and explanation per metric",
+            scores_schema(metrics))
+
+
+# invoke_model body (Anthropic messages) of the CoT judge prompt, for batch inference
+def cot_model_input(system_prompt, user_prompt, structured_output=True):
+    model_input = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": COT_MAX_TOKENS,
+        "system": system_prompt,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": user_prompt}]}]
+    }
+    if structured_output:
+        model_input.update(anthropic_tools(*judge_tool('cot', COT_METRICS)))
+    return model_input
+
+
+# Goal: Evaluate agent CoT using LLM-as-judge and output results
+# The judge is called through the Converse API, with a prompt cache checkpoint after the
+# system prompt when cache_prompt is set; cache_stats records the cache read / write tokens
+# call_guard optionally wraps the model call, e.g. to charge it to the shared judge rate limit
+# judge_cache optionally serves repeated evaluations without calling the model
+# defer optionally queues the call for batch inference instead of making it, called with
+# (model id, invoke_model body, judge cache key or None); the results are then None
+# prior_turns optionally holds the rolling summary of the earlier turns (incremental judging)
+# structured_output makes the judge answer through a tool whose input schema is the output format;
+# either way the output is read by the tolerant extractor and counted in output_stats
+def evaluate_cot(agent_cot:str, agent_response:str, agent_info:list, client, MODEL_ID_EVAL_COT, call_guard=None, judge_cache=None, defer=None,
+                 cache_prompt=False, cache_stats=None, prior_turns=None, structured_output=True, output_stats=None):
+
+    system_prompt, user_prompt = build_cot_prompt(agent_cot, agent_response, agent_info, prior_turns)
+    cache_key = judge_cache.make_key(MODEL_ID_EVAL_COT, {}, [system_prompt, user_prompt]) if judge_cache else None
+
+    # Prompt as shown with the CoT generation in Langfuse
+    full_prompt = clean_prompt_indentation(system_prompt + user_prompt)
+
+    if defer:
+        eval_results = judge_cache.get(cache_key) if cache_key else None
+        if eval_results is None:
+            defer(MODEL_ID_EVAL_COT, cot_model_input(system_prompt, user_prompt, structured_output), cache_key)
+        return eval_results, full_prompt
+
+    eval_results = _call_judge(system_prompt, user_prompt, client, MODEL_ID_EVAL_COT, 'cot', COT_METRICS, call_guard, judge_cache,
+                               cache_key, cache_prompt, cache_stats, structured_output, output_stats)
+    return eval_results, full_prompt
+
+
+# Call the judge with a system and user prompt and read its evaluation of the metrics, through the judge cache when given
+def _call_judge(system_prompt, user_prompt, client, model_id, judge_name, metrics, call_guard, judge_cache, cache_key, cache_prompt,
+                cache_stats, structured_output, output_stats):
+
+    tool_name, description, schema = judge_tool(judge_name, metrics)
+    request = converse_request(model_id, system_prompt, user_prompt, COT_MAX_TOKENS, cache_prompt=cache_prompt,
+                               tool_config=converse_tool_config(tool_name, description, schema) if structured_output else None)
+
+    # Invoke the model to get the evaluation
+    def invoke_judge():
+        if call_guard:
+            response = call_guard(
+                lambda: converse(client, request),
+                tokens=estimate_tokens(system_prompt + user_prompt),
+                usage_fn=converse_tokens
+            )
+        else:
+            response = converse(client, request)
+
+        if cache_stats:
+            cache_stats.record(judge_name, response)
+
+        # Tool input, or the evaluation recovered from the text (before caching, so invalid responses are not kept)
+        return read_judge_output(judge_name, converse_content(response), schema, output_stats), converse_tokens(response)
+
+    if judge_cache:
+        return judge_cache.get_or_call(cache_key, model_id, invoke_judge)
+    return invoke_judge()[0]
+
+
+# Build the end-of-trajectory judge prompt, returns (system prompt, user prompt)
+def build_trajectory_prompt(turns:str, agent_info:list):
+
+    system_prompt_template = PromptTemplate(
+
+        input_variables=["agent_instructions"],
+        template="""
+        You are an expert evaluator analyzing a multi-turn conversation between a user and an AI Agent on one session. Each turn is also judged on its own; evaluate the conversation as a whole on these aspects:
+
+        Agent Instructions:
+        {agent_instructions}
+
+        Context Retention: Does the agent carry information from earlier turns into later ones?
+        - Does it resolve references to earlier questions and answers correctly?
+        - Does it avoid asking again for what the user already said?
+
+        Consistency: Are the agent's answers consistent with each other across turns?
+        - Does it avoid contradicting its earlier answers without reason?
+        - Does its reasoning quality hold up as the conversation gets longer?
+
+        Goal Completion: Taken together, do the turns accomplish what the user set out to do?
+
+        Output your evaluation in the following Python dictionary format:
+
+        {{
+            "context_retention": {{
+                "score": <float 0-1>,
+                "explanation": "<brief explanation>"
+            }},
+
+            "consistency": {{
+                "score": <float 0-1>,
+                "explanation": "<brief explanation>"
+            }},
+
+            "goal_completion": {{
+                "score": <float 0-1>,
+                "explanation": "<brief explanation>"
+            }},
+
+            "overall": {{
+                "score": <float 0-1>,
+                "explanation": "<brief summary>"
+            }}
+        }}
+
+        Provide clear, concise explanations referring to specific turns. Ensure your output is a valid Python dictionary that can be parsed directly. Do not include any text before or after the dictionary.
+        """
+    )
+
+    user_prompt_template = PromptTemplate(
+
+        input_variables=["turns", "user_message"],
+        template="""
+        Conversation Turns:
+        {turns}
+
+        {user_message}
+        """
+    )
 
-    # Create the messages list
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": "Please generate the chain-of-thought evaluation as specified."}
-    ]
+    system_prompt = system_prompt_template.format(agent_instructions=agent_info['agentInstruction'])
+    user_prompt = user_prompt_template.format(turns=turns, user_message=TRAJECTORY_USER_MESSAGE)
 
-    # Invoke the model to get CoT evaluation
-    response = llm.invoke(messages)
+    return system_prompt, user_prompt
 
-    # Convert model response to dictionary
-    eval_results = json.loads(response.content)
 
-    def clean_prompt_indentation(prompt_string):
-        # Split into lines and strip leading/trailing whitespace
-        lines = prompt_string.split('\n')
-        cleaned_lines = [line.strip() for line in lines]
-        # Rejoin with newlines
-        return '\n'.join(cleaned_lines)
+# Goal: Evaluate a whole trajectory from the summaries of its answered turns, called like evaluate_cot
+def evaluate_trajectory_cot(turns:str, agent_info:list, client, MODEL_ID_EVAL_COT, call_guard=None, judge_cache=None,
+                            cache_prompt=False, cache_stats=None, structured_output=True, output_stats=None):
 
-    system_prompt = clean_prompt_indentation(system_prompt)
+    system_prompt, user_prompt = build_trajectory_prompt(turns, agent_info)
+    cache_key = judge_cache.make_key(MODEL_ID_EVAL_COT, {}, [system_prompt, user_prompt]) if judge_cache else None
+    full_prompt = clean_prompt_indentation(system_prompt + user_prompt)
 
-    return eval_results, system_prompt
\ No newline at end of file
+    eval_results = _call_judge(system_prompt, user_prompt, client, MODEL_ID_EVAL_COT, 'trajectory', TRAJECTORY_METRICS, call_guard,
+                               judge_cache, cache_key, cache_prompt, cache_stats, structured_output, output_stats)
+    return eval_results, full_prompt
\ No newline at end of file
@@ -0,0 +1,129 @@
+import threading
+from typing import Dict, Any, List, Optional
+
+# Most characters of a question, answer or rationale kept in a turn summary
+TURN_TEXT_CHARS = 300
+
+
+def _shorten(text: Any, max_chars: int = TURN_TEXT_CHARS) -> str:
+    text = ' '.join(str(text or '').split())
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + '...'
+
+
+def summarize_turn(turn: int, question: str, answer: Any, rationales: List[str]) -> Dict[str, Any]:
+    """
+    Compact summary of one answered question of a trajectory
+
+    Only what the agent did is kept, not how it was judged, so the judge of a later turn
+    is not anchored on its own earlier scores.
+
+    Args:
+        turn (int): Position of the question in its trajectory, from 1
+        question (str): Question sent to the agent
+        answer (Any): Final agent response
+        rationales (List[str]): Rationales of the agent trace, in order
+
+    Returns:
+        Dict with turn, question, answer and reasoning (the first and last rationales)
+    """
+    reasoning = rationales[:1] + rationales[-1:] if len(rationales) > 1 else rationales
+    return {
+        'turn': turn,
+        'question': _shorten(question),
+        'answer': _shorten(answer),
+        'reasoning': [_shorten(rationale) for rationale in reasoning]
+    }
+
+
+def render_turn(summary: Dict[str, Any]) -> str:
+    """Text of a turn summary as shown to the judge"""
+    lines = [f"Turn {summary['turn']}:", f"User: {summary['question']}"]
+    lines.extend(f"Agent reasoning: {rationale}" for rationale in summary['reasoning'])
+    lines.append(f"Agent: {summary['answer']}")
+    return '\n'.join(lines) + '\n'
+
+
+def _render_folded(summaries: List[Dict[str, Any]]) -> str:
+    """One line standing for the older turns"""
+    return f"Turns {summaries[0]['turn']}-{summaries[-1]['turn']}: {len(summaries)} earlier turn(s), not shown\n"
+
+
+class CotTurn:
+    def __init__(self, history: 'TrajectoryCotHistory', index: int):
+        """Position of one question in a trajectory's CoT history"""
+        self.history = history
+        self.index = index
+
+    @property
+    def number(self) -> int:
+        return self.index + 1
+
+    def prior_turns(self) -> Optional[str]:
+        """Rolling summary of the earlier turns, waiting until they are completed; None for the first turn"""
+        return self.history.rolling_summary(self.index)
+
+    def complete(self, summary: Optional[Dict[str, Any]]) -> None:
+        """Record the summary of this turn (None if it was not answered); later calls are ignored"""
+        self.history.complete(self.index, summary)
+
+
+class TrajectoryCotHistory:
+    def __init__(self, total_turns: int, recent_turns: int = 3, stop_event: Optional[threading.Event] = None):
+        """
+        Answered turns of one trajectory, for incremental CoT judging
+
+        A turn is completed with its summary once the agent has answered it, before it is
+        judged. Each question is judged with a rolling summary of the turns before it: the last
+        recent_turns turns in full (question, agent reasoning and answer) and one line
+        counting the older ones, so the judge prompt stays about the same size however long
+        the trajectory gets. Turns are completed once answered; the judge of a turn waits
+        until every earlier turn is completed, answered or not.
+
+        Args:
+            total_turns (int): Questions in the trajectory
+            recent_turns (int): Earlier turns kept in full in the rolling summary
+            stop_event (Optional[threading.Event]): Set when the run is interrupted, stops waiting on earlier turns
+        """
+        self.recent_turns = recent_turns
+        self.stop_event = stop_event
+        self.condition = threading.Condition()
+        self.summaries = [None] * total_turns
+        self.done = [False] * total_turns
+
+    def turn(self, index: int) -> CotTurn:
+        return CotTurn(self, index)
+
+    def complete(self, index: int, summary: Optional[Dict[str, Any]]) -> None:
+        with self.condition:
+            if self.done[index]:
+                return
+            self.summaries[index] = summary
+            self.done[index] = True
+            self.condition.notify_all()
+
+    def cancel(self) -> None:
+        """Complete every pending turn without a summary, releasing anything waiting on them"""
+        for index in range(len(self.done)):
+            self.complete(index, None)
+
+    def _completed_before(self, index: int) -> List[Dict[str, Any]]:
+        with self.condition:
+            while not self.condition.wait_for(lambda: all(self.done[:index]), timeout=1):
+                if self.stop_event is not None and self.stop_event.is_set():
+                    break
+            return [summary for summary in self.summaries[:index] if summary is not None]
+
+    def rolling_summary(self, index: int) -> Optional[str]:
+        """Summary of the turns before index, None when there are none"""
+        summaries = self._completed_before(index)
+        if not summaries:
+            return None
+        split = max(0, len(summaries) - self.recent_turns)
+        older, recent = summaries[:split], summaries[split:]
+        parts = [_render_folded(older)] if older else []
+        parts.extend(render_turn(summary) for summary in recent)
+        return '\n'.join(parts)
+
+    def transcript(self) -> List[Dict[str, Any]]:
+        """Summaries of every answered turn, once all turns are completed"""
+        return self._completed_before(len(self.done))
@@ -0,0 +1,162 @@
+import array
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from langchain_core.embeddings import Embeddings
+
+# Vectors are stored as float64, so a cached vector is exactly the one first computed
+VECTOR_TYPECODE = 'd'
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int = 200000):
+        """
+        Persistent, content-addressed store of embedding vectors in SQLite
+
+        Vectors are keyed by a hash of the model id, the kind of embedding and the text, stored
+        as float64 blobs, and evicted least recently used first once max_entries is exceeded.
+        Storing them at full precision keeps the scores of a rerun served from the cache equal
+        to those of the run that computed the vectors.
+        One cache is shared by every evaluator and worker.
+
+        Args:
+            path (str): Path of the SQLite database
+            max_entries (int): Most vectors kept on disk
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model_id: str, kind: str, text: str) -> str:
+        # The typecode keeps vectors stored in another format by earlier versions from being read back
+        return hashlib.sha256(f"{VECTOR_TYPECODE}\0{model_id}\0{kind}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Cached vectors of the given keys, marking them as recently used"""
+        if not keys:
+            return {}
+
+        found = {}
+        with self.lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = array.array(VECTOR_TYPECODE, vector).tolist()
+
+            if found:
+                now = time.time()
+                self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                            [(now, key) for key in found])
+                self.connection.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, model_id: str, vectors: Dict[str, List[float]]) -> None:
+        """Store vectors by key, then evict the least recently used ones above max_entries"""
+        if not vectors:
+            return
+
+        now = time.time()
+        rows = [(key, model_id, array.array(VECTOR_TYPECODE, vector).tobytes(), now) for key, vector in vectors.items()]
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model_id, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self.connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self.connection.commit()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Cache counters for reporting"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_id: str):
+        """
+        Wrap an Embeddings model so only texts missing from the cache are embedded
+
+        Misses of a call are deduplicated and embedded with a single embed_documents call.
+
+        Args:
+            embeddings (Embeddings): Model computing the missing vectors
+            cache (EmbeddingCache): Shared vector store
+            model_id (str): Embedding model id, part of every key
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.model_id, kind, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            if kind == 'query':
+                computed = [self.embeddings.embed_query(text) for text in missing.values()]
+            else:
+                computed = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.model_id, new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, 'document')
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], 'query')[0]
+
+
+def create_embedding_cache(path: Optional[str], max_entries: int) -> Optional[EmbeddingCache]:
+    """Shared embedding cache, or None when no path is configured"""
+    if not path:
+        return None
+    return EmbeddingCache(path, max_entries=max_entries)
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Sequence, Tuple
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+
+# Temperature of the model params and call kwargs serialized in a langchain llm_string
+TEMPERATURE_PATTERN = re.compile(r"""['"]temperature['"]\s*[:,]\s*([-+0-9.eE]+)""")
+
+
+def is_deterministic(llm_string: str) -> bool:
+    """True when every temperature of a langchain llm_string is 0; without one, the model default (above 0 on Bedrock) applies"""
+    temperatures = TEMPERATURE_PATTERN.findall(llm_string)
+    try:
+        return bool(temperatures) and all(float(temperature) == 0 for temperature in temperatures)
+    except ValueError:
+        return False
+
+
+def normalize_prompt(prompt: Any) -> Any:
+    """Collapse whitespace in every string of a prompt, so indentation changes do not miss the cache"""
+    if isinstance(prompt, str):
+        return re.sub(r'\s+', ' ', prompt).strip()
+    if isinstance(prompt, dict):
+        return {key: normalize_prompt(value) for key, value in prompt.items()}
+    if isinstance(prompt, (list, tuple)):
+        return [normalize_prompt(item) for item in prompt]
+    return prompt
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.tokens = 0
+        self.error = None
+
+
+class JudgeCache:
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Persistent cache of deterministic (temperature 0) judge responses with single-flight calls
+
+        Entries are keyed by model id, call parameters and a hash of the normalized prompt,
+        stored in SQLite and evicted least recently used first once their total size exceeds
+        max_bytes. Concurrent calls for the same key share one upstream call.
+
+        Args:
+            path (str): Path of the SQLite database
+            max_bytes (int): Most bytes of cached responses kept on disk
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_tokens = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS judge_cache ("
+            "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, tokens INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS judge_cache_last_used ON judge_cache (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model_id: str, params: Dict[str, Any], prompt: Any) -> str:
+        """
+        Cache key of a judge call
+
+        Args:
+            model_id (str): Judge model id
+            params (Dict[str, Any]): Call parameters that change the response (max tokens, temperature...)
+            prompt (Any): Prompt string or messages
+
+        Returns:
+            Hex digest identifying the call
+        """
+        content = json.dumps({'model_id': model_id, 'params': params, 'prompt': normalize_prompt(prompt)},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached response of a key, or None"""
+        with self.lock:
+            row = self.connection.execute("SELECT value, tokens FROM judge_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE judge_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+            self.hits += 1
+            self.saved_tokens += row[1]
+        return json.loads(row[0])
+
+    def put(self, key: str, model_id: str, value: Any, tokens: int = 0) -> None:
+        """Store a response, then evict the least recently used ones above max_bytes"""
+        serialized = json.dumps(value, ensure_ascii=False)
+        size = len(serialized.encode('utf-8'))
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO judge_cache (key, model_id, value, size, tokens, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, serialized, size, tokens or 0, time.time())
+            )
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM judge_cache").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in self.connection.execute(
+                        "SELECT key, size FROM judge_cache ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.connection.execute("DELETE FROM judge_cache WHERE key = ?", (old_key,))
+                    total -= old_size
+                    self.evictions += 1
+            self.connection.commit()
+
+    def get_or_call(self, key: str, model_id: str, call: Callable[[], Tuple[Any, int]]) -> Any:
+        """
+        Cached response of a key, or the response of one upstream call shared by concurrent callers
+
+        Args:
+            key (str): Key from make_key()
+            model_id (str): Judge model id, kept for inspection
+            call (Callable[[], Tuple[Any, int]]): Makes the call and returns (JSON-serializable response, tokens used);
+                responses are only cached when the call returns, so parse them inside it
+
+        Returns:
+            The response
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self.in_flight[key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            # Followers did not pay for the shared call
+            with self.lock:
+                self.coalesced += 1
+                self.saved_tokens += flight.tokens
+            return flight.value
+
+        try:
+            value, tokens = call()
+            self.put(key, model_id, value, tokens)
+            flight.value = value
+            flight.tokens = tokens or 0
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            flight.done.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Cache counters for reporting"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'saved_tokens': self.saved_tokens,
+                'evictions': self.evictions
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class JudgeLangchainCache(BaseCache):
+    def __init__(self, cache: JudgeCache):
+        """
+        Langchain cache backed by a JudgeCache, for judge models called inside other libraries (RAGAS)
+
+        Langchain looks up and updates the cache in separate calls, so these lookups are cached
+        but not coalesced. Only calls made at temperature 0 are cached: RAGAS samples some
+        metrics at a higher temperature, and replaying one sample would freeze their scores.
+        """
+        self.cache = cache
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return JudgeCache.make_key(llm_string, {}, prompt)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        if not is_deterministic(llm_string):
+            return None
+        value = self.cache.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        return [loads(generation) for generation in value]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+        if not is_deterministic(llm_string):
+            return
+        tokens = 0
+        for generation in return_val:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+            tokens += usage.get('total_tokens', 0)
+        self.cache.put(self._key(prompt, llm_string), 'langchain', [dumps(generation) for generation in return_val], tokens)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self.cache.lock:
+            self.cache.connection.execute("DELETE FROM judge_cache WHERE model_id = 'langchain'")
+            self.cache.connection.commit()
+
+
+def create_judge_cache(path: Optional[str], max_mb: float) -> Optional[JudgeCache]:
+    """Shared judge cache, or None when no path is configured"""
+    if not path:
+        return None
+    return JudgeCache(path, max_bytes=int(max_mb * 1024 * 1024))
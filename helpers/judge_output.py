@@ -0,0 +1,237 @@
+import ast
+import re
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import orjson
+
+# How a judge response was read, see extract_judge_output
+STRUCTURED = 'structured'
+DIRECT = 'direct'
+RECOVERED = 'recovered'
+FAILED = 'failed'
+
+
+class JudgeOutputError(ValueError):
+    """Raised when no valid judge output can be read from a response"""
+    pass
+
+
+def scores_schema(metrics: List[str]) -> Dict[str, Any]:
+    """JSON schema of {metric: {'score': 0-1, 'explanation': str}} for the given metrics"""
+    return {
+        'type': 'object',
+        'properties': {
+            metric: {
+                'type': 'object',
+                'properties': {
+                    'score': {'type': 'number', 'minimum': 0, 'maximum': 1},
+                    'explanation': {'type': 'string'}
+                },
+                'required': ['score', 'explanation']
+            }
+            for metric in metrics
+        },
+        'required': list(metrics)
+    }
+
+
+def metrics_scores_schema(metrics: List[str]) -> Dict[str, Any]:
+    """JSON schema of {'metrics_scores': scores_schema(metrics)}, the domain judges' output"""
+    return {'type': 'object', 'properties': {'metrics_scores': scores_schema(metrics)}, 'required': ['metrics_scores']}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = '$') -> None:
+    """
+    Check a value against the subset of JSON schema the judge schemas use
+
+    Supports type (object, array, string, number, integer, boolean), properties, required,
+    items, minimum and maximum.
+
+    Raises:
+        JudgeOutputError: The value does not match the schema
+    """
+    expected = schema.get('type')
+    if expected == 'object':
+        if not isinstance(value, dict):
+            raise JudgeOutputError(f"{path} is not an object")
+        for key in schema.get('required', []):
+            if key not in value:
+                raise JudgeOutputError(f"{path}.{key} missing")
+        for key, child in schema.get('properties', {}).items():
+            if key in value:
+                validate(value[key], child, f"{path}.{key}")
+    elif expected == 'array':
+        if not isinstance(value, list):
+            raise JudgeOutputError(f"{path} is not an array")
+        for index, item in enumerate(value):
+            validate(item, schema.get('items', {}), f"{path}[{index}]")
+    elif expected in ('number', 'integer'):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or (expected == 'integer' and not float(value).is_integer()):
+            raise JudgeOutputError(f"{path} is not a{'n integer' if expected == 'integer' else ' number'}")
+        if value < schema.get('minimum', value) or value > schema.get('maximum', value):
+            raise JudgeOutputError(f"{path} out of range")
+    elif expected == 'string':
+        if not isinstance(value, str):
+            raise JudgeOutputError(f"{path} is not a string")
+    elif expected == 'boolean':
+        if not isinstance(value, bool):
+            raise JudgeOutputError(f"{path} is not a boolean")
+
+
+def converse_tool_config(tool_name: str, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Converse toolConfig making the judge answer through a single tool with the given input schema"""
+    return {
+        'tools': [{'toolSpec': {'name': tool_name, 'description': description, 'inputSchema': {'json': schema}}}],
+        'toolChoice': {'tool': {'name': tool_name}}
+    }
+
+
+def anthropic_tools(tool_name: str, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """tools and tool_choice of an invoke_model (Anthropic messages) body, same tool as converse_tool_config"""
+    return {
+        'tools': [{'name': tool_name, 'description': description, 'input_schema': schema}],
+        'tool_choice': {'type': 'tool', 'name': tool_name}
+    }
+
+
+def _balanced_objects(text: str) -> Iterator[str]:
+    """Outermost {...} fragments of a text in order, skipping braces inside quoted strings"""
+    depth = 0
+    start = None
+    quote = None
+    escaped = False
+    for position, char in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in ('"', "'") and depth:
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                start = position
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:position + 1]
+
+
+def _loads(fragment: str) -> Any:
+    """JSON, then JSON without trailing commas, then a Python literal (the CoT prompt asks for a Python dictionary)"""
+    try:
+        return orjson.loads(fragment)
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return orjson.loads(re.sub(r',\s*([}\]])', r'\1', fragment))
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(fragment)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise JudgeOutputError("Fragment is neither JSON nor a Python literal")
+
+
+def _check(value: Any, schema: Optional[Dict[str, Any]]) -> Any:
+    validate(value, schema)
+    return value
+
+
+def extract_judge_output(content: Any, schema: Optional[Dict[str, Any]] = None) -> Tuple[Any, str]:
+    """
+    Judge output of a model response, without calling the model again
+
+    Tried in order: the input of a tool use block (structured output), the whole text as
+    JSON (direct), then every balanced {...} fragment of the text parsed as JSON or a Python
+    literal (recovered). The first value matching the schema is returned.
+
+    Args:
+        content (Any): Response text, or content blocks of a converse() or invoke_model response
+        schema (Optional[Dict[str, Any]]): Schema the output must match, None to accept any object
+
+    Returns:
+        Tuple of (output, method), method one of 'structured', 'direct' or 'recovered'
+
+    Raises:
+        JudgeOutputError: No valid output in the response
+    """
+    if isinstance(content, str):
+        blocks = [{'text': content}]
+    else:
+        blocks = content or []
+
+    errors = []
+    texts = []
+    for block in blocks:
+        tool_use = block.get('toolUse') or (block if block.get('type') == 'tool_use' else None)
+        if tool_use is not None:
+            try:
+                return _check(tool_use.get('input'), schema), STRUCTURED
+            except JudgeOutputError as e:
+                errors.append(f"tool input: {str(e)}")
+        elif block.get('text'):
+            texts.append(block['text'])
+    text = ''.join(texts).strip()
+
+    try:
+        return _check(orjson.loads(text), schema), DIRECT
+    except (orjson.JSONDecodeError, JudgeOutputError):
+        pass
+
+    for fragment in _balanced_objects(text):
+        try:
+            return _check(_loads(fragment), schema), RECOVERED
+        except JudgeOutputError as e:
+            errors.append(str(e))
+
+    raise JudgeOutputError(f"No valid judge output in response ({'; '.join(errors) or 'no JSON object found'})")
+
+
+class JudgeOutputStats:
+    def __init__(self):
+        """How the judge responses of a run were read, per judge"""
+        self.lock = threading.Lock()
+        self.judges = {}
+
+    def record(self, judge: str, method: str) -> None:
+        """Count one response read with method ('structured', 'direct', 'recovered' or 'failed')"""
+        with self.lock:
+            counts = self.judges.setdefault(judge, {STRUCTURED: 0, DIRECT: 0, RECOVERED: 0, FAILED: 0})
+            counts[method] += 1
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Counters per judge, with the parse failure rate (responses that were not valid as
+        returned) and the recovery rate (share of those the tolerant extractor still read)
+        """
+        with self.lock:
+            metrics = {}
+            for judge, counts in self.judges.items():
+                responses = sum(counts.values())
+                not_valid = counts[RECOVERED] + counts[FAILED]
+                metrics[judge] = {
+                    'responses': responses,
+                    **counts,
+                    'parse_failure_rate': round(not_valid / responses, 3) if responses else 0,
+                    'recovery_rate': round(counts[RECOVERED] / not_valid, 3) if not_valid else 0
+                }
+            return metrics
+
+
+def read_judge_output(judge: str, content: Any, schema: Optional[Dict[str, Any]],
+                      stats: Optional[JudgeOutputStats] = None) -> Any:
+    """extract_judge_output, counting the method (or the failure) in stats"""
+    try:
+        output, method = extract_judge_output(content, schema)
+    except JudgeOutputError:
+        if stats:
+            stats.record(judge, FAILED)
+        raise
+    if stats:
+        stats.record(judge, method)
+    return output
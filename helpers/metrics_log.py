@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any
+from helpers.run_journal import _json_default
+
+
+class MetricsLog:
+    def __init__(self, path: str):
+        """
+        Append-only JSON lines file of per-question metrics, shared by every worker
+
+        Args:
+            path (str): Path of the metrics file, appended to across runs
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, kind: str, record: Dict[str, Any]) -> None:
+        """
+        Append one metrics record
+
+        Args:
+            kind (str): Type of the record, e.g. agent_stream
+            record (Dict[str, Any]): Identifiers and metrics of the record
+        """
+        line = json.dumps({'type': kind, 'timestamp': datetime.now().isoformat(), **record},
+                          default=_json_default, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Callable
+
+
+class MicroBatcher:
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], batch_size: int = 8,
+                 max_wait: float = 2.0, max_concurrent_batches: int = 1, name: str = "batch"):
+        """
+        Groups items submitted by many threads into batches processed with one call
+
+        A batch is dispatched as soon as it holds batch_size items, or max_wait seconds after
+        its first item arrived, whichever comes first. process_batch returns one result per
+        item, in order; a result that is an Exception fails only its own item. A batch of
+        several items that fails as a whole is retried one item at a time, so one bad item
+        does not fail the others.
+
+        submit() does not block, but run() holds its thread until the batch is processed, so
+        callers running items from a fixed pool of N threads never fill batches beyond N items.
+
+        Args:
+            process_batch (Callable[[List[Any]], List[Any]]): Function processing a batch of items
+            batch_size (int): Most items per batch
+            max_wait (float): Seconds a partial batch waits for more items
+            max_concurrent_batches (int): Batches processed at the same time
+            name (str): Name used in logs and thread names
+        """
+        self.process_batch = process_batch
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self.queue = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_batches), thread_name_prefix=f"{name}-batch")
+
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.split_batches = 0
+
+        self.stopped = threading.Event()
+        self.collector = threading.Thread(target=self._collect, name=f"{name}-collector", daemon=True)
+        self.collector.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item, the returned future resolves to its result"""
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def run(self, item: Any) -> Any:
+        """Queue an item and block until its batch has been processed"""
+        return self.submit(item).result()
+
+    def _collect(self) -> None:
+        while not (self.stopped.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.executor.submit(self._process, batch)
+
+    def _call(self, items: List[Any]) -> List[Any]:
+        results = self.process_batch(items)
+        if len(results) != len(items):
+            raise Exception(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _process(self, batch: List[Any]) -> None:
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+
+        with self.lock:
+            self.batches += 1
+            self.items += len(items)
+
+        try:
+            results = self._call(items)
+        except Exception as e:
+            with self.lock:
+                self.failed_batches += 1
+            if len(items) == 1:
+                futures[0].set_exception(e)
+                return
+            print(f"{self.name} batch of {len(items)} items failed ({str(e)}), retrying item by item")
+            with self.lock:
+                self.split_batches += 1
+            results = []
+            for item in items:
+                try:
+                    results.append(self._call([item])[0])
+                except Exception as item_error:
+                    results.append(item_error)
+
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self) -> None:
+        """Process the items still queued and stop the batcher"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.collector.join()
+        self.executor.shutdown(wait=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Batch counters for reporting"""
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'average_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+                'failed_batches': self.failed_batches,
+                'split_batches': self.split_batches
+            }
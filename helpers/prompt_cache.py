@@ -0,0 +1,124 @@
+import threading
+from typing import Dict, Any, List, Optional
+
+# Judge models that rejected cache checkpoints during this run
+_uncached_models = set()
+_lock = threading.Lock()
+
+
+def system_blocks(system_prompt: str, cache_prompt: bool) -> List[Dict[str, Any]]:
+    """Converse system content of a prompt prefix, followed by a cache checkpoint when prompt caching is on"""
+    blocks = [{'text': system_prompt}]
+    if cache_prompt:
+        blocks.append({'cachePoint': {'type': 'default'}})
+    return blocks
+
+
+def converse_request(model_id: str, system_prompt: str, user_prompt: str, max_tokens: int,
+                     temperature: Optional[float] = None, cache_prompt: bool = False,
+                     tool_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Converse request of a judge call, the invariant prefix first
+
+    Args:
+        model_id (str): Judge model id
+        system_prompt (str): Part of the prompt shared by many calls (rubric, agent or schema information)
+        user_prompt (str): Part of the prompt specific to one call
+        max_tokens (int): Most output tokens
+        temperature (Optional[float]): Sampling temperature, the model default when None
+        cache_prompt (bool): Put a prompt cache checkpoint after the system prompt
+        tool_config (Optional[Dict[str, Any]]): Converse toolConfig, for structured output through tool use
+
+    Returns:
+        Keyword arguments of bedrock-runtime converse()
+    """
+    inference_config = {'maxTokens': max_tokens}
+    if temperature is not None:
+        inference_config['temperature'] = temperature
+    request = {
+        'modelId': model_id,
+        'system': system_blocks(system_prompt, cache_prompt),
+        'messages': [{'role': 'user', 'content': [{'text': user_prompt}]}],
+        'inferenceConfig': inference_config
+    }
+    if tool_config:
+        request['toolConfig'] = tool_config
+    return request
+
+
+def _without_cache_points(request: Dict[str, Any]) -> Dict[str, Any]:
+    return {**request, 'system': [block for block in request['system'] if 'cachePoint' not in block]}
+
+
+def converse(client, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    converse() call of a judge request
+
+    Models that reject cache checkpoints are called again without them, and without them
+    for the rest of the run.
+    """
+    model_id = request['modelId']
+    with _lock:
+        uncached = model_id in _uncached_models
+    if uncached:
+        request = _without_cache_points(request)
+
+    try:
+        return client.converse(**request)
+    except Exception as e:
+        error = getattr(e, 'response', {}).get('Error', {})
+        cache_points = len(_without_cache_points(request)['system']) != len(request['system'])
+        if not (cache_points and error.get('Code') == 'ValidationException' and 'cach' in error.get('Message', '').lower()):
+            raise
+        with _lock:
+            if model_id not in _uncached_models:
+                print(f"{model_id} does not support prompt caching, calling it without cache checkpoints")
+                _uncached_models.add(model_id)
+        return client.converse(**_without_cache_points(request))
+
+
+def converse_content(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Content blocks (text or tool use) of a converse() response"""
+    return response['output']['message']['content']
+
+
+def converse_text(response: Dict[str, Any]) -> str:
+    """Text of a converse() response"""
+    return ''.join(block.get('text', '') for block in response['output']['message']['content'])
+
+
+def converse_tokens(response: Dict[str, Any]) -> int:
+    """Tokens a converse() call was charged for"""
+    usage = response.get('usage', {})
+    return usage.get('totalTokens', usage.get('inputTokens', 0) + usage.get('outputTokens', 0))
+
+
+class PromptCacheStats:
+    def __init__(self):
+        """Input, cache read and cache write tokens of the judge calls of a run, per judge"""
+        self.lock = threading.Lock()
+        self.judges = {}
+
+    def record(self, judge: str, response: Dict[str, Any]) -> None:
+        """Add the usage of one converse() response"""
+        usage = response.get('usage', {})
+        with self.lock:
+            stats = self.judges.setdefault(judge, {
+                'calls': 0, 'input_tokens': 0, 'cache_read_tokens': 0, 'cache_write_tokens': 0
+            })
+            stats['calls'] += 1
+            stats['input_tokens'] += usage.get('inputTokens', 0)
+            stats['cache_read_tokens'] += usage.get('cacheReadInputTokens', 0)
+            stats['cache_write_tokens'] += usage.get('cacheWriteInputTokens', 0)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Token counters per judge, with the share of prompt tokens read from the cache"""
+        with self.lock:
+            metrics = {}
+            for judge, stats in self.judges.items():
+                prompt_tokens = stats['input_tokens'] + stats['cache_read_tokens'] + stats['cache_write_tokens']
+                metrics[judge] = {
+                    **stats,
+                    'cache_read_rate': round(stats['cache_read_tokens'] / prompt_tokens, 3) if prompt_tokens else 0
+                }
+            return metrics
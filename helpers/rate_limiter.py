@@ -0,0 +1,171 @@
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used to pre-charge token budgets"""
+    return max(1, len(text or "") // 4)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """
+        Token bucket refilled continuously at per_minute / 60 units per second
+
+        Args:
+            per_minute (float): Budget per minute, also used as the bucket capacity
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add the budget accrued since the last refill"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the capacity wait for a full bucket)"""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        """
+        Take from the bucket, the level may go negative to settle under-estimated usage
+
+        A negative amount refunds over-estimated usage, never above the capacity, so a
+        refunded bucket cannot let a burst through beyond the per-minute budget.
+        """
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """
+        Requests-per-minute and tokens-per-minute budget for one Bedrock API, shared by all threads
+
+        Args:
+            name (str): Name of the API the budget applies to
+            requests_per_minute (float): Request budget, 0 disables the limit
+            tokens_per_minute (float): Token budget, 0 disables the limit
+        """
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.lock = threading.Lock()
+
+        # Observed tokens per request, used when the caller cannot estimate up front
+        self.average_tokens = 0.0
+        self.requests = 0
+        self.tokens = 0
+        self.waited = 0.0
+
+    def acquire(self, tokens: Optional[int] = None, requests: int = 1) -> float:
+        """
+        Block until the budget allows the call, then charge it
+
+        Args:
+            tokens (Optional[int]): Estimated tokens of the call, None uses the observed average
+            requests (int): Number of requests the call makes
+
+        Returns:
+            Seconds spent waiting
+        """
+        if tokens is None:
+            tokens = int(self.average_tokens)
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = 0.0
+                for bucket, amount in ((self.request_bucket, requests), (self.token_bucket, tokens)):
+                    if bucket:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+
+                if wait == 0.0:
+                    if self.request_bucket:
+                        self.request_bucket.take(requests)
+                    if self.token_bucket:
+                        self.token_bucket.take(tokens)
+                    self.requests += requests
+                    self.tokens += tokens
+                    self.waited += waited
+                    return waited
+
+            time.sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Settle the difference between the pre-charged estimate and the tokens the call really used"""
+        with self.lock:
+            if self.token_bucket:
+                self.token_bucket.refill(time.monotonic())
+                self.token_bucket.take(actual_tokens - estimated_tokens)
+            self.tokens += actual_tokens - estimated_tokens
+
+            # Exponential moving average of tokens per request
+            weight = 0.2 if self.average_tokens else 1.0
+            self.average_tokens += weight * (actual_tokens - self.average_tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Usage counters for reporting"""
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'tokens': self.tokens,
+                'seconds_waited': round(self.waited, 2)
+            }
+
+
+class LangchainRateLimiter(BaseRateLimiter):
+    def __init__(self, rate_limiter: RateLimiter):
+        """Expose a RateLimiter to LangChain chat models through their rate_limiter hook (request budget only)"""
+        self.rate_limiter = rate_limiter
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        self.rate_limiter.acquire(tokens=0)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        self.rate_limiter.acquire(tokens=0)
+        return True
+
+
+class RateLimitedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, rate_limiter: RateLimiter):
+        """Wrap an Embeddings model so each embedded text is charged to the embeddings budget"""
+        self.embeddings = embeddings
+        self.rate_limiter = rate_limiter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Bedrock embeds one text per request
+        self.rate_limiter.acquire(tokens=sum(estimate_tokens(text) for text in texts), requests=len(texts))
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.rate_limiter.acquire(tokens=estimate_tokens(text))
+        return self.embeddings.embed_query(text)
+
+
+def create_rate_limiters(budgets: Dict[str, Dict[str, float]]) -> Dict[str, RateLimiter]:
+    """
+    Create the shared rate limiters, one per Bedrock API
+
+    Args:
+        budgets (Dict[str, Dict[str, float]]): API name -> {'rpm': ..., 'tpm': ...}
+
+    Returns:
+        Dict of API name -> RateLimiter
+    """
+    return {
+        api: RateLimiter(api, requests_per_minute=budget.get('rpm', 0), tokens_per_minute=budget.get('tpm', 0))
+        for api, budget in budgets.items()
+    }
@@ -0,0 +1,121 @@
+import base64
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+
+def _encode(value: Any) -> Any:
+    """Tag the non-JSON values of agent stream events so they are restored exactly on replay"""
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    return str(value)
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+class AgentResponseRecording:
+    def __init__(self, path: str, key_fields: Dict[str, Any]):
+        """
+        Recording of one invocation, written to disk event by event as the stream is consumed
+
+        The file is JSON lines: the key fields, one line per stream event, then the response
+        metadata and processed response. It is written under a temporary name and only renamed
+        to path by finish(), so readers never see a partial recording.
+
+        Args:
+            path (str): Final path of the recording
+            key_fields (Dict[str, Any]): Fields of the key, kept for inspection
+        """
+        self.path = path
+        self.tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        self._write({**key_fields, 'recorded_at': datetime.now()})
+
+    def _write(self, value: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(value, default=_encode, ensure_ascii=False) + '\n')
+
+    def append(self, event: Dict[str, Any]) -> None:
+        """Write one event of the completion stream"""
+        self._write({'event': event})
+
+    def finish(self, response_metadata: Dict[str, Any], processed_response: Dict[str, Any]) -> None:
+        """
+        Complete the recording, replacing any earlier recording of the same key
+
+        Args:
+            response_metadata (Dict[str, Any]): ResponseMetadata of the invoke_agent response
+            processed_response (Dict[str, Any]): Processed response the evaluator produced
+        """
+        self._write({'response_metadata': response_metadata, 'processed_response': processed_response})
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Drop an incomplete recording, e.g. of a failed attempt"""
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class AgentResponseStore:
+    def __init__(self, directory: str):
+        """
+        Persistent store of agent invocations (raw stream events and processed response)
+
+        Entries are keyed by agent id, alias, version, trajectory, position in the trajectory and
+        question, so a stored stream can be replayed through the evaluators' parsing and judging
+        without invoking the agent.
+
+        Args:
+            directory (str): Directory holding one JSON lines file per stored invocation
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(agent_id: str, agent_alias_id: str, agent_version: str, trajectory_id: str, position: int,
+                 question: str) -> str:
+        content = json.dumps([agent_id, agent_alias_id, agent_version, trajectory_id, position, question], ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jsonl")
+
+    def record(self, key: str, key_fields: Dict[str, Any]) -> AgentResponseRecording:
+        """
+        Start recording one invocation
+
+        Args:
+            key (str): Key from make_key()
+            key_fields (Dict[str, Any]): Fields of the key, kept for inspection
+
+        Returns:
+            Recording to append the stream events to, then finish
+        """
+        return AgentResponseRecording(self._path(key), key_fields)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored invocation of a key, or None when it was never recorded
+
+        Returns:
+            Dict with the key fields, recorded_at, events (the completion stream, in order),
+            response_metadata and processed_response
+        """
+        if not os.path.exists(self._path(key)):
+            return None
+        with open(self._path(key), 'r', encoding='utf-8') as f:
+            lines = [json.loads(line, object_hook=_decode) for line in f if line.strip()]
+        return {**lines[0], 'events': [line['event'] for line in lines[1:-1]], **lines[-1]}
@@ -0,0 +1,231 @@
+import random
+import socket
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+from botocore.exceptions import (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError
+)
+
+# Error classes returned by classify_error
+THROTTLING = 'throttling'
+TIMEOUT = 'timeout'
+SERVER = 'server'
+VALIDATION = 'validation'
+OTHER = 'other'
+
+RETRYABLE_ERRORS = {THROTTLING, TIMEOUT, SERVER}
+
+# Bedrock error codes (compared lower-cased, agent runtime stream errors use camelCase codes)
+THROTTLING_CODES = {'throttlingexception', 'toomanyrequestsexception', 'servicequotaexceededexception'}
+TIMEOUT_CODES = {'modeltimeoutexception', 'requesttimeout', 'requesttimeoutexception'}
+SERVER_CODES = {
+    'internalserverexception', 'internalservererror', 'serviceunavailableexception',
+    'serviceunavailable', 'modelnotreadyexception', 'dependencyfailedexception',
+    'badgatewayexception', 'modelstreamerrorexception'
+}
+VALIDATION_CODES = {
+    'validationexception', 'accessdeniedexception', 'resourcenotfoundexception',
+    'conflictexception', 'modelerrorexception'
+}
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify an outbound call error to decide whether it is worth retrying
+
+    Args:
+        error (BaseException): Exception raised by the call
+
+    Returns:
+        One of 'throttling', 'timeout', 'server', 'validation' or 'other'
+    """
+    if isinstance(error, (ReadTimeoutError, ConnectTimeoutError, socket.timeout, TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, (EndpointConnectionError, ConnectionClosedError, ConnectionError)):
+        return SERVER
+
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = str(response.get('Error', {}).get('Code', '')).lower()
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        if code in THROTTLING_CODES or status == 429:
+            return THROTTLING
+        if code in TIMEOUT_CODES or status == 408:
+            return TIMEOUT
+        if code in SERVER_CODES or status >= 500:
+            return SERVER
+        if code in VALIDATION_CODES or 400 <= status < 500:
+            return VALIDATION
+    return OTHER
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open"""
+    pass
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 2.0, max_delay: float = 60.0,
+                 deadline: float = 600.0, throttling_multiplier: float = 4.0):
+        """
+        Jittered exponential backoff for retryable errors, bounded by an overall deadline
+
+        Args:
+            max_attempts (int): Total attempts including the first call
+            base_delay (float): Backoff ceiling of the first retry in seconds
+            max_delay (float): Highest backoff ceiling in seconds
+            deadline (float): Seconds after the first attempt past which no retry is started
+            throttling_multiplier (float): Scales the backoff for throttling errors
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.throttling_multiplier = throttling_multiplier
+
+    def backoff(self, attempt: int, error_class: str) -> float:
+        """Full-jitter delay before retry number `attempt` (1 for the first retry)"""
+        base = self.base_delay * (self.throttling_multiplier if error_class == THROTTLING else 1.0)
+        return random.uniform(0, min(self.max_delay, base * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """
+        Stop calling an endpoint after consecutive retryable failures until it has had time to recover
+
+        Args:
+            endpoint (str): Name of the endpoint the breaker protects
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before a trial call is allowed
+        """
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError when the endpoint should not be called right now"""
+        with self.lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit open for {self.endpoint}, skipping call")
+                self.state = 'half_open'
+                self.trial_in_flight = False
+
+            if self.state == 'half_open':
+                # Only one trial call probes a recovering endpoint
+                if self.trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit half-open for {self.endpoint}, trial call in progress")
+                self.trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self, error_class: str) -> None:
+        with self.lock:
+            self.trial_in_flight = False
+            # Client-side errors say nothing about the health of the endpoint
+            if error_class not in RETRYABLE_ERRORS:
+                if self.state == 'half_open':
+                    self.state = 'closed'
+                return
+
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    print(f"Circuit opened for {self.endpoint} after {self.failures} consecutive failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected
+            }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """Shared per-endpoint circuit breakers, created on first use"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+            return self.breakers[endpoint]
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {endpoint: breaker.metrics() for endpoint, breaker in breakers.items()}
+
+
+def call_with_retry(call: Callable[[], Any], endpoint: str, policy: Optional[RetryPolicy] = None,
+                    breaker: Optional[CircuitBreaker] = None) -> Any:
+    """
+    Run an outbound call, retrying retryable errors with jittered exponential backoff
+
+    Args:
+        call (Callable[[], Any]): Function making the call, run once per attempt
+        endpoint (str): Endpoint name used in logs
+        policy (Optional[RetryPolicy]): Backoff policy, defaults to RetryPolicy()
+        breaker (Optional[CircuitBreaker]): Circuit breaker of the endpoint
+
+    Returns:
+        Result of the first successful attempt
+    """
+    policy = policy or RetryPolicy()
+    start_time = time.monotonic()
+    attempt = 1
+
+    while True:
+        if breaker:
+            breaker.before_call()
+        try:
+            result = call()
+        except Exception as e:
+            error_class = classify_error(e)
+            if breaker:
+                breaker.record_failure(error_class)
+
+            if error_class not in RETRYABLE_ERRORS or attempt >= policy.max_attempts:
+                raise
+
+            delay = policy.backoff(attempt, error_class)
+            if time.monotonic() - start_time + delay > policy.deadline:
+                print(f"Retry deadline reached for {endpoint}, giving up after {attempt} attempt(s)")
+                raise
+
+            print(f"{error_class.capitalize()} error on {endpoint}. Attempt {attempt} of {policy.max_attempts}. "
+                  f"Waiting {delay:.1f} seconds before retry...")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        if breaker:
+            breaker.record_success()
+        return result
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# Stages of one question, in pipeline order
+STAGES = ('agent_response', 'cot_judge', 'domain_judge', 'trace_upload')
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize values the Bedrock responses contain but json does not support"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, set):
+        return sorted(value)
+    return str(value)
+
+
+def content_hash(question: str, ground_truth: Any) -> str:
+    """Hash of the question and ground truth, so edited questions are not resumed from stale results"""
+    content = json.dumps({'question': question, 'ground_truth': ground_truth}, sort_keys=True, default=_json_default)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+class RunJournal:
+    def __init__(self, path: str, resume: bool = False):
+        """
+        Append-only, crash-safe journal of completed evaluation stages
+
+        Every record is one JSON line written and fsynced before the stage is considered done.
+        A run without resume appends a run_start marker, and resuming only considers the
+        records written after the last such marker.
+
+        Args:
+            path (str): Path of the journal file
+            resume (bool): Load previously completed stages instead of starting a new run
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.stages = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume:
+            self._load()
+
+        self.file = open(path, 'a+', encoding='utf-8')
+
+        # Terminate a partial last line left by a crash, so the next record starts on its own line
+        if self.file.tell() > 0:
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != '\n':
+                self.file.write('\n')
+
+        self._append({'type': 'run_start', 'resume': resume})
+
+    def _load(self) -> None:
+        """Rebuild the completed stages of the current run from the journal file"""
+        if not os.path.exists(self.path):
+            print(f"No run journal at {self.path}, starting from scratch")
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partial line from a crash mid-write
+                    continue
+
+                if record['type'] == 'run_start' and not record['resume']:
+                    self.sessions = {}
+                    self.stages = {}
+                elif record['type'] == 'session':
+                    self.sessions[record['trajectory_id']] = record['session_id']
+                elif record['type'] == 'stage':
+                    key = (record['trajectory_id'], str(record['question_id']), record['content_hash'])
+                    self.stages.setdefault(key, {})[record['stage']] = record.get('payload')
+
+        finished = sum(1 for stages in self.stages.values() if 'trace_upload' in stages)
+        print(f"Resuming from {self.path}: {finished} question(s) already evaluated")
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        record['timestamp'] = datetime.now().isoformat()
+        line = json.dumps(record, default=_json_default, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def record_session(self, trajectory_id: str, session_id: str) -> None:
+        """Record the agent session of a trajectory so resumed questions continue the same conversation"""
+        self._append({'type': 'session', 'trajectory_id': trajectory_id, 'session_id': session_id})
+        with self.lock:
+            self.sessions[trajectory_id] = session_id
+
+    def get_session(self, trajectory_id: str) -> Optional[str]:
+        with self.lock:
+            return self.sessions.get(trajectory_id)
+
+    def record_stage(self, trajectory_id: str, question_id: Any, question_hash: str,
+                     stage: str, payload: Any = None) -> None:
+        """
+        Record the completion of one stage of a question
+
+        Args:
+            trajectory_id (str): Trajectory of the question
+            question_id (Any): Identifier of the question
+            question_hash (str): content_hash() of the question and ground truth
+            stage (str): One of STAGES
+            payload (Any): Stage output needed to run the later stages on resume
+        """
+        self._append({
+            'type': 'stage',
+            'trajectory_id': trajectory_id,
+            'question_id': question_id,
+            'content_hash': question_hash,
+            'stage': stage,
+            'payload': payload
+        })
+        # Keep the in-memory view in its serialized form, as a resumed run would see it
+        payload = json.loads(json.dumps(payload, default=_json_default))
+        with self.lock:
+            self.stages.setdefault((trajectory_id, str(question_id), question_hash), {})[stage] = payload
+
+    def completed_stages(self, trajectory_id: str, question_id: Any, question_hash: str) -> Dict[str, Any]:
+        """Completed stages of a question mapped to their payloads"""
+        with self.lock:
+            return dict(self.stages.get((trajectory_id, str(question_id), question_hash), {}))
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
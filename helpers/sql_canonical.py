@@ -0,0 +1,584 @@
+import re
+import threading
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+from helpers.sql_equivalence import EQUIVALENT, DIFFERENT, UNKNOWN, prepare_query
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><>|!=|>=|<=|\|\||::|=>|->|[-+*/%=<>])
+  | (?P<punct>[(),.;\[\]])
+""", re.VERBOSE | re.DOTALL)
+
+# Unquoted words that are never identifiers (date units included, so they are not taken for aliases)
+KEYWORDS = {
+    'all', 'and', 'any', 'array', 'as', 'asc', 'at', 'between', 'by', 'case', 'cast', 'cross', 'cube', 'current_date',
+    'current_timestamp', 'date', 'day', 'desc', 'distinct', 'else', 'end', 'escape', 'except', 'exists', 'false',
+    'fetch', 'filter', 'first', 'for', 'from', 'full', 'group', 'grouping', 'having', 'hour', 'ilike', 'in', 'inner',
+    'intersect', 'interval', 'is', 'join', 'last', 'lateral', 'left', 'like', 'limit', 'minute', 'month', 'natural',
+    'not', 'null', 'nulls', 'offset', 'on', 'or', 'order', 'outer', 'over', 'partition', 'quarter', 'range',
+    'recursive', 'right', 'rollup', 'rows', 'second', 'select', 'sets', 'similar', 'then', 'time', 'timestamp',
+    'true', 'try_cast', 'union', 'unnest', 'using', 'values', 'week', 'when', 'where', 'window', 'with', 'within',
+    'year', 'zone'
+}
+
+# Keywords starting a clause of a SELECT statement
+CLAUSE_KEYWORDS = {
+    'select', 'from', 'where', 'group', 'having', 'order', 'limit', 'offset', 'fetch', 'on', 'using', 'join', 'left',
+    'right', 'full', 'cross', 'natural', 'union', 'intersect', 'except', 'with', 'window', 'values'
+}
+
+# Keywords after which a table reference follows inside a FROM clause
+TABLE_REF_KEYWORDS = {'from', 'join'}
+
+# Keywords that end the FROM clause
+FROM_END_KEYWORDS = CLAUSE_KEYWORDS - {'from', 'join', 'left', 'right', 'full', 'cross', 'natural'}
+
+# Keywords that make the AND / OR of an expression unsafe to reorder by plain splitting
+NON_REORDERABLE_KEYWORDS = {'case', 'when', 'then', 'else', 'end', 'select', 'over', 'filter', 'within'}
+
+FLIPPED_OPERATORS = {'<': '>', '>': '<', '<=': '>=', '>=': '<='}
+
+
+class _Unsupported(Exception):
+    """Raised when a query uses syntax the canonicalizer does not model"""
+    pass
+
+
+def _distinct_operator(raw: List[Tuple[str, Any]], i: int) -> Optional[str]:
+    """'is distinct from' or 'is not distinct from' when the raw tokens at i spell it, else None"""
+    for operator in ('is distinct from', 'is not distinct from'):
+        words = operator.split()
+        if raw[i:i + len(words)] == [('word', word) for word in words]:
+            return operator
+    return None
+
+
+def _tokenize(query: str) -> List[Tuple[str, Any]]:
+    """
+    Tokens of a query as (kind, value), dotted identifiers merged into one name token
+
+    IS [NOT] DISTINCT FROM is merged into one operator token, so its FROM is never taken
+    for the start of a FROM clause.
+    """
+    raw = []
+    position = 0
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match is None:
+            raise _Unsupported(f"unexpected character {query[position]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ('space', 'comment'):
+            continue
+        if kind == 'quoted':
+            raw.append(('ident', text[1:-1].replace('""', '"').lower()))
+        elif kind == 'word':
+            raw.append(('word', text.lower()))
+        else:
+            raw.append((kind, text))
+
+    tokens = []
+    i = 0
+    while i < len(raw):
+        kind, value = raw[i]
+        operator = _distinct_operator(raw, i)
+        if operator:
+            tokens.append(('op', operator))
+            i += len(operator.split())
+            continue
+        if kind in ('word', 'ident'):
+            parts = [value]
+            while (i + 2 < len(raw) and raw[i + 1] == ('punct', '.')
+                   and (raw[i + 2][0] in ('word', 'ident') or raw[i + 2] == ('op', '*'))):
+                parts.append(raw[i + 2][1])
+                i += 2
+            if len(parts) == 1 and kind == 'word' and value in KEYWORDS:
+                tokens.append(('kw', value))
+            else:
+                tokens.append(('name', tuple(parts)))
+        elif (kind, value) == ('punct', ';'):
+            raise _Unsupported("more than one statement")
+        else:
+            tokens.append((kind, value))
+        i += 1
+    return tokens
+
+
+def _nest(tokens: List[Tuple[str, Any]]) -> List[Any]:
+    """Nodes of a token list, every parenthesized part as a ('group', nodes) node"""
+    stack = [[]]
+    for token in tokens:
+        if token == ('punct', '('):
+            stack.append([])
+        elif token == ('punct', ')'):
+            if len(stack) == 1:
+                raise _Unsupported("unbalanced parentheses")
+            group = stack.pop()
+            stack[-1].append(('group', group))
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise _Unsupported("unbalanced parentheses")
+    return stack[0]
+
+
+def _is_kw(node: Any, *keywords: str) -> bool:
+    return node[0] == 'kw' and node[1] in keywords
+
+
+def _is_alias(node: Any) -> bool:
+    return node[0] == 'name' and len(node[1]) == 1
+
+
+def _scan_level(nodes: List[Any]) -> Tuple[List[Tuple[int, Optional[int], int]], List[int]]:
+    """
+    Table references and CTE definitions of one nesting level
+
+    Returns:
+        Tuple of (references as (node index, alias index or None, index after the reference),
+        node indexes of CTE names)
+    """
+    refs = []
+    cte_names = []
+    i = 0
+
+    if nodes and _is_kw(nodes[0], 'with'):
+        i = 1
+        if i < len(nodes) and _is_kw(nodes[i], 'recursive'):
+            i += 1
+        while i < len(nodes) and _is_alias(nodes[i]):
+            j = i + 1
+            if j < len(nodes) and nodes[j][0] == 'group':
+                raise _Unsupported("CTE column lists")
+            if not (j + 1 < len(nodes) and _is_kw(nodes[j], 'as') and nodes[j + 1][0] == 'group'):
+                raise _Unsupported("malformed CTE")
+            cte_names.append(i)
+            i = j + 2
+            if i < len(nodes) and nodes[i] == ('punct', ','):
+                i += 1
+            else:
+                break
+
+    seen_select = False
+    in_from = False
+    expect_table = False
+    while i < len(nodes):
+        node = nodes[i]
+        if _is_kw(node, 'select'):
+            seen_select = True
+            in_from = False
+        elif seen_select and node[0] == 'kw' and node[1] in TABLE_REF_KEYWORDS:
+            in_from = True
+            expect_table = True
+        elif in_from and node == ('punct', ','):
+            expect_table = True
+        elif node[0] == 'kw' and node[1] in FROM_END_KEYWORDS:
+            in_from = False
+            expect_table = False
+        elif expect_table:
+            expect_table = False
+            if node[0] not in ('name', 'group'):
+                raise _Unsupported(f"table reference {node[1]}")
+            if node[0] == 'name' and i + 1 < len(nodes) and nodes[i + 1][0] == 'group':
+                raise _Unsupported("table functions")
+
+            j = i + 1
+            has_as = j < len(nodes) and _is_kw(nodes[j], 'as')
+            if has_as:
+                j += 1
+            alias = None
+            if j < len(nodes) and _is_alias(nodes[j]):
+                alias = j
+                j += 1
+                if j < len(nodes) and nodes[j][0] == 'group':
+                    raise _Unsupported("alias column lists")
+            elif has_as:
+                raise _Unsupported("malformed alias")
+            refs.append((i, alias, j))
+            i = j
+            continue
+        i += 1
+    return refs, cte_names
+
+
+class _Scope:
+    def __init__(self):
+        """Canonical names of the tables, aliases and CTEs of a whole query"""
+        self.ctes = {}
+        self.tables = set()
+        self.qualifiers = {}
+        self.ref_names = {}
+        self.ref_count = 0
+        self.aliased = {}
+
+    def _map(self, key: Tuple[str, ...], canonical: str) -> None:
+        # A qualifier resolving to two different tables is ambiguous
+        if self.qualifiers.get(key, canonical) != canonical:
+            self.qualifiers[key] = None
+        else:
+            self.qualifiers[key] = canonical
+
+    def collect_ctes(self, nodes: List[Any]) -> None:
+        _, cte_names = _scan_level(nodes)
+        for index in cte_names:
+            name = nodes[index][1][0]
+            if name in self.ctes:
+                raise _Unsupported("CTE defined twice")
+            self.ctes[name] = f"cte{len(self.ctes) + 1}"
+        for node in nodes:
+            if node[0] == 'group':
+                self.collect_ctes(node[1])
+
+    def count_aliases(self, nodes: List[Any]) -> None:
+        refs, _ = _scan_level(nodes)
+        for index, alias, _ in refs:
+            if alias is not None and nodes[index][0] == 'name':
+                table = '.'.join(nodes[index][1])
+                self.aliased[table] = self.aliased.get(table, 0) + 1
+        for node in nodes:
+            if node[0] == 'group':
+                self.count_aliases(node[1])
+
+    def collect_refs(self, nodes: List[Any], seen: Dict[str, int]) -> None:
+        refs, _ = _scan_level(nodes)
+        for index, alias, _ in refs:
+            self.ref_count += 1
+            node = nodes[index]
+            if node[0] == 'group':
+                canonical = f"sub{self.ref_count}"
+            elif len(node[1]) == 1 and node[1][0] in self.ctes:
+                canonical = self.ctes[node[1][0]]
+                self._map(node[1], canonical)
+            else:
+                table = '.'.join(node[1])
+                self.tables.add(node[1][-1])
+                canonical = table
+                if alias is not None and self.aliased.get(table, 0) > 1:
+                    # Self joins keep one name per occurrence, numbered in order of appearance
+                    seen[table] = seen.get(table, 0) + 1
+                    canonical = f"{table}#{seen[table]}"
+                else:
+                    self._map(node[1], canonical)
+                    self._map(node[1][-1:], canonical)
+            if alias is not None:
+                self._map(nodes[alias][1], canonical)
+            self.ref_names[id(node)] = canonical
+        for node in nodes:
+            if node[0] == 'group':
+                self.collect_refs(node[1], seen)
+
+
+def _quote(name: str) -> str:
+    return '*' if name == '*' else f'"{name}"'
+
+
+def _split(atoms: List[Tuple[str, str]], keyword: str) -> List[List[Tuple[str, str]]]:
+    """Split atoms at a top-level AND / OR, keeping the AND of BETWEEN x AND y"""
+    parts = [[]]
+    pending_between = 0
+    for atom in atoms:
+        if atom == ('kw', 'between'):
+            pending_between += 1
+        if atom == ('kw', keyword):
+            if keyword == 'and' and pending_between:
+                pending_between -= 1
+            else:
+                parts.append([])
+                continue
+        parts[-1].append(atom)
+    return parts
+
+
+def _text(atoms: List[Tuple[str, str]]) -> str:
+    return ' '.join(text for _, text in atoms)
+
+
+def _comparison(atoms: List[Tuple[str, str]]) -> str:
+    """Comparison with its operands in a fixed order, so a = 1 and 1 = a read the same"""
+    if len(atoms) == 3 and atoms[1][0] == 'op':
+        left, (_, operator), right = atoms
+        if operator in ('=', '<>') and left[1] > right[1]:
+            left, right = right, left
+        elif operator in FLIPPED_OPERATORS and left[1] > right[1]:
+            left, operator, right = right, FLIPPED_OPERATORS[operator], left
+        return f"{left[1]} {operator} {right[1]}"
+    return _text(atoms)
+
+
+def _predicate(atoms: List[Tuple[str, str]]) -> str:
+    """Boolean expression with its AND and OR operands sorted, when they can be split safely"""
+    if any(atom == ('punct', ',') or (atom[0] == 'kw' and atom[1] in NON_REORDERABLE_KEYWORDS) for atom in atoms):
+        return _text(atoms)
+    disjuncts = []
+    for disjunct in _split(atoms, 'or'):
+        if not disjunct:
+            raise _Unsupported("empty predicate")
+        disjuncts.append(' and '.join(sorted(_comparison(conjunct) for conjunct in _split(disjunct, 'and'))))
+    return ' or '.join(sorted(disjuncts))
+
+
+def _clauses(atoms: List[Tuple[str, str]]) -> List[Tuple[Optional[str], List[Tuple[str, str]]]]:
+    """Atoms of a level split into (clause keyword, body) parts"""
+    clauses = [(None, [])]
+    i = 0
+    while i < len(atoms):
+        kind, text = atoms[i]
+        if kind == 'kw' and text in CLAUSE_KEYWORDS:
+            keyword = [text]
+            i += 1
+            # Multi-word clause keywords (group by, left join, union all...)
+            while i < len(atoms) and atoms[i][0] == 'kw' and (
+                    atoms[i][1] in ('by', 'join', 'all', 'distinct') or (keyword[0] == 'natural' and atoms[i][1] in CLAUSE_KEYWORDS)):
+                if atoms[i][1] == 'distinct' and keyword[0] not in ('union', 'intersect', 'except', 'select'):
+                    break
+                keyword.append(atoms[i][1])
+                i += 1
+            clauses.append((' '.join(keyword), []))
+            continue
+        clauses[-1][1].append(atoms[i])
+        i += 1
+    return clauses
+
+
+def _render_level(nodes: List[Any], scope: _Scope) -> str:
+    """Canonical text of one nesting level"""
+    refs, cte_names = _scan_level(nodes)
+    ref_at = {index: (alias, end) for index, alias, end in refs}
+    single_table = scope.ref_count == 1 and not scope.ctes
+
+    atoms = []
+    i = 0
+    while i < len(nodes):
+        kind, value = nodes[i]
+        if i in ref_at:
+            alias, end = ref_at[i]
+            canonical = scope.ref_names[id(nodes[i])]
+            if kind == 'group':
+                atoms.append(('group', f"({_render_level(value, scope)})"))
+                atoms.append(('alias', _quote(canonical)))
+            else:
+                atoms.append(('name', _quote(canonical.split('#')[0])))
+                if '#' in canonical:
+                    atoms.append(('alias', _quote(canonical)))
+            i = end
+            continue
+
+        if i in cte_names:
+            atoms.append(('name', _quote(scope.ctes[value[0]])))
+        elif kind == 'kw':
+            following = nodes[i + 1] if i + 1 < len(nodes) else None
+            # INNER JOIN is JOIN, LEFT OUTER JOIN is LEFT JOIN
+            if not ((value == 'inner' and following is not None and _is_kw(following, 'join')) or value == 'outer'):
+                atoms.append(('kw', value))
+        elif kind == 'name':
+            following = nodes[i + 1] if i + 1 < len(nodes) else None
+            if value == ('count',) and following is not None and following[0] == 'group' \
+                    and len(following[1]) == 1 and following[1][0][0] == 'number':
+                # COUNT(1) counts rows like COUNT(*)
+                atoms.append(('name', '"count"'))
+                atoms.append(('group', '(*)'))
+                i += 2
+                continue
+            if len(value) > 1:
+                qualifier = scope.qualifiers.get(value[:-1])
+                if value[:-1] in scope.qualifiers and qualifier is None:
+                    raise _Unsupported(f"ambiguous qualifier {'.'.join(value[:-1])}")
+                if qualifier is not None:
+                    rendered = _quote(value[-1]) if single_table else f"{_quote(qualifier)}.{_quote(value[-1])}"
+                    atoms.append(('name', rendered))
+                    i += 1
+                    continue
+            atoms.append(('ident' if len(value) == 1 else 'name', '.'.join(_quote(part) for part in value)))
+        elif kind == 'group':
+            atoms.append(('group', f"({_render_level(value, scope)})"))
+        elif kind == 'op':
+            atoms.append(('op', '<>' if value == '!=' else value))
+        else:
+            atoms.append((kind, value))
+        i += 1
+
+    rendered = []
+    select_items = []
+    select_aliases = {}
+    for keyword, body in _clauses(atoms):
+        if keyword is None:
+            text = _predicate(body) if body else ''
+        elif keyword.startswith('select'):
+            text, select_items, select_aliases = _select_list(body)
+        elif keyword in ('where', 'having', 'on'):
+            text = _predicate(body)
+        elif keyword == 'group by':
+            text = _group_by(body, select_items)
+        elif keyword == 'order by':
+            text = _order_by(body, select_items, select_aliases)
+        else:
+            text = _text(body)
+        rendered.append(f"{keyword} {text}".strip() if keyword else text)
+    return ' '.join(part for part in rendered if part)
+
+
+def _items(body: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    items = [[]]
+    for atom in body:
+        if atom == ('punct', ','):
+            items.append([])
+        else:
+            items[-1].append(atom)
+    return items
+
+
+def _select_list(body: List[Tuple[str, str]]) -> Tuple[str, List[str], Dict[str, int]]:
+    """Select list without its output aliases, which do not change the result rows"""
+    items = []
+    aliases = {}
+    for position, item in enumerate(_items(body), start=1):
+        if len(item) >= 3 and item[-2] == ('kw', 'as') and item[-1][0] == 'ident':
+            aliases[item[-1][1]] = position
+            item = item[:-2]
+        elif len(item) >= 2 and item[-1][0] == 'ident' and (
+                item[-2][0] in ('ident', 'name', 'group', 'number', 'string') or item[-2] == ('kw', 'end')):
+            aliases[item[-1][1]] = position
+            item = item[:-1]
+        items.append(_text(item))
+    return ', '.join(items), items, aliases
+
+
+def _group_by(body: List[Tuple[str, str]], select_items: List[str]) -> str:
+    """Grouping keys in a fixed order, ordinals replaced by the select item they point to"""
+    if any(atom[0] == 'kw' and atom[1] in ('rollup', 'cube', 'grouping', 'sets') for atom in body):
+        return _text(body)
+    keys = []
+    for item in _items(body):
+        if len(item) == 1 and item[0][0] == 'number' and item[0][1].isdigit() and 0 < int(item[0][1]) <= len(select_items):
+            keys.append(select_items[int(item[0][1]) - 1])
+        else:
+            keys.append(_text(item))
+    return ', '.join(sorted(keys))
+
+
+def _order_by(body: List[Tuple[str, str]], select_items: List[str], select_aliases: Dict[str, int]) -> str:
+    """Sort keys pointing to a select item (by ordinal, alias or expression) written as #position"""
+    keys = []
+    for item in _items(body):
+        split = len(item)
+        while split > 0 and item[split - 1][0] == 'kw' and item[split - 1][1] in ('asc', 'desc', 'nulls', 'first', 'last'):
+            split -= 1
+        expression, modifiers = item[:split], [text for _, text in item[split:]]
+        text = _text(expression)
+        if len(expression) == 1 and expression[0][0] == 'number' and text.isdigit() and 0 < int(text) <= len(select_items):
+            text = f"#{text}"
+        elif len(expression) == 1 and expression[0][0] == 'ident' and text in select_aliases:
+            text = f"#{select_aliases[text]}"
+        elif text in select_items:
+            text = f"#{select_items.index(text) + 1}"
+        if not modifiers or modifiers[0] not in ('asc', 'desc'):
+            modifiers.insert(0, 'asc')
+        keys.append(' '.join([text] + modifiers))
+    return ', '.join(keys)
+
+
+def canonicalize_sql(query: str) -> Tuple[str, FrozenSet[str]]:
+    """
+    Canonical text and base tables of a SELECT query
+
+    Whitespace, comments, keyword and identifier case, table and output column aliases,
+    the order of AND / OR operands and of GROUP BY keys, operand order of comparisons,
+    != and COUNT(1) are normalized, so queries differing only in these read the same.
+
+    Args:
+        query (str): SQL query
+
+    Returns:
+        Tuple of (canonical text, names of the base tables read)
+
+    Raises:
+        ValueError: The query uses syntax the canonicalizer does not model
+    """
+    try:
+        nodes = _nest(_tokenize(prepare_query(query)))
+        if not nodes:
+            raise _Unsupported("empty query")
+        scope = _Scope()
+        scope.collect_ctes(nodes)
+        scope.count_aliases(nodes)
+        scope.collect_refs(nodes, {})
+        return _render_level(nodes, scope), frozenset(scope.tables)
+    except _Unsupported as e:
+        raise ValueError(f"Cannot canonicalize query: {str(e)}")
+
+
+class SqlFastPath:
+    def __init__(self):
+        """
+        Decides Text2SQL equivalence from the query text alone when the answer is certain
+
+        Queries with the same canonical form are equivalent. Queries reading different
+        base tables are treated as different, since they cannot answer the same question
+        from the same data. Everything else is left to execution or the LLM judge.
+        """
+        self.lock = threading.Lock()
+        self.comparisons = 0
+        self.equivalent = 0
+        self.different = 0
+        self.undecided = 0
+
+    def compare(self, generated_query: str, ground_truth_query: str) -> Tuple[str, str]:
+        """
+        Text-based equivalence of a generated query and the ground truth query
+
+        Args:
+            generated_query (str): Query written by the agent
+            ground_truth_query (str): Reference query
+
+        Returns:
+            Tuple of (verdict, explanation), verdict one of 'equivalent', 'different' or 'unknown'
+        """
+        try:
+            if not generated_query or not generated_query.strip():
+                raise ValueError("No generated query")
+            generated, generated_tables = canonicalize_sql(generated_query)
+            expected, expected_tables = canonicalize_sql(ground_truth_query)
+        except ValueError as e:
+            verdict, explanation = UNKNOWN, str(e)
+        else:
+            if generated == expected:
+                verdict, explanation = EQUIVALENT, "Queries are identical after SQL normalization"
+            elif generated_tables != expected_tables:
+                verdict, explanation = DIFFERENT, (f"Queries read different tables: ground truth reads "
+                                                   f"{', '.join(sorted(expected_tables)) or 'none'}, generated query reads "
+                                                   f"{', '.join(sorted(generated_tables)) or 'none'}")
+            else:
+                verdict, explanation = UNKNOWN, "Queries differ after SQL normalization"
+
+        with self.lock:
+            self.comparisons += 1
+            if verdict == EQUIVALENT:
+                self.equivalent += 1
+            elif verdict == DIFFERENT:
+                self.different += 1
+            else:
+                self.undecided += 1
+        return verdict, explanation
+
+    def metrics(self) -> Dict[str, Any]:
+        """Fast path counters for reporting"""
+        with self.lock:
+            decided = self.equivalent + self.different
+            return {
+                'comparisons': self.comparisons,
+                'equivalent': self.equivalent,
+                'different': self.different,
+                'undecided': self.undecided,
+                'hit_rate': round(decided / self.comparisons, 3) if self.comparisons else 0
+            }
+
+
+def create_sql_fast_path(enabled: bool) -> Optional[SqlFastPath]:
+    """Shared SQL fast path, or None when disabled"""
+    return SqlFastPath() if enabled else None
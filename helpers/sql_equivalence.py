@@ -0,0 +1,262 @@
+import glob
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+
+# Verdicts of SqlExecutor.compare
+EQUIVALENT = 'equivalent'
+DIFFERENT = 'different'
+UNKNOWN = 'unknown'
+
+
+class SqlExecutionError(Exception):
+    """Raised when a query cannot be run against the local snapshot"""
+    pass
+
+
+def normalize_value(value: Any) -> Any:
+    """Normalize a result value so equal data compares equal across engines and column types"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+        return round(value, 6)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _row_counter(rows: List[Tuple[Any, ...]]) -> Counter:
+    """Multiset of the normalized rows of a result set"""
+    return Counter(tuple(normalize_value(value) for value in row) for row in rows)
+
+
+def _column_counter(rows: List[Tuple[Any, ...]]) -> Counter:
+    """Multiset of the columns of a result set, each column a multiset of normalized values"""
+    return Counter(frozenset(Counter(normalize_value(value) for value in column).items()) for column in zip(*rows))
+
+
+def _compare_reordered(expected_columns: List[str], expected: List[Tuple[Any, ...]],
+                       actual_columns: List[str], actual: List[Tuple[Any, ...]]) -> Tuple[str, str]:
+    """Verdict of two result sets holding the same columns in a different order, matching columns by name"""
+    expected_names = [name.lower() for name in expected_columns]
+    actual_names = [name.lower() for name in actual_columns]
+    if len(set(expected_names)) != len(expected_names) or sorted(expected_names) != sorted(actual_names):
+        return UNKNOWN, "Result sets hold the same columns in a different order, and the column names do not match them up"
+    order = [actual_names.index(name) for name in expected_names]
+    if _row_counter(expected) == _row_counter([tuple(row[i] for i in order) for row in actual]):
+        return EQUIVALENT, f"Both queries return the same {len(expected)} row(s) on the local snapshot, columns in a different order"
+    return DIFFERENT, "Result sets differ on the local snapshot once columns are matched by name"
+
+
+def prepare_query(query: str) -> str:
+    """Strip what the local engine does not accept around an Athena query (fences, trailing semicolons)"""
+    query = re.sub(r'^```(?:sql)?|```$', '', query.strip(), flags=re.IGNORECASE).strip()
+    return query.rstrip(';').strip()
+
+
+class SqlExecutor:
+    def __init__(self, snapshot_dir: str, build_dir: str = 'cache/sql_snapshot',
+                 timeout: float = 5.0, max_rows: int = 10000):
+        """
+        Runs Text2SQL queries against a local SQLite snapshot of the agent's databases
+
+        The snapshot directory holds one folder per database (e.g. migdal_zone_tasks), with either
+        a SQLite file or one parquet file per table, the layout data_prep.py uploads to S3.
+        Parquet tables are materialized once into a SQLite file per database in build_dir, and
+        every database is attached under its own name so database.table references resolve.
+
+        Args:
+            snapshot_dir (str): Directory of the database folders
+            build_dir (str): Directory of the SQLite files built from parquet tables
+            timeout (float): Seconds a query may run before it is aborted
+            max_rows (int): Most rows a query may return before it is considered unusable
+        """
+        self.snapshot_dir = snapshot_dir
+        self.build_dir = build_dir
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+        self.comparisons = 0
+        self.equivalent = 0
+        self.different = 0
+        self.unknown = 0
+
+        self.databases = self._build_databases()
+        print(f"Local SQL snapshot: {', '.join(sorted(self.databases)) or 'no databases'} from {snapshot_dir}")
+
+    def _build_databases(self) -> Dict[str, str]:
+        """Database name -> SQLite file, building the files of parquet-only databases"""
+        databases = {}
+        if not os.path.isdir(self.snapshot_dir):
+            print(f"SQL snapshot directory {self.snapshot_dir} not found, SQL checks fall back to the LLM judge")
+            return databases
+
+        for folder in sorted(os.listdir(self.snapshot_dir)):
+            folder_path = os.path.join(self.snapshot_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+
+            sqlite_files = glob.glob(os.path.join(folder_path, '*.db')) + glob.glob(os.path.join(folder_path, '*.sqlite'))
+            if sqlite_files:
+                databases[folder] = sqlite_files[0]
+                continue
+
+            parquet_files = sorted(glob.glob(os.path.join(folder_path, '*.parquet')))
+            if parquet_files:
+                databases[folder] = self._materialize(folder, parquet_files)
+        return databases
+
+    def _materialize(self, database: str, parquet_files: List[str]) -> str:
+        """SQLite file holding the parquet tables of a database, rebuilt when a parquet file is newer"""
+        import pandas as pd
+
+        os.makedirs(self.build_dir, exist_ok=True)
+        path = os.path.join(self.build_dir, f"{database}.sqlite")
+        newest = max(os.path.getmtime(parquet_file) for parquet_file in parquet_files)
+        if os.path.exists(path) and os.path.getmtime(path) >= newest:
+            return path
+
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            for parquet_file in parquet_files:
+                table = os.path.splitext(os.path.basename(parquet_file))[0]
+                pd.read_parquet(parquet_file).to_sql(table, connection, index=False)
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, path)
+        return path
+
+    def _connection(self) -> sqlite3.Connection:
+        """Read-only connection of the current thread with every database attached"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect('file::memory:', uri=True, check_same_thread=False)
+            for database, path in self.databases.items():
+                connection.execute("ATTACH DATABASE ? AS " + f'"{database}"', (f"file:{path}?mode=ro",))
+            self.local.connection = connection
+        return connection
+
+    def execute(self, query: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """
+        Run a query against the snapshot
+
+        Args:
+            query (str): SQL query
+
+        Returns:
+            Tuple of (column names, result rows)
+
+        Raises:
+            SqlExecutionError: The query failed, timed out or returned too many rows
+        """
+        if not self.databases:
+            raise SqlExecutionError("No local SQL snapshot loaded")
+
+        query = prepare_query(query)
+        if not re.match(r'^(select|with)\b', query, flags=re.IGNORECASE):
+            raise SqlExecutionError("Only SELECT queries are run locally")
+
+        connection = self._connection()
+        deadline = time.monotonic() + self.timeout
+        # A non-zero return aborts the running statement
+        connection.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        try:
+            cursor = connection.execute(query)
+            columns = [column[0] for column in cursor.description or []]
+            rows = cursor.fetchmany(self.max_rows + 1)
+        # sqlite3.Warning (e.g. more than one statement) is not a sqlite3.Error
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise SqlExecutionError(str(e))
+        finally:
+            connection.set_progress_handler(None, 0)
+
+        if len(rows) > self.max_rows:
+            raise SqlExecutionError(f"Query returned more than {self.max_rows} rows")
+        return columns, rows
+
+    def compare(self, generated_query: str, ground_truth_query: str) -> Tuple[str, str]:
+        """
+        Execution-based equivalence of a generated query and the ground truth query
+
+        Result sets are compared as multisets of normalized rows, ignoring row order and column names.
+        When they differ only in column order, the generated columns are matched to the ground
+        truth columns by name; if the names do not line up, the verdict is unknown rather than
+        different. Two empty result sets say nothing about the queries, so they are unknown too.
+
+        Args:
+            generated_query (str): Query written by the agent
+            ground_truth_query (str): Reference query
+
+        Returns:
+            Tuple of (verdict, explanation), verdict one of 'equivalent', 'different' or 'unknown'
+            (unknown when either query cannot be executed locally or both return no rows)
+        """
+        try:
+            if not generated_query or not generated_query.strip():
+                raise SqlExecutionError("No generated query")
+            expected_columns, expected = self.execute(ground_truth_query)
+            actual_columns, actual = self.execute(generated_query)
+        except SqlExecutionError as e:
+            verdict, explanation = UNKNOWN, f"Local execution failed: {str(e)}"
+        else:
+            if not expected and not actual:
+                verdict, explanation = UNKNOWN, "Both queries return no rows on the local snapshot"
+            elif _row_counter(expected) == _row_counter(actual):
+                verdict, explanation = EQUIVALENT, f"Both queries return the same {len(expected)} row(s) on the local snapshot"
+            elif _column_counter(expected) == _column_counter(actual) and len(expected_columns) == len(actual_columns):
+                verdict, explanation = _compare_reordered(expected_columns, expected, actual_columns, actual)
+            else:
+                verdict, explanation = DIFFERENT, (f"Result sets differ on the local snapshot: ground truth returned "
+                                                   f"{len(expected)} row(s), generated query returned {len(actual)}")
+
+        with self.lock:
+            self.comparisons += 1
+            if verdict == EQUIVALENT:
+                self.equivalent += 1
+            elif verdict == DIFFERENT:
+                self.different += 1
+            else:
+                self.unknown += 1
+        return verdict, explanation
+
+    def metrics(self) -> Dict[str, int]:
+        """Comparison counters for reporting"""
+        with self.lock:
+            return {
+                'comparisons': self.comparisons,
+                'equivalent': self.equivalent,
+                'different': self.different,
+                'fell_back_to_judge': self.unknown
+            }
+
+
+def create_sql_executor(snapshot_dir: Optional[str], timeout: float, max_rows: int) -> Optional[SqlExecutor]:
+    """Shared SQL executor, or None when no snapshot directory is configured"""
+    if not snapshot_dir:
+        return None
+    return SqlExecutor(snapshot_dir, timeout=timeout, max_rows=max_rows)
@@ -0,0 +1,227 @@
+import time
+from typing import Dict, Any, List, Iterable, Optional
+from helpers.trace_assembler import TraceAssembler, get_trace_id
+from helpers.trace_analysis import ToolCallAnalyzer
+
+
+class StreamExtractor:
+    """
+    Incremental extractor of an invoke_agent completion stream
+
+    on_trace is called with every trace event and on_chunk with every answer chunk, in stream
+    order, so aggregates are up to date as soon as the stream ends. result() returns the keys
+    the extractor contributes to the parsed stream.
+    """
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        pass
+
+    def on_chunk(self, chunk: Dict[str, Any]) -> None:
+        pass
+
+    def result(self) -> Dict[str, Any]:
+        return {}
+
+
+def _orchestration(trace_event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return trace_event.get('trace', {}).get('orchestrationTrace')
+
+
+class AnswerExtractor(StreamExtractor):
+    """Final answer, joined from the streamed chunks"""
+
+    def __init__(self):
+        self.parts = []
+
+    def on_chunk(self, chunk: Dict[str, Any]) -> None:
+        self.parts.append(chunk['bytes'].decode('utf-8'))
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'agent_answer': "".join(self.parts) if self.parts else None,
+            'chunk_received': bool(self.parts)
+        }
+
+
+class TokenUsageExtractor(StreamExtractor):
+    """Input and output tokens of the orchestration model invocations"""
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        orc_trace = _orchestration(trace_event)
+        if orc_trace and 'modelInvocationOutput' in orc_trace:
+            usage = orc_trace['modelInvocationOutput'].get('metadata', {}).get('usage', {})
+            self.input_tokens += usage.get('inputTokens', 0)
+            self.output_tokens += usage.get('outputTokens', 0)
+
+    def result(self) -> Dict[str, Any]:
+        return {'input_tokens': self.input_tokens, 'output_tokens': self.output_tokens}
+
+
+class RagContextExtractor(StreamExtractor):
+    """Texts of the knowledge base references retrieved by the agent"""
+
+    def __init__(self):
+        self.rag_contexts = []
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        orc_trace = _orchestration(trace_event)
+        if not orc_trace:
+            return
+        output_trace = orc_trace.get('observation', {}).get('knowledgeBaseLookupOutput', {})
+        for ref in output_trace.get('retrievedReferences', []):
+            self.rag_contexts.append(ref['content']['text'])
+
+    def result(self) -> Dict[str, Any]:
+        return {'rag_contexts': self.rag_contexts}
+
+
+class SqlQueryExtractor(StreamExtractor):
+    """SQL query the agent reports in its action group output ("the query i used: ...")"""
+
+    def __init__(self, marker: str = "the query i used: "):
+        self.marker = marker
+        self.agent_query = ""
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        orc_trace = _orchestration(trace_event)
+        if not orc_trace:
+            return
+        text = orc_trace.get('observation', {}).get('actionGroupInvocationOutput', {}).get('text')
+        if text and self.marker in text:
+            self.agent_query = text.split(self.marker)[1]
+
+    def result(self) -> Dict[str, Any]:
+        return {'agent_query': self.agent_query}
+
+
+class TraceStepExtractor(StreamExtractor):
+    """Trace steps, rationales and collaborators for the CoT judge, assembled while streaming"""
+
+    def __init__(self):
+        self.assembler = TraceAssembler()
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        self.assembler.add(trace_event)
+
+    def result(self) -> Dict[str, Any]:
+        return {'assembled_trace': self.assembler.result()}
+
+
+class ToolCallExtractor(StreamExtractor):
+    """Wall time of each tool and model call, from the Bedrock eventTime of the trace events"""
+
+    def __init__(self):
+        self.analyzer = ToolCallAnalyzer()
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        self.analyzer.add(trace_event)
+
+    def result(self) -> Dict[str, Any]:
+        return {'tool_calls': self.analyzer.result()}
+
+
+class StreamTimingExtractor(StreamExtractor):
+    """
+    Latency of the agent stream, from the arrival time of every event
+
+    Step durations run from the first event of an orchestration step (traceId) to the first
+    event of the next one, the last step ends with the stream.
+    """
+
+    def __init__(self, start_time: float):
+        """
+        Args:
+            start_time (float): time.monotonic() taken just before invoke_agent was called
+        """
+        self.start_time = start_time
+        self.first_trace = None
+        self.first_chunk = None
+        self.last_event = None
+        self.steps = []
+        self.step_index = {}
+
+    def on_trace(self, trace_event: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        self.last_event = now
+        if self.first_trace is None:
+            self.first_trace = now
+
+        trace_id = get_trace_id(trace_event)
+        step = self.step_index.get(trace_id)
+        if step is None:
+            step = {'trace_id': trace_id, 'first': now, 'events': 0}
+            self.step_index[trace_id] = step
+            self.steps.append(step)
+        step['events'] += 1
+
+    def on_chunk(self, chunk: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        self.last_event = now
+        if self.first_chunk is None:
+            self.first_chunk = now
+
+    def _since_start(self, value: Optional[float]) -> Optional[float]:
+        return round(value - self.start_time, 3) if value is not None else None
+
+    def result(self) -> Dict[str, Any]:
+        end = self.last_event if self.last_event is not None else time.monotonic()
+        step_durations = []
+        for index, step in enumerate(self.steps):
+            step_end = self.steps[index + 1]['first'] if index + 1 < len(self.steps) else end
+            step_durations.append({
+                'step': index + 1,
+                'trace_id': step['trace_id'],
+                'offset': self._since_start(step['first']),
+                'duration': round(step_end - step['first'], 3),
+                'events': step['events']
+            })
+
+        return {'stream_metrics': {
+            'time_to_first_trace': self._since_start(self.first_trace),
+            'time_to_first_chunk': self._since_start(self.first_chunk),
+            'stream_time': self._since_start(end),
+            'step_durations': step_durations
+        }}
+
+
+class StreamParser:
+    def __init__(self, extractors: List[StreamExtractor], keep_events: bool = True):
+        """
+        Single pass over an invoke_agent completion stream feeding pluggable extractors
+
+        Args:
+            extractors (List[StreamExtractor]): Extractors updated with every event
+            keep_events (bool): Keep the raw trace events, without it only the extractor results are held in memory
+        """
+        self.extractors = extractors
+        self.keep_events = keep_events
+
+    def parse(self, completion: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Consume a completion stream
+
+        Args:
+            completion (Iterable[Dict[str, Any]]): Events of raw_response['completion']
+
+        Returns:
+            Merged extractor results, plus 'events' with the trace events when they are kept (else [])
+        """
+        events = []
+        for event in completion:
+            if 'chunk' in event:
+                for extractor in self.extractors:
+                    extractor.on_chunk(event['chunk'])
+            elif 'trace' in event:
+                if self.keep_events:
+                    events.append(event['trace'])
+                for extractor in self.extractors:
+                    extractor.on_trace(event['trace'])
+
+        parsed = {'events': events}
+        for extractor in self.extractors:
+            parsed.update(extractor.result())
+        return parsed
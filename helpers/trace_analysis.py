@@ -0,0 +1,153 @@
+import math
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Trace types whose model invocations and tool invocations are timed
+TIMED_TRACE_TYPES = ('orchestrationTrace', 'preProcessingTrace', 'postProcessingTrace', 'routingClassifierTrace')
+
+
+def _event_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def tool_name(invocation_input: Dict[str, Any]) -> Tuple[str, str]:
+    """Kind and name of the tool an invocationInput calls"""
+    if 'actionGroupInvocationInput' in invocation_input:
+        action = invocation_input['actionGroupInvocationInput']
+        operation = action.get('function') or action.get('apiPath')
+        name = action.get('actionGroupName', 'unknown')
+        return 'action_group', f"{name}.{operation}" if operation else name
+    if 'knowledgeBaseLookupInput' in invocation_input:
+        return 'knowledge_base', invocation_input['knowledgeBaseLookupInput'].get('knowledgeBaseId', 'unknown')
+    if 'agentCollaboratorInvocationInput' in invocation_input:
+        return 'collaborator', invocation_input['agentCollaboratorInvocationInput'].get('agentCollaboratorName', 'unknown')
+    if 'codeInterpreterInvocationInput' in invocation_input:
+        return 'code_interpreter', 'code_interpreter'
+    return 'other', str(invocation_input.get('invocationType', 'unknown')).lower()
+
+
+class ToolCallAnalyzer:
+    def __init__(self):
+        """
+        Pairs the invocations of a Bedrock agent trace with their results, from the eventTime of each event
+
+        An invocationInput is closed by the observation of the same traceId, and a
+        modelInvocationInput by its modelInvocationOutput, so every action group, knowledge
+        base, collaborator, model and routing classifier call gets its own wall time.
+        """
+        self.pending_tools = {}
+        self.pending_models = {}
+        self.calls = []
+
+    def _close(self, kind: str, tool: str, trace_type: str, trace_id: str,
+               start: datetime, end: datetime) -> None:
+        self.calls.append({
+            'kind': kind,
+            'tool': f"{kind}:{tool}",
+            'trace_type': trace_type,
+            'trace_id': trace_id,
+            'start_time': start,
+            'duration': max(0.0, (end - start).total_seconds())
+        })
+
+    def add(self, event: Dict[str, Any]) -> None:
+        """Add the next trace event of the stream"""
+        event_time = _event_time(event.get('eventTime'))
+        if event_time is None:
+            return
+
+        trace = event.get('trace', {})
+        for trace_type in TIMED_TRACE_TYPES:
+            part = trace.get(trace_type)
+            if part is None:
+                continue
+
+            for key, value in part.items():
+                if not isinstance(value, dict):
+                    continue
+                trace_id = value.get('traceId')
+                pending_key = (trace_type, trace_id)
+
+                if key == 'modelInvocationInput':
+                    self.pending_models[pending_key] = event_time
+                elif key == 'modelInvocationOutput' and pending_key in self.pending_models:
+                    start = self.pending_models.pop(pending_key)
+                    self._close('model', trace_type.replace('Trace', ''), trace_type, trace_id, start, event_time)
+                elif key == 'invocationInput':
+                    self.pending_tools[pending_key] = (tool_name(value), event_time)
+                elif key == 'observation' and pending_key in self.pending_tools:
+                    (kind, tool), start = self.pending_tools.pop(pending_key)
+                    self._close(kind, tool, trace_type, trace_id, start, event_time)
+            return
+
+    def result(self) -> List[Dict[str, Any]]:
+        """Timed calls in order of completion"""
+        return self.calls
+
+
+def analyze_tool_calls(full_trace: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Timed tool and model calls of a complete list of trace events
+
+    Args:
+        full_trace (List[Dict[str, Any]]): Trace events of one agent invocation
+
+    Returns:
+        List of calls with kind, tool, trace_type, trace_id, start_time and duration (seconds)
+    """
+    analyzer = ToolCallAnalyzer()
+    for event in full_trace:
+        analyzer.add(event)
+    return analyzer.result()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile (q between 0 and 100) of a non-empty list"""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class ToolLatencyReport:
+    def __init__(self):
+        """Run-wide latency of every tool, aggregated across questions and workers"""
+        self.lock = threading.Lock()
+        self.durations = {}
+
+    def add(self, calls: List[Dict[str, Any]]) -> None:
+        """Add the timed calls of one question"""
+        with self.lock:
+            for call in calls:
+                self.durations.setdefault(call['tool'], []).append(call['duration'])
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Latency percentiles per tool
+
+        Returns:
+            One entry per tool with count, total, p50, p95, p99 and max (seconds), the tools
+            holding the most wall time first
+        """
+        with self.lock:
+            durations = {tool: list(values) for tool, values in self.durations.items()}
+
+        summary = [{
+            'tool': tool,
+            'count': len(values),
+            'total': round(sum(values), 3),
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'p99': round(percentile(values, 99), 3),
+            'max': round(max(values), 3)
+        } for tool, values in durations.items()]
+        return sorted(summary, key=lambda entry: entry['total'], reverse=True)
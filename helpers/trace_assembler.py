@@ -0,0 +1,140 @@
+from typing import Dict, Any, List, Optional
+
+# Trace types of a Bedrock agent trace event, each holding its traceId either directly
+# or one level down (e.g. orchestrationTrace.modelInvocationInput.traceId)
+TRACE_TYPES = (
+    'orchestrationTrace',
+    'preProcessingTrace',
+    'postProcessingTrace',
+    'routingClassifierTrace',
+    'customOrchestrationTrace',
+    'guardrailTrace',
+    'failureTrace'
+)
+
+
+def _search_trace_id(data: Any) -> Optional[str]:
+    """Recursive traceId lookup, only used for events whose layout is not a known trace type"""
+    if isinstance(data, dict):
+        if 'traceId' in data:
+            return data['traceId']
+        for value in data.values():
+            result = _search_trace_id(value)
+            if result:
+                return result
+    elif isinstance(data, list):
+        for item in data:
+            result = _search_trace_id(item)
+            if result:
+                return result
+    return None
+
+
+def get_trace_id(event: Dict[str, Any]) -> Optional[str]:
+    """
+    traceId of a Bedrock agent trace event, read from its known location
+
+    Args:
+        event (Dict[str, Any]): Trace event (the 'trace' member of an invoke_agent stream event)
+
+    Returns:
+        The traceId, or None if the event carries none
+    """
+    trace = event.get('trace', {})
+    for trace_type in TRACE_TYPES:
+        part = trace.get(trace_type)
+        if part is None:
+            continue
+        if 'traceId' in part:
+            return part['traceId']
+        for value in part.values():
+            if isinstance(value, dict) and 'traceId' in value:
+                return value['traceId']
+        break
+    return _search_trace_id(event)
+
+
+class TraceAssembler:
+    def __init__(self):
+        """
+        Single-pass assembler of a Bedrock agent trace
+
+        Events are added one at a time, in stream order, and are grouped into steps by traceId
+        through a dict index. Rationales, collaborators and token usage are collected on the way,
+        so no later pass over the events is needed.
+        """
+        self.steps = []
+        self.step_index = {}
+        self.rationales = []
+        self.collaborators = set()
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, event: Dict[str, Any]) -> None:
+        """Add the next trace event of the stream"""
+        trace = event.get('trace', {})
+        trace_id = get_trace_id(event)
+
+        step = self.step_index.get(trace_id)
+        if step is None:
+            # Agent information of the step, from its first event
+            step = {key: value for key, value in event.items() if key != 'trace'}
+            self.step_index[trace_id] = step
+            self.steps.append(step)
+
+        if event.get('eventTime') is not None:
+            step['lastEventTime'] = event['eventTime']
+
+        orc_trace = trace.get('orchestrationTrace')
+        if orc_trace is None:
+            return
+
+        for key, value in orc_trace.items():
+            step[key] = value
+
+        if 'rationale' in orc_trace:
+            self.rationales.append(orc_trace['rationale']['text'])
+
+        collaborator_input = orc_trace.get('invocationInput', {}).get('agentCollaboratorInvocationInput')
+        if collaborator_input:
+            self.collaborators.add(collaborator_input['agentCollaboratorName'])
+        collaborator_output = orc_trace.get('observation', {}).get('agentCollaboratorInvocationOutput')
+        if collaborator_output:
+            self.collaborators.add(collaborator_output['agentCollaboratorName'])
+
+        usage = orc_trace.get('modelInvocationOutput', {}).get('metadata', {}).get('usage')
+        if usage:
+            self.input_tokens += usage.get('inputTokens', 0)
+            self.output_tokens += usage.get('outputTokens', 0)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Assembled trace
+
+        Returns:
+            Dict with steps (one per traceId, in order of first appearance), rationales,
+            collaborators, input_tokens and output_tokens
+        """
+        return {
+            'steps': self.steps,
+            'rationales': self.rationales,
+            'collaborators': self.collaborators,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens
+        }
+
+
+def assemble_trace(full_trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Assemble a complete list of trace events in one pass
+
+    Args:
+        full_trace (List[Dict[str, Any]]): Trace events of one agent invocation
+
+    Returns:
+        TraceAssembler.result() of the events
+    """
+    assembler = TraceAssembler()
+    for event in full_trace:
+        assembler.add(event)
+    return assembler.result()
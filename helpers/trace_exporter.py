@@ -0,0 +1,223 @@
+import atexit
+import queue
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from langfuse import Langfuse
+
+
+class TraceExporter:
+    def __init__(self, langfuse: Optional[Langfuse] = None, max_queue_size: int = 10000,
+                 batch_size: int = 100, flush_interval: float = 1.0, enqueue_timeout: float = 1.0):
+        """
+        Process-wide Langfuse exporter: one client, one bounded queue, one background worker
+
+        Evaluators enqueue traces, generations, spans and scores (with explicit ids) instead of
+        holding their own Langfuse client, and the worker applies them to the shared client in
+        batches of up to batch_size events.
+
+        Args:
+            langfuse (Optional[Langfuse]): Client to export with, created from the environment if omitted
+            max_queue_size (int): Events that may wait for export before new ones are dropped
+            batch_size (int): Events taken from the queue per batch
+            flush_interval (float): Seconds the worker waits for a first event before checking for shutdown
+            enqueue_timeout (float): Seconds a producer waits on a full queue before the event is dropped
+        """
+        self.langfuse = langfuse or Langfuse()
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self.lock = threading.Lock()
+        self.enqueued = 0
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self.incomplete = 0
+        # Dropped or failed events per trace id, until the trace is checkpointed
+        self.trace_losses = {}
+
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.worker.start()
+
+    def _lose(self, kind: str, payload: Dict[str, Any]) -> None:
+        """Count a dropped or failed event against its trace, called with the lock held"""
+        trace_id = payload.get('id') if kind == 'trace' else payload.get('trace_id')
+        if trace_id is not None:
+            self.trace_losses[trace_id] = self.trace_losses.get(trace_id, 0) + 1
+
+    def _enqueue(self, item: Dict[str, Any], count: int = 1) -> None:
+        try:
+            self.queue.put(item, timeout=self.enqueue_timeout)
+            with self.lock:
+                self.enqueued += count
+        except queue.Full:
+            with self.lock:
+                self.dropped += count
+                dropped = self.dropped
+                for kind, payload in item.get('events') or [(item['kind'], item['payload'])]:
+                    self._lose(kind, payload)
+            if dropped == 1 or dropped % 100 == 0:
+                print(f"Trace export queue full, {dropped} event(s) dropped so far")
+
+    def trace(self, **kwargs) -> None:
+        """Create or update (same id) a trace"""
+        self._enqueue({'kind': 'trace', 'payload': kwargs})
+
+    def generation(self, **kwargs) -> None:
+        """Create or update (same id) a generation, attached with trace_id / parent_observation_id"""
+        self._enqueue({'kind': 'generation', 'payload': kwargs})
+
+    def span(self, **kwargs) -> None:
+        """Create or update (same id) a span, attached with trace_id / parent_observation_id"""
+        self._enqueue({'kind': 'span', 'payload': kwargs})
+
+    def score(self, **kwargs) -> None:
+        """Score a trace or, with observation_id, one of its observations"""
+        self._enqueue({'kind': 'score', 'payload': kwargs})
+
+    def batch(self, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Enqueue several events as one unit, applied together and in the given order
+
+        Args:
+            events (List[Tuple[str, Dict[str, Any]]]): (kind, kwargs) pairs, kind one of trace, generation, span or score
+        """
+        if events:
+            self._enqueue({'kind': 'batch', 'events': events}, count=len(events))
+
+    def checkpoint(self, trace_id: str, callback: Callable[[], None]) -> None:
+        """
+        Run a callback once every event of a trace enqueued before it has been sent to Langfuse
+
+        The callback only runs if none of those events was dropped or failed to export and
+        Langfuse was flushed; otherwise the trace is reported and counted as incomplete.
+        Checkpoints are never dropped, a full queue blocks the caller instead.
+
+        Args:
+            trace_id (str): Trace the checkpoint covers
+            callback (Callable[[], None]): Called once the trace is fully exported
+        """
+        self.queue.put({'kind': 'checkpoint', 'trace_id': trace_id, 'callback': callback})
+
+    def _run(self) -> None:
+        while not (self.stopped.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            checkpoints = []
+            for item in batch:
+                if item['kind'] in ('checkpoint', 'flush'):
+                    checkpoints.append(item)
+                elif item['kind'] == 'batch':
+                    for kind, payload in item['events']:
+                        self._export(kind, payload)
+                else:
+                    self._export(item['kind'], item['payload'])
+
+            # One flush covers every checkpoint of the batch
+            if checkpoints:
+                flushed = True
+                try:
+                    self.langfuse.flush()
+                except Exception as e:
+                    flushed = False
+                    print(f"Failed to flush Langfuse: {str(e)}")
+                for item in checkpoints:
+                    if item['kind'] == 'flush':
+                        item['done'].set()
+                    else:
+                        self._complete_checkpoint(item, flushed)
+
+    def _complete_checkpoint(self, item: Dict[str, Any], flushed: bool) -> None:
+        with self.lock:
+            lost = self.trace_losses.pop(item['trace_id'], 0)
+            if lost or not flushed:
+                self.incomplete += 1
+        if lost or not flushed:
+            reason = f"{lost} event(s) dropped or failed" if lost else "Langfuse flush failed"
+            print(f"Trace {item['trace_id']} not fully exported ({reason}), not checkpointed")
+            return
+        try:
+            item['callback']()
+        except Exception as e:
+            print(f"Trace export checkpoint failed: {str(e)}")
+
+    def _export(self, kind: str, payload: Dict[str, Any]) -> None:
+        try:
+            getattr(self.langfuse, kind)(**payload)
+            with self.lock:
+                self.exported += 1
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+                self._lose(kind, payload)
+            print(f"Failed to export {kind} to Langfuse: {str(e)}")
+
+    def flush(self) -> None:
+        """Block until every event enqueued so far has been sent"""
+        done = threading.Event()
+        self.queue.put({'kind': 'flush', 'done': done})
+        done.wait()
+
+    def shutdown(self) -> None:
+        """Send everything still queued and stop the worker"""
+        if self.stopped.is_set():
+            return
+        self.flush()
+        self.stopped.set()
+        self.worker.join()
+        self.langfuse.shutdown()
+
+    def metrics(self) -> Dict[str, int]:
+        """Export counters for reporting"""
+        with self.lock:
+            return {
+                'enqueued': self.enqueued,
+                'exported': self.exported,
+                'queued': self.queue.qsize(),
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'incomplete_traces': self.incomplete
+            }
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_trace_exporter(**kwargs) -> TraceExporter:
+    """
+    Process-wide TraceExporter, created on first use
+
+    Args:
+        **kwargs: TraceExporter arguments, only used by the call that creates it
+
+    Returns:
+        The shared TraceExporter
+    """
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = TraceExporter(**kwargs)
+            atexit.register(_exporter.shutdown)
+        return _exporter
+
+
+def shutdown_trace_exporter() -> Optional[Dict[str, int]]:
+    """Flush and stop the shared exporter, returning its final metrics"""
+    with _exporter_lock:
+        exporter = _exporter
+    if exporter is None:
+        return None
+    exporter.shutdown()
+    return exporter.metrics()
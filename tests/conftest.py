@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the helpers package from the repository root, as driver.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import random
+import pytest
+from helpers.cot_compactor import CotCompactor, create_cot_compactor
+
+WORDS = ['customer', 'policy', 'query', 'table', 'premium', 'claim', 'vehicle', 'private', 'count', 'result',
+         'search', 'insurance', 'renewal', 'branch', 'agent', 'lookup', 'filter', 'date', 'month', 'total']
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _action_step(rationale, output, function='run_query'):
+    return {
+        'rationale': {'text': rationale},
+        'invocationInput': {'actionGroupInvocationInput': {'actionGroupName': 'sql', 'function': function}},
+        'observation': {'actionGroupInvocationOutput': {'text': output}}
+    }
+
+
+def _trace(seed, steps):
+    rng = random.Random(seed)
+    trace = [_action_step(_text(rng, rng.randint(5, 80)), _text(rng, rng.randint(0, 600))) for _ in range(steps)]
+    trace.append({'rationale': {'text': _text(rng, 20)}, 'observation': {'finalResponse': {'text': 'done'}}})
+    return trace
+
+
+@pytest.mark.parametrize('budget', [64, 200, 1000, 4000])
+@pytest.mark.parametrize('seed', range(5))
+def test_compacted_text_fits_the_budget(budget, seed):
+    compactor = CotCompactor(budget)
+    compacted = compactor.compact(_trace(seed, 25))
+    assert compactor.counter.count(compacted['text']) <= budget
+    assert compacted['report']['compacted_tokens'] <= budget
+
+
+def test_trace_under_budget_is_unchanged():
+    steps = [_action_step('Look up the customer policies', 'policy 1, policy 2')]
+    compacted = CotCompactor(1000).compact(steps)
+    assert compacted['text'] == ("Step 1: Look up the customer policies\n"
+                                 "Step 1 observation from sql.run_query: policy 1, policy 2\n")
+    assert compacted['report']['omitted_entries'] == 0
+    assert compacted['report']['dropped_tokens'] == 0
+
+
+def test_compaction_is_deterministic():
+    steps = _trace(7, 25)
+    assert CotCompactor(300).compact(steps)['text'] == CotCompactor(300).compact(steps)['text']
+
+
+def test_first_and_last_rationales_are_kept():
+    steps = [_action_step(f"Rationale number {i} " + 'about the query ' * i, 'row ' * 200) for i in range(1, 30)]
+    text = CotCompactor(400).compact(steps)['text']
+    assert 'Rationale number 1 ' in text
+    assert 'Rationale number 29 ' in text
+    assert 'trace entries omitted' in text
+
+
+def test_duplicates_are_removed_and_repeated_observations_collapsed():
+    steps = [
+        _action_step('Query the cars table for private insurance', 'count: 43'),
+        _action_step('Query the cars table for private insurance', 'count: 43'),
+        _action_step('Summarize the answer for the user', 'count: 43', function='format')
+    ]
+    compacted = CotCompactor(1000).compact(steps)
+    assert compacted['report']['duplicate_rationales'] == 1
+    assert compacted['report']['collapsed_observations'] == 1
+    assert 'same result as step 1' in compacted['text']
+    # Same text from another tool is not a repeat
+    assert compacted['text'].count('count: 43') == 2
+
+
+def test_metrics_accumulate():
+    compactor = CotCompactor(100)
+    compactor.compact(_trace(1, 10))
+    compactor.compact([_action_step('short', 'ok')])
+    metrics = compactor.metrics()
+    assert metrics['traces'] == 2
+    assert metrics['over_budget'] == 1
+    assert metrics['dropped_tokens'] == metrics['original_tokens'] - metrics['compacted_tokens']
+
+
+def test_no_budget_disables_compaction():
+    assert create_cot_compactor(0, 0.9) is None
+    assert isinstance(create_cot_compactor(500, 0.9), CotCompactor)
@@ -0,0 +1,92 @@
+import pytest
+from helpers.judge_output import (STRUCTURED, DIRECT, RECOVERED, FAILED, JudgeOutputError, JudgeOutputStats,
+                                  extract_judge_output, metrics_scores_schema, read_judge_output, scores_schema)
+
+SCHEMA = scores_schema(['helpfulness', 'overall'])
+OUTPUT = {'helpfulness': {'score': 0.8, 'explanation': 'Answers the question'},
+          'overall': {'score': 0.7, 'explanation': 'Mostly right'}}
+JSON_TEXT = ('{"helpfulness": {"score": 0.8, "explanation": "Answers the question"}, '
+             '"overall": {"score": 0.7, "explanation": "Mostly right"}}')
+
+
+def test_structured_converse_tool_use():
+    content = [{'text': 'Recording the evaluation'}, {'toolUse': {'toolUseId': 't1', 'name': 'record', 'input': OUTPUT}}]
+    assert extract_judge_output(content, SCHEMA) == (OUTPUT, STRUCTURED)
+
+
+def test_structured_anthropic_tool_use():
+    content = [{'type': 'tool_use', 'id': 't1', 'name': 'record', 'input': OUTPUT}]
+    assert extract_judge_output(content, SCHEMA) == (OUTPUT, STRUCTURED)
+
+
+def test_direct_json_text():
+    assert extract_judge_output(JSON_TEXT, SCHEMA) == (OUTPUT, DIRECT)
+    assert extract_judge_output([{'text': '  ' + JSON_TEXT + '\n'}], SCHEMA) == (OUTPUT, DIRECT)
+
+
+@pytest.mark.parametrize('text', [
+    # Prose around the object
+    f"Here is my evaluation:\n{JSON_TEXT}\nLet me know if you need more.",
+    # Markdown fence
+    f"```json\n{JSON_TEXT}\n```",
+    # Trailing commas
+    JSON_TEXT.replace('"Mostly right"}', '"Mostly right",},'),
+    # Python dictionary, as the CoT prompt asks for
+    "{'helpfulness': {'score': 0.8, 'explanation': 'Answers the question'}, "
+    "'overall': {'score': 0.7, 'explanation': 'Mostly right'}}",
+    # Braces inside an explanation string
+    'Evaluation: ' + JSON_TEXT.replace('Mostly right', 'Mostly right } {'),
+])
+def test_recovered_from_text(text):
+    output, method = extract_judge_output(text, SCHEMA)
+    assert method == RECOVERED
+    assert output['helpfulness']['score'] == 0.8
+    assert output['overall']['score'] == 0.7
+
+
+def test_first_fragment_matching_the_schema_is_used():
+    text = '{"note": "draft"} then ' + JSON_TEXT
+    assert extract_judge_output(text, SCHEMA) == (OUTPUT, RECOVERED)
+
+
+def test_invalid_tool_input_falls_back_to_text():
+    content = [{'toolUse': {'input': {'helpfulness': {'score': 2}}}}, {'text': JSON_TEXT}]
+    assert extract_judge_output(content, SCHEMA) == (OUTPUT, DIRECT)
+
+
+@pytest.mark.parametrize('text', [
+    'I cannot evaluate this trace.',
+    # Missing metric
+    '{"helpfulness": {"score": 0.8, "explanation": "ok"}}',
+    # Score out of range
+    JSON_TEXT.replace('0.8', '8'),
+    # Score not a number
+    JSON_TEXT.replace('0.8', '"high"'),
+    # Unbalanced object
+    JSON_TEXT[:-1],
+])
+def test_no_valid_output_raises(text):
+    with pytest.raises(JudgeOutputError):
+        extract_judge_output(text, SCHEMA)
+
+
+def test_metrics_scores_schema():
+    schema = metrics_scores_schema(['sql_semantic_equivalence'])
+    text = '{"metrics_scores": {"sql_semantic_equivalence": {"score": 1, "explanation": "Same rows"}}}'
+    assert extract_judge_output(text, schema)[1] == DIRECT
+    with pytest.raises(JudgeOutputError):
+        extract_judge_output(JSON_TEXT, schema)
+
+
+def test_read_judge_output_counts_methods():
+    stats = JudgeOutputStats()
+    read_judge_output('cot', JSON_TEXT, SCHEMA, stats)
+    read_judge_output('cot', f"Evaluation: {JSON_TEXT}", SCHEMA, stats)
+    with pytest.raises(JudgeOutputError):
+        read_judge_output('cot', 'no output', SCHEMA, stats)
+
+    metrics = stats.metrics()['cot']
+    assert metrics['responses'] == 3
+    assert (metrics[DIRECT], metrics[RECOVERED], metrics[FAILED]) == (1, 1, 1)
+    assert metrics['parse_failure_rate'] == 0.667
+    assert metrics['recovery_rate'] == 0.5
@@ -0,0 +1,74 @@
+import pytest
+from helpers.sql_canonical import canonicalize_sql, SqlFastPath
+from helpers.sql_equivalence import EQUIVALENT, DIFFERENT, UNKNOWN
+
+
+@pytest.mark.parametrize('generated, expected', [
+    # Whitespace, comments and keyword / identifier case
+    ("SELECT COUNT(*) FROM db.cars WHERE a = 1 AND b = 2", "select count(*)\n from DB.CARS -- count\n where b=2 and a=1"),
+    # Table aliases, != and <>
+    ("select c.x from db.cars c where c.y != 3", "select x from db.cars where y <> 3"),
+    ("select count(1) from t", "select count(*) from t"),
+    # GROUP BY key order, ORDER BY ordinal and output alias
+    ("select a, b, count(*) from t group by a, b order by 3 desc",
+     "select a, b, count(*) as n from t group by b, a order by n desc"),
+    ("select * from t where 5 < a", "select * from t where a > 5"),
+    ("select t.a from t inner join u on t.id = u.id", "select t.a from t join u on u.id = t.id"),
+    ("select a from t where a between 1 and 5 and b = 2", "select a from t where b = 2 and a between 1 and 5"),
+    ("select a from t where a = 1 or a = 2", "select a from t where a = 2 or a = 1"),
+    ("with c as (select a from t) select a from c", "with d as (select a from t) select a from d"),
+    # Self join aliases swapped along with the join condition
+    ("select a from t1 x join t1 y on x.id = y.pid", "select a from t1 y join t1 x on y.id = x.pid"),
+])
+def test_equivalent_queries(generated, expected):
+    assert canonicalize_sql(generated)[0] == canonicalize_sql(expected)[0]
+    assert SqlFastPath().compare(generated, expected)[0] == EQUIVALENT
+
+
+@pytest.mark.parametrize('generated, expected', [
+    ("select a from t where a = 1", "select a from t where a = 2"),
+    ("select a from t where a = 1 and b = 2", "select a from t where a = 1 or b = 2"),
+    ("select a from t where (a = 1 or b = 2) and c = 3", "select a from t where a = 1 or (b = 2 and c = 3)"),
+    ("select a from t", "select b from t"),
+    ("select a from t order by a", "select a from t order by a desc"),
+    ("select a from t where b > 1", "select a from t where b >= 1"),
+    ("select a from t limit 5", "select a from t limit 10"),
+    ("select a from t where b is null", "select a from t where b is not null"),
+    ("select a from t left join u on t.id = u.id", "select a from t join u on t.id = u.id"),
+    # String literals keep their case
+    ("select a from t where b = 'ABC'", "select a from t where b = 'abc'"),
+    ("select a from t1 x join t1 y on x.id = y.pid", "select a from t1 x join t1 y on y.id = x.pid"),
+    ("select a from t where a is distinct from b", "select a from t where a is not distinct from b"),
+])
+def test_different_queries_are_never_equivalent(generated, expected):
+    assert canonicalize_sql(generated)[0] != canonicalize_sql(expected)[0]
+    assert SqlFastPath().compare(generated, expected)[0] == UNKNOWN
+
+
+def test_different_tables_are_different():
+    assert SqlFastPath().compare("select a from t", "select a from u")[0] == DIFFERENT
+
+
+def test_is_distinct_from_is_an_operator():
+    text, tables = canonicalize_sql("SELECT a FROM t WHERE c = 1 AND a IS NOT DISTINCT FROM b")
+    assert tables == frozenset({'t'})
+    assert '"a" is not distinct from "b"' in text
+
+
+@pytest.mark.parametrize('query', [
+    "select 1; select 2",
+    "select * from (select a from t",
+    "select a from t where a = 'x",
+])
+def test_unsupported_queries_are_left_to_the_judge(query):
+    with pytest.raises(ValueError):
+        canonicalize_sql(query)
+    assert SqlFastPath().compare(query, "select 1")[0] == UNKNOWN
+
+
+def test_metrics_count_decisions():
+    fast_path = SqlFastPath()
+    fast_path.compare("select a from t", "SELECT a FROM t")
+    fast_path.compare("select a from t", "select a from u")
+    fast_path.compare("select a from t", "select b from t")
+    assert fast_path.metrics() == {'comparisons': 3, 'equivalent': 1, 'different': 1, 'undecided': 1, 'hit_rate': 0.667}
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import pytest
+from helpers.sql_equivalence import EQUIVALENT, DIFFERENT, UNKNOWN, SqlExecutor, normalize_value, prepare_query
+
+
+@pytest.fixture(scope='module')
+def executor(tmp_path_factory):
+    snapshot_dir = tmp_path_factory.mktemp('snapshot')
+    os.makedirs(snapshot_dir / 'zone')
+    connection = sqlite3.connect(snapshot_dir / 'zone' / 'tables.db')
+    connection.execute("CREATE TABLE cars (id INTEGER, owner TEXT, premium REAL)")
+    connection.executemany("INSERT INTO cars VALUES (?, ?, ?)", [(1, 'dana', 100.5), (2, 'eli', 200.0), (3, 'dana', 50.0)])
+    connection.commit()
+    connection.close()
+    return SqlExecutor(str(snapshot_dir), build_dir=str(snapshot_dir / 'build'), max_rows=10)
+
+
+@pytest.mark.parametrize('generated, expected', [
+    ("select owner, count(*) from zone.cars group by owner", "SELECT owner, COUNT(id) FROM zone.cars GROUP BY owner ORDER BY 2"),
+    ("```sql\nselect sum(premium) from zone.cars;\n```", "select 350.5"),
+    # Same columns in another order, matched by name
+    ("select premium, id from zone.cars", "select id, premium from zone.cars"),
+])
+def test_equivalent_results(executor, generated, expected):
+    assert executor.compare(generated, expected)[0] == EQUIVALENT
+
+
+@pytest.mark.parametrize('generated, expected', [
+    ("select id from zone.cars where owner = 'dana'", "select id from zone.cars"),
+    ("select owner from zone.cars", "select id from zone.cars"),
+])
+def test_different_results(executor, generated, expected):
+    assert executor.compare(generated, expected)[0] == DIFFERENT
+
+
+@pytest.mark.parametrize('generated, expected', [
+    # Both empty: the snapshot cannot tell the queries apart
+    ("select id from zone.cars where id > 10", "select id from zone.cars where owner = 'nobody'"),
+    # Reordered columns whose names do not match up
+    ("select premium as p, id from zone.cars", "select id, premium from zone.cars"),
+    # Several statements, Athena-only syntax, writes, too many rows, no query
+    ("select 1; select 2", "select 1"),
+    ("select date_format(now(), '%Y')", "select 1"),
+    ("delete from zone.cars", "select 1"),
+    ("select a.id from zone.cars a, zone.cars b, zone.cars c", "select 1"),
+    ("", "select 1"),
+])
+def test_unknown_results_fall_back_to_the_judge(executor, generated, expected):
+    assert executor.compare(generated, expected)[0] == UNKNOWN
+
+
+def test_snapshot_is_read_only(executor):
+    verdict, explanation = executor.compare("select 1", "with x as (select 1) insert into zone.cars values (4, 'x', 1)")
+    assert verdict == UNKNOWN
+    assert executor.execute("select count(*) from zone.cars")[1] == [(3,)]
+
+
+def test_normalize_value():
+    assert normalize_value(2.0) == 2
+    assert normalize_value(1 / 3) == round(1 / 3, 6)
+    assert normalize_value(float('nan')) is None
+    assert normalize_value(True) == 1
+    assert normalize_value(' x ') == 'x'
+    assert prepare_query("```SQL\nselect 1;\n```") == 'select 1'